@@ -0,0 +1 @@
+# Benchmarks de rendimiento (scripts ejecutables con python -m)
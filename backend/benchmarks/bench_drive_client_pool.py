@@ -0,0 +1,127 @@
+"""
+Benchmark de descargas: cliente nuevo por archivo vs DriveClientPool (keep-alive).
+
+Levanta un servidor HTTP/1.1 local que sirve archivos en /drive/v3/files/<id>?alt=media.
+Cada conexión nueva paga --connect-ms (simula el handshake TCP+TLS con Google) y
+cada construcción de cliente paga --build-ms (simula build() del discovery).
+Los clientes falsos usan http.client con conexión persistente, igual que httplib2.
+
+- "por archivo": construye cliente y conexión en cada descarga (comportamiento anterior)
+- "pool": los hilos toman clientes de DriveClientPool y los reutilizan
+
+Uso (desde la raíz del repositorio):
+    python -m backend.benchmarks.bench_drive_client_pool --files 200 --workers 8
+"""
+import argparse
+import http.client
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backend.drive.client_pool import DriveClientPool
+
+
+def make_handler(payload: bytes, connect_delay: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            time.sleep(connect_delay)
+            super().setup()
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+
+class FakeDriveClient:
+    """Cliente mínimo: una conexión persistente, como el transporte httplib2 de un cliente real."""
+
+    def __init__(self, host: str, port: int, access_token: str, build_delay: float):
+        time.sleep(build_delay)
+        self.connection = http.client.HTTPConnection(host, port, timeout=30)
+        self.access_token = access_token
+
+    def download(self, file_id: str) -> bytes:
+        self.connection.request("GET", f"/drive/v3/files/{file_id}?alt=media",
+                                headers={"Authorization": f"Bearer {self.access_token}"})
+        response = self.connection.getresponse()
+        return response.read()
+
+    def close(self):
+        self.connection.close()
+
+
+def run(label, download, files, workers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        sizes = list(executor.map(download, files))
+    elapsed = time.perf_counter() - start
+    assert all(size > 0 for size in sizes)
+    print(f"{label:<22} | {len(files) / elapsed:10.1f} | {elapsed:7.2f}s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--size-kb", type=int, default=256)
+    parser.add_argument("--connect-ms", type=float, default=30.0)
+    parser.add_argument("--build-ms", type=float, default=40.0)
+    args = parser.parse_args()
+
+    payload = b"%PDF" + b"x" * (args.size_kb * 1024)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(payload, args.connect_ms / 1000))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    build_delay = args.build_ms / 1000
+    token = "token-de-prueba"
+    files = [f"file{i}" for i in range(args.files)]
+
+    pooled_clients = []
+
+    def factory(access_token):
+        return FakeDriveClient(host, port, access_token, build_delay)
+
+    def pool_factory(access_token):
+        client = factory(access_token)
+        pooled_clients.append(client)
+        return client
+
+    def per_file(file_id):
+        client = factory(token)
+        try:
+            return len(client.download(file_id))
+        finally:
+            client.close()
+
+    pool = DriveClientPool(pool_factory, max_per_token=args.workers)
+
+    def pooled(file_id):
+        with pool.lease(token) as client:
+            return len(client.download(file_id))
+
+    print(f"📦 {args.files} archivos de {args.size_kb} KB, {args.workers} hilos")
+    print(f"{'Modo':<22} | {'descargas/s':>10} | {'tiempo':>8}")
+    before = run("Cliente por archivo", per_file, files, args.workers)
+    after = run("DriveClientPool", pooled, files, args.workers)
+    print(f"Mejora: x{before / after:.1f} | pool: {pool.stats()}")
+
+    for client in pooled_clients:
+        client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
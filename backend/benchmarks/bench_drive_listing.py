@@ -0,0 +1,143 @@
+"""
+Benchmark del listado recursivo de carpetas contra una API de Drive falsa local.
+
+La API falsa genera un árbol de carpetas (profundidad x ramas, N PDFs por carpeta),
+simula la latencia de cada files().list, pagina con un tope de página y entiende las
+consultas "'a' in parents or 'b' in parents" y los filtros por mimeType.
+
+Compara el listado anterior (una página por carpeta, recursión secuencial) con
+DriveFolderLister (todas las páginas, BFS, varias carpetas por consulta, en paralelo)
+y verifica que el nuevo encuentra todos los archivos.
+
+Uso (desde la raíz del repositorio):
+    python -m backend.benchmarks.bench_drive_listing --depth 3 --fanout 5 --files 150
+"""
+import argparse
+import re
+import threading
+import time
+
+from backend.drive.folder_lister import FOLDER_MIME_TYPE, DriveFolderLister
+
+PDF = 'application/pdf'
+
+
+class FakeRequest:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self):
+        return self._fn()
+
+
+class FakeFiles:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def list(self, q, pageSize=100, fields=None, orderBy=None, pageToken=None):
+        return FakeRequest(lambda: self._drive.list(q, pageSize, pageToken))
+
+
+class FakeDrive:
+    """Árbol en memoria con la semántica mínima de files().list que usa el servicio."""
+
+    def __init__(self, depth: int, fanout: int, files_per_folder: int, latency: float, max_page_size: int):
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.children = {}
+        self.total_files = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._build("root", depth, fanout, files_per_folder)
+
+    def _build(self, folder_id, depth, fanout, files_per_folder):
+        items = [
+            {'id': f"{folder_id}/f{i}", 'name': f"horario_{i:04d}.pdf", 'mimeType': PDF,
+             'md5Checksum': f"md5-{folder_id}-{i}", 'modifiedTime': "2024-01-01T00:00:00Z", 'parents': [folder_id]}
+            for i in range(files_per_folder)
+        ]
+        self.total_files += files_per_folder
+        if depth > 0:
+            for j in range(fanout):
+                sub_id = f"{folder_id}/d{j}"
+                items.append({'id': sub_id, 'name': f"carpeta_{j}", 'mimeType': FOLDER_MIME_TYPE, 'parents': [folder_id]})
+                self._build(sub_id, depth - 1, fanout, files_per_folder)
+        self.children[folder_id] = items
+
+    def service(self):
+        drive = self
+
+        class Service:
+            def files(self):
+                return FakeFiles(drive)
+        return Service()
+
+    def list(self, query, page_size, page_token):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency)
+        parents = re.findall(r"'([^']+)' in parents", query)
+        included = re.findall(r"mimeType='([^']+)'", query)
+        excluded = re.findall(r"mimeType != '([^']+)'", query)
+        items = [item for parent in parents for item in self.children.get(parent, [])]
+        if included:
+            items = [item for item in items if item['mimeType'] in included]
+        items = [item for item in items if item['mimeType'] not in excluded]
+
+        start = int(page_token or 0)
+        size = min(page_size, self.max_page_size)
+        response = {'files': items[start:start + size]}
+        if start + size < len(items):
+            response['nextPageToken'] = str(start + size)
+        return response
+
+
+def legacy_list(service, folder_id, file_types):
+    """Algoritmo anterior de DriveService.list_files_in_folder (sin paginar, recursión secuencial)."""
+    files = service.files().list(
+        q=f"'{folder_id}' in parents and trashed=false and mimeType != '{FOLDER_MIME_TYPE}'", pageSize=1000
+    ).execute().get('files', [])
+    files = [f for f in files if f.get('mimeType') in file_types]
+    subfolders = service.files().list(
+        q=f"'{folder_id}' in parents and trashed=false and mimeType='{FOLDER_MIME_TYPE}'", pageSize=100
+    ).execute().get('files', [])
+    for subfolder in subfolders:
+        files.extend(legacy_list(service, subfolder['id'], file_types))
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=5)
+    parser.add_argument("--files", type=int, default=150, help="PDFs por carpeta")
+    parser.add_argument("--latency", type=float, default=0.05, help="Segundos por files().list")
+    parser.add_argument("--max-page-size", type=int, default=100, help="Tope de página del servidor falso")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--parents-per-query", type=int, default=20)
+    args = parser.parse_args()
+
+    drive = FakeDrive(args.depth, args.fanout, args.files, args.latency, args.max_page_size)
+    print(f"🌳 Árbol falso: {len(drive.children)} carpetas, {drive.total_files} PDFs")
+
+    drive.requests = 0
+    start = time.perf_counter()
+    legacy = legacy_list(drive.service(), "root", [PDF])
+    legacy_time = time.perf_counter() - start
+    legacy_requests = drive.requests
+
+    drive.requests = 0
+    lister = DriveFolderLister(drive.service, max_workers=args.concurrency, parents_per_query=args.parents_per_query)
+    start = time.perf_counter()
+    files = lister.list_files("root", [PDF], recursive=True)
+    new_time = time.perf_counter() - start
+
+    print(f"{'Listado':<32} | {'archivos':>8} | {'consultas':>9} | {'tiempo':>8}")
+    print(f"{'Anterior (1 página/carpeta)':<32} | {len(legacy):>8} | {legacy_requests:>9} | {legacy_time:7.2f}s")
+    print(f"{'DriveFolderLister':<32} | {len(files):>8} | {drive.requests:>9} | {new_time:7.2f}s")
+    complete = len(files) == drive.total_files == len({f['id'] for f in files})
+    print(f"Listado completo y sin duplicados: {'✅' if complete else '❌'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Prueba de carga de la extracción de horarios contra un modelo Gemini falso local.
+
+El modelo falso impone su propia cuota (ventana deslizante de peticiones por
+segundo), responde 429 "Resource exhausted" al excederla y, con cierta
+probabilidad, 503. Se mide ScheduleProcessor._extract_batches con 1 hilo
+(secuencial) y con N hilos bajo el GeminiRateLimiter, y se verifica que todos
+los lotes vuelven completos y en orden.
+
+El segundo escenario usa lotes grandes y una cuota de tokens por minuto (TPM) en el
+modelo falso, de modo que es el límite de tokens el que manda. Para no esperar
+minutos reales, el limitador y la cuota usan un reloj acelerado (--minute-seconds
+segundos reales por minuto de cuota). Se compara el limitador sin límite de tokens
+(solo RPM) contra el limitador con el TPM de la cuota.
+
+Uso (desde la raíz del repositorio):
+    python -m backend.benchmarks.bench_gemini_rate_limiter --batches 40 --concurrency 4
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+
+from backend.services.gemini_rate_limiter import GeminiRateLimiter, TokenBucket, estimate_tokens
+from backend.services.llm_response_cache import LLMResponseCache
+from backend.services.schedule_processor import ScheduleProcessor
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """Simula generate_content con latencia, cuota por ventana y errores 503 aleatorios."""
+
+    def __init__(self, quota_per_second: int, latency: float, error_503_rate: float, seed: int = 0,
+                 tokens_per_minute: float = None, clock=time.monotonic):
+        self.quota_per_second = quota_per_second
+        # Cuota de tokens por minuto (como la de Vertex AI), medida con `clock`
+        self._token_quota = TokenBucket(tokens_per_minute, capacity=tokens_per_minute, clock=clock) if tokens_per_minute else None
+        self._clock = clock
+        self.latency = latency
+        self.error_503_rate = error_503_rate
+        self._random = random.Random(seed)
+        self._window = deque()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.rejected_429 = 0
+        self.rejected_503 = 0
+
+    def generate_content(self, prompt, generation_config=None):
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            while self._window and now - self._window[0] > 1.0:
+                self._window.popleft()
+            if len(self._window) >= self.quota_per_second:
+                self.rejected_429 += 1
+                raise Exception("429 Resource exhausted")
+            if self._token_quota is not None and self._token_quota.try_take(estimate_tokens(prompt), self._clock()) > 0:
+                self.rejected_429 += 1
+                raise Exception("429 Resource exhausted")
+            self._window.append(now)
+            if self._random.random() < self.error_503_rate:
+                self.rejected_503 += 1
+                raise Exception("503 Service Unavailable")
+        time.sleep(self.latency)
+        # Devuelve una asignación con el número de lote para verificar el orden
+        batch_no = prompt.split("LOTE-")[1].split()[0]
+        return FakeResponse(json.dumps([
+            {"curso_codigo": f"ICSI{batch_no}", "curso_nombre": f"CURSO {batch_no}", "docente_nombre": "JUAN PEREZ"}
+        ]))
+
+
+class FakeScheduleProcessor(ScheduleProcessor):
+    def __init__(self, fake_model, rate_limiter):
+        super().__init__()
+        self._fake_model = fake_model
+        self.rate_limiter = rate_limiter
+        # Sin cache LLM: cada corrida debe llegar al modelo
+        self.response_cache = LLMResponseCache(enabled=False)
+
+    @property
+    def model(self):
+        return self._fake_model
+
+
+def extract_all(processor: ScheduleProcessor, batch_texts, concurrency: int) -> bool:
+    """True si todos los lotes volvieron completos y en orden; un lote agotado aborta la extracción."""
+    try:
+        results = processor._extract_batches(batch_texts, "2024-10", concurrency=concurrency)
+    except RuntimeError as e:
+        print(f"   ❌ Extracción incompleta: {e}")
+        return False
+    codes = [r["curso_codigo"] for r in results]
+    return codes == [f"ICSI{i:04d}" for i in range(len(batch_texts))]
+
+
+def run(batches: int, concurrency: int, rpm: float, quota_per_second: int, latency: float, error_503_rate: float):
+    fake_model = FakeGeminiModel(quota_per_second, latency, error_503_rate)
+    limiter = GeminiRateLimiter(requests_per_minute=rpm, tokens_per_minute=10_000_000)
+    processor = FakeScheduleProcessor(fake_model, limiter)
+    batch_texts = [f"LOTE-{i:04d} --- PÁGINA {i * 5 + 1} ---" for i in range(batches)]
+
+    start = time.perf_counter()
+    ok = extract_all(processor, batch_texts, concurrency)
+    elapsed = time.perf_counter() - start
+    print(
+        f"concurrencia={concurrency:>2} | {elapsed:6.2f}s | lotes/s={batches / elapsed:6.2f} | "
+        f"llamadas={fake_model.calls} | 429={fake_model.rejected_429} | 503={fake_model.rejected_503} | "
+        f"espera limitador={limiter.stats['waited_seconds']:.2f}s | completo y en orden={'✅' if ok else '❌'}"
+    )
+
+
+def run_tpm(label: str, batches: int, concurrency: int, limiter_tpm: float, quota_tpm: float,
+            batch_tokens: int, minute_seconds: float):
+    # Reloj acelerado compartido por la cuota y el limitador
+    speed = 60.0 / minute_seconds
+    clock = lambda: time.monotonic() * speed
+    sleep = lambda seconds: time.sleep(seconds / speed)
+
+    fake_model = FakeGeminiModel(quota_per_second=10_000, latency=0.01, error_503_rate=0.0,
+                                 tokens_per_minute=quota_tpm, clock=clock)
+    limiter = GeminiRateLimiter(requests_per_minute=1_000_000, tokens_per_minute=limiter_tpm, clock=clock, sleep=sleep)
+    processor = FakeScheduleProcessor(fake_model, limiter)
+    batch_texts = [f"LOTE-{i:04d} " + "x" * (batch_tokens * 4) for i in range(batches)]
+
+    start = time.perf_counter()
+    ok = extract_all(processor, batch_texts, concurrency)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<14} | {elapsed:6.2f}s | minutos de cuota={elapsed / minute_seconds:5.2f} | "
+        f"llamadas={fake_model.calls} | 429={fake_model.rejected_429} | "
+        f"enfriamientos={limiter.stats['throttled']} | completo y en orden={'✅' if ok else '❌'}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batches", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=420, help="Peticiones/min del limitador (por debajo de la cuota real)")
+    parser.add_argument("--quota-per-second", type=int, default=8, help="Cuota real del modelo falso")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--error-503-rate", type=float, default=0.05)
+    parser.add_argument("--tpm", type=float, default=100_000, help="Cuota de tokens/min del escenario TPM")
+    parser.add_argument("--batch-tokens", type=int, default=20_000, help="Tokens aproximados por lote en el escenario TPM")
+    parser.add_argument("--minute-seconds", type=float, default=1.0, help="Segundos reales por minuto de cuota")
+    args = parser.parse_args()
+
+    print("Escenario RPM")
+    for concurrency in (1, args.concurrency):
+        run(args.batches, concurrency, args.rpm, args.quota_per_second, args.latency, args.error_503_rate)
+
+    print(f"Escenario TPM ({args.tpm:.0f} tokens/min, ~{args.batch_tokens} tokens por lote)")
+    run_tpm("solo RPM", args.batches, args.concurrency, 10_000_000, args.tpm, args.batch_tokens, args.minute_seconds)
+    run_tpm("RPM + TPM", args.batches, args.concurrency, args.tpm, args.tpm, args.batch_tokens, args.minute_seconds)
+
+
+if __name__ == "__main__":
+    main()
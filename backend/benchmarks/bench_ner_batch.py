@@ -0,0 +1,84 @@
+"""
+Benchmark del NER de habilidades (docs/seg).
+
+Compara, sobre un corpus sintético de CVs armado con las listas de ner_keywords:
+  1. Por llamada con el pipeline completo de es_core_news_lg (camino anterior).
+  2. Por llamada con extract_entities (solo tokenizador + EntityRuler).
+  3. extract_entities_batch (nlp.pipe, mismo pipeline recortado).
+Verifica además que los tres caminos devuelven las mismas entidades.
+
+Uso (desde la raíz del repositorio):
+    python -m backend.benchmarks.bench_ner_batch --docs 200 --n-process 1
+"""
+import argparse
+import random
+import time
+
+from backend.services.ner_keywords import (
+    PATTERNS_AREAS,
+    PATTERNS_CONTENIDOS,
+    PATTERNS_HERRAMIENTAS,
+    PATTERNS_LENGUAJES,
+    PATTERNS_METODOLOGIAS,
+)
+from backend.services.ner_service import (
+    _entities_from_doc,
+    extract_entities,
+    extract_entities_batch,
+    get_nlp,
+)
+
+FILLER = (
+    "Docente universitario con experiencia en proyectos de investigación y desarrollo. "
+    "Participó en la formulación de planes de estudio y en la asesoría de tesis. "
+)
+
+
+def build_corpus(n_docs: int, terms_per_doc: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocabulary = PATTERNS_AREAS + PATTERNS_LENGUAJES + PATTERNS_HERRAMIENTAS + PATTERNS_METODOLOGIAS + PATTERNS_CONTENIDOS
+    docs = []
+    for _ in range(n_docs):
+        terms = rng.sample(vocabulary, min(terms_per_doc, len(vocabulary)))
+        docs.append(FILLER * 3 + "Habilidades: " + ", ".join(terms) + ". " + FILLER * 3)
+    return docs
+
+
+def timed(label: str, fn, n_docs: int):
+    start = time.perf_counter()
+    results = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<45} | {elapsed:7.2f}s | {n_docs / elapsed:8.1f} docs/s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--terms-per-doc", type=int, default=25)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--n-process", type=int, default=1)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    nlp = get_nlp()
+    if nlp is None:
+        print("❌ No se pudo cargar es_core_news_lg")
+        return
+    print(f"📦 Modelo cargado en {time.perf_counter() - start:.2f}s | pipeline: {nlp.pipe_names}")
+
+    corpus = build_corpus(args.docs, args.terms_per_doc)
+
+    full = timed("Por llamada, pipeline completo (anterior)", lambda: [_entities_from_doc(nlp(text)) for text in corpus], args.docs)
+    single = timed("Por llamada, extract_entities (recortado)", lambda: [extract_entities(text) for text in corpus], args.docs)
+    batch = timed(
+        f"extract_entities_batch (batch={args.batch_size}, n_process={args.n_process})",
+        lambda: extract_entities_batch(corpus, batch_size=args.batch_size, n_process=args.n_process),
+        args.docs
+    )
+
+    print(f"Resultados idénticos: {'✅' if full == single == batch else '❌'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark del camino de cache-hit de RecomendacionCache.
+
+Compara la carga anterior (filas del cache + un get_docente_by_id por fila, N+1)
+contra crud.get_recomendaciones_cache_with_docentes (un solo SELECT con JOIN)
+para top_k = 20, 100 y 500, sobre una base SQLite temporal.
+
+Uso (desde la raíz del repositorio):
+    python -m backend.benchmarks.bench_recomendacion_cache
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.database import crud
+from backend.database.db_session import Base
+from backend.database.models import Curso, Docente, RecomendacionCache
+
+TOP_KS = [20, 100, 500]
+
+
+def populate(db, n_docentes: int, cv_chars: int):
+    """Un curso y n_docentes docentes, todos en el cache del curso."""
+    curso = Curso(drive_file_id="bench-curso", nombre="Curso Benchmark", ciclo=1)
+    db.add(curso)
+    db.flush()
+    docentes = [
+        Docente(
+            drive_file_id=f"bench-docente-{i}",
+            nombre=f"Docente {i}",
+            email=f"docente{i}@example.com",
+            grado="Magíster",
+            areas=["Machine Learning", "Backend"],
+            herramientas=["Docker", "Git"],
+            lenguajes=["Python", "SQL"],
+            metodologias=["Scrum"],
+            cv_text="x" * cv_chars
+        )
+        for i in range(n_docentes)
+    ]
+    db.add_all(docentes)
+    db.flush()
+    now = datetime.utcnow()
+    db.bulk_insert_mappings(RecomendacionCache, [
+        {
+            'curso_id': curso.id,
+            'docente_id': d.id,
+            'score_combinado': 90.0 - i * 0.01,
+            'score_historico': 50.0,
+            'score_semantico': 70.0,
+            'evidencias': {'areas': ["Backend"], 'lenguajes': ["Python"]},
+            'shap_explanations': {'semantic_score': 0.1, 'history_score': 0.05},
+            'ranking_position': i + 1,
+            'fecha_generada': now
+        }
+        for i, d in enumerate(docentes)
+    ])
+    db.commit()
+    return curso.id
+
+
+def load_n_plus_one(db, curso_id: int, top_k: int) -> int:
+    """Camino anterior: filas del cache y luego un SELECT por docente."""
+    entries = crud.get_recomendaciones_cache(db, curso_id)[:top_k]
+    loaded = 0
+    for entry in entries:
+        docente = crud.get_docente_by_id(db, entry.docente_id)
+        if docente:
+            loaded += 1
+    return loaded
+
+
+def load_joined(db, curso_id: int, top_k: int) -> int:
+    return len(crud.get_recomendaciones_cache_with_docentes(db, curso_id, limit=top_k))
+
+
+def measure(session_factory, loader, curso_id: int, top_k: int, repeats: int) -> float:
+    """Mediana en ms; sesión nueva por repetición para no medir el identity map."""
+    timings = []
+    for _ in range(repeats):
+        db = session_factory()
+        try:
+            start = time.perf_counter()
+            loader(db, curso_id, top_k)
+            timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            db.close()
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del cache-hit de recomendaciones")
+    parser.add_argument("--repeats", type=int, default=15)
+    parser.add_argument("--cv-chars", type=int, default=3000, help="Tamaño del cv_text de cada docente")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+    Base.metadata.create_all(bind=engine)
+    SessionBench = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = SessionBench()
+    curso_id = populate(db, max(TOP_KS), args.cv_chars)
+    db.close()
+
+    print(f"{'top_k':>6} | {'N+1 (ms)':>10} | {'JOIN (ms)':>10} | {'speedup':>8}")
+    for top_k in TOP_KS:
+        old_ms = measure(SessionBench, load_n_plus_one, curso_id, top_k, args.repeats)
+        new_ms = measure(SessionBench, load_joined, curso_id, top_k, args.repeats)
+        print(f"{top_k:>6} | {old_ms:>10.2f} | {new_ms:>10.2f} | {old_ms / new_ms:>7.1f}x")
@@ -0,0 +1,80 @@
+"""
+Verificación de equivalencia del motor PhraseMatcher (NER_ENGINE=phrase)
+contra el motor actual (es_core_news_lg + EntityRuler).
+
+Corre ambos motores sobre el corpus sintético de bench_ner_batch y, con --db,
+también sobre los cv_text y syllabus_text guardados. Compara las cinco
+categorías ya normalizadas (normalize_term) documento por documento, e informa
+el tiempo de carga y los docs/seg de cada motor. Sale con código 1 si hay diferencias.
+
+Uso (desde la raíz del repositorio):
+    python -m backend.benchmarks.verify_skill_matcher --docs 300 --db
+"""
+import argparse
+import sys
+import time
+
+from backend.benchmarks.bench_ner_batch import build_corpus
+from backend.services.ner_service import _entities_from_doc, load_spacy_model, ruler_only_disabled
+from backend.services.skill_matcher import load_skill_matcher
+
+
+def load_db_texts():
+    from backend.database.db_session import SessionLocal
+    from backend.database.models import Curso, Docente
+    db = SessionLocal()
+    try:
+        texts = [t for (t,) in db.query(Docente.cv_text).filter(Docente.cv_text.isnot(None))]
+        texts += [t for (t,) in db.query(Curso.syllabus_text).filter(Curso.syllabus_text.isnot(None))]
+        return texts
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=300)
+    parser.add_argument("--db", action="store_true", help="Incluir los textos de la base de datos")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.docs, terms_per_doc=25)
+    if args.db:
+        corpus += load_db_texts()
+
+    start = time.perf_counter()
+    nlp = load_spacy_model()
+    spacy_load = time.perf_counter() - start
+    if nlp is None:
+        print("❌ No se pudo cargar es_core_news_lg")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    engine = load_skill_matcher()
+    phrase_load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = [_entities_from_doc(doc) for doc in nlp.pipe(corpus, disable=ruler_only_disabled(nlp))]
+    spacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [_entities_from_doc(doc) for doc in engine.pipe(corpus)]
+    phrase_time = time.perf_counter() - start
+
+    print(f"{'Motor':<30} | {'carga':>8} | {'docs/s':>9}")
+    print(f"{'es_core_news_lg + EntityRuler':<30} | {spacy_load:7.2f}s | {len(corpus) / spacy_time:9.1f}")
+    print(f"{'blank es + PhraseMatcher':<30} | {phrase_load:7.2f}s | {len(corpus) / phrase_time:9.1f}")
+
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, actual)) if a != b]
+    for i in mismatches[:10]:
+        for key in expected[i]:
+            if expected[i][key] != actual[i][key]:
+                print(f"  doc {i} [{key}]: EntityRuler={expected[i][key]} | PhraseMatcher={actual[i][key]}")
+
+    if mismatches:
+        print(f"❌ {len(mismatches)}/{len(corpus)} documentos con diferencias")
+        sys.exit(1)
+    print(f"✅ Salidas idénticas en {len(corpus)} documentos")
+
+
+if __name__ == "__main__":
+    main()
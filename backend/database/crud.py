@@ -1,6 +1,7 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from backend.database.models import Docente, Curso, Historial, Recomendacion, Procesamiento, RecomendacionCache
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session, defer
+from typing import Dict, Iterator, List, Optional, Tuple
+from backend.database.models import Docente, Curso, Historial, HistorialResumen, Recomendacion, Procesamiento, RecomendacionCache, ArchivoHorario, ArchivoProcesamiento
 from datetime import datetime, timedelta
 
 
@@ -17,9 +18,42 @@ def get_docente_by_id(db: Session, docente_id: int) -> Optional[Docente]:
 def get_docente_by_drive_id(db: Session, drive_file_id: str) -> Optional[Docente]:
     return db.query(Docente).filter(Docente.drive_file_id == drive_file_id).first()
 
+# Tamaño de lote por defecto al recorrer catálogos completos con yield_per
+CATALOGUE_BATCH_SIZE = 500
+
 def get_all_docentes(db: Session, skip: int = 0, limit: int = 100) -> List[Docente]:
     return db.query(Docente).offset(skip).limit(limit).all()
 
+def get_docentes_page(db: Session, after_id: Optional[int] = None, limit: int = 100) -> List[Docente]:
+    """Paginación por keyset (id > after_id): coste constante sin importar la página."""
+    query = db.query(Docente)
+    if after_id is not None:
+        query = query.filter(Docente.id > after_id)
+    return query.order_by(Docente.id).limit(limit).all()
+
+def iter_docentes(db: Session, batch_size: int = CATALOGUE_BATCH_SIZE) -> Iterator[Docente]:
+    """Recorre todo el catálogo de docentes en lotes (memoria acotada), sin límite de filas."""
+    return db.query(Docente).order_by(Docente.id).yield_per(batch_size)
+
+def iter_docentes_updated_since(db: Session, since: datetime, batch_size: int = CATALOGUE_BATCH_SIZE) -> Iterator[Docente]:
+    """Docentes creados o modificados desde `since` (inclusive), en lotes."""
+    return db.query(Docente).filter(Docente.updated_at >= since).order_by(Docente.id).yield_per(batch_size)
+
+def get_docentes_watermark(db: Session) -> Tuple[int, Optional[datetime]]:
+    """Número de docentes y su última modificación: cambia cuando cambia el catálogo."""
+    count, last_update = db.query(func.count(Docente.id), func.max(Docente.updated_at)).one()
+    return count, last_update
+
+def get_docentes_by_ids(db: Session, docente_ids, batch_size: int = CATALOGUE_BATCH_SIZE) -> Dict[int, Docente]:
+    """Docentes por id (consultas IN de batch_size ids), sin el texto del CV."""
+    docente_ids = list(docente_ids)
+    docentes = {}
+    for start in range(0, len(docente_ids), batch_size):
+        chunk = docente_ids[start:start + batch_size]
+        for d in db.query(Docente).options(defer(Docente.cv_text)).filter(Docente.id.in_(chunk)).all():
+            docentes[d.id] = d
+    return docentes
+
 def update_docente(db: Session, docente_id: int, **kwargs) -> Optional[Docente]:
     docente = get_docente_by_id(db, docente_id)
     if docente:
@@ -61,6 +95,34 @@ def get_cursos_by_ciclo(db: Session, ciclo: int) -> List[Curso]:
 def get_all_cursos(db: Session, skip: int = 0, limit: int = 100) -> List[Curso]:
     return db.query(Curso).offset(skip).limit(limit).all()
 
+def get_cursos_page(db: Session, after_id: Optional[int] = None, limit: int = 100, ciclo: Optional[int] = None) -> List[Curso]:
+    """Paginación por keyset (id > after_id), opcionalmente filtrada por ciclo."""
+    query = db.query(Curso)
+    if ciclo is not None:
+        query = query.filter(Curso.ciclo == ciclo)
+    if after_id is not None:
+        query = query.filter(Curso.id > after_id)
+    return query.order_by(Curso.id).limit(limit).all()
+
+def iter_cursos(db: Session, batch_size: int = CATALOGUE_BATCH_SIZE) -> Iterator[Curso]:
+    """Recorre todo el catálogo de cursos en lotes (memoria acotada), sin límite de filas."""
+    return db.query(Curso).order_by(Curso.id).yield_per(batch_size)
+
+def iter_curso_profiles(db: Session, batch_size: int = CATALOGUE_BATCH_SIZE):
+    """
+    Recorre los cursos trayendo solo las columnas del perfil (texto para SBERT y
+    evidencias NER), como filas ligeras en lugar de entidades ORM.
+    """
+    return db.query(
+        Curso.id, Curso.nombre, Curso.descripcion, Curso.areas, Curso.lenguajes,
+        Curso.herramientas, Curso.metodologias, Curso.contenidos
+    ).order_by(Curso.id).yield_per(batch_size)
+
+def set_cursos_embedding_hash(db: Session, hashes: Dict[int, str]):
+    """Actualiza embedding_hash de varios cursos en un solo lote (sin commit)."""
+    if hashes:
+        db.bulk_update_mappings(Curso, [{'id': curso_id, 'embedding_hash': h} for curso_id, h in hashes.items()])
+
 def get_all_ciclos(db: Session) -> List[int]:
     ciclos = db.query(Curso.ciclo).distinct().order_by(Curso.ciclo).all()
     return [c[0] for c in ciclos]
@@ -76,9 +138,13 @@ def update_curso(db: Session, curso_id: int, **kwargs) -> Optional[Curso]:
     return curso
 
 
+# Filas por sentencia INSERT ... ON CONFLICT (SQLite admite hasta 32766 parámetros)
+HISTORIAL_UPSERT_BATCH_SIZE = 500
+
 def create_historial(db: Session, docente_id: int, curso_id: int, periodo: str, **kwargs) -> Historial:
     historial = Historial(docente_id=docente_id, curso_id=curso_id, periodo=periodo, **kwargs)
     db.add(historial)
+    _increment_historial_resumen(db, {(curso_id, docente_id): (1, periodo)})
     db.commit()
     db.refresh(historial)
     return historial
@@ -89,6 +155,135 @@ def get_historial_by_docente(db: Session, docente_id: int) -> List[Historial]:
 def get_historial_by_curso(db: Session, curso_id: int) -> List[Historial]:
     return db.query(Historial).filter(Historial.curso_id == curso_id).all()
 
+def get_historial_counts_by_curso(db: Session, curso_id: int) -> Dict[int, int]:
+    """Semestres dictados por docente en el curso (lectura por PK de historial_resumen)."""
+    rows = db.query(HistorialResumen.docente_id, HistorialResumen.semesters_taught).filter(HistorialResumen.curso_id == curso_id).all()
+    return {docente_id: count for docente_id, count in rows}
+
+def get_historial_counts(db: Session) -> List[tuple]:
+    return db.query(HistorialResumen.curso_id, HistorialResumen.docente_id, HistorialResumen.semesters_taught).all()
+
+def rebuild_historial_resumen(db: Session) -> int:
+    """Recalcula historial_resumen desde historiales (carga inicial o reparación)."""
+    db.query(HistorialResumen).delete(synchronize_session=False)
+    select_stmt = db.query(
+        Historial.curso_id, Historial.docente_id, func.count(Historial.id), func.max(Historial.periodo)
+    ).group_by(Historial.curso_id, Historial.docente_id)
+    db.execute(HistorialResumen.__table__.insert().from_select(
+        ['curso_id', 'docente_id', 'semesters_taught', 'last_periodo'], select_stmt.statement
+    ))
+    db.commit()
+    return db.query(func.count()).select_from(HistorialResumen).scalar()
+
+def _dialect_insert(db: Session):
+    """insert() con soporte ON CONFLICT para SQLite/PostgreSQL, o None en otros motores."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    return None
+
+def _increment_historial_resumen(db: Session, increments: Dict[tuple, tuple]) -> None:
+    """
+    Suma semestres nuevos al resumen. increments: (curso_id, docente_id) -> (nuevos, último periodo).
+    Los periodos tienen formato AAAA-10/AAAA-20, así que se comparan como texto.
+    """
+    if not increments:
+        return
+    rows = [
+        {'curso_id': cur_id, 'docente_id': doc_id, 'semesters_taught': nuevos, 'last_periodo': periodo}
+        for (cur_id, doc_id), (nuevos, periodo) in increments.items()
+    ]
+    insert = _dialect_insert(db)
+    if insert is None:
+        for row in rows:
+            resumen = db.get(HistorialResumen, (row['curso_id'], row['docente_id']))
+            if resumen:
+                resumen.semesters_taught += row['semesters_taught']
+                if not resumen.last_periodo or row['last_periodo'] > resumen.last_periodo:
+                    resumen.last_periodo = row['last_periodo']
+            else:
+                db.add(HistorialResumen(**row))
+        db.flush()
+        return
+
+    table = HistorialResumen.__table__
+    for start in range(0, len(rows), HISTORIAL_UPSERT_BATCH_SIZE):
+        stmt = insert(table).values(rows[start:start + HISTORIAL_UPSERT_BATCH_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.curso_id, table.c.docente_id],
+            set_={
+                'semesters_taught': table.c.semesters_taught + stmt.excluded.semesters_taught,
+                'last_periodo': case(
+                    (table.c.last_periodo.is_(None), stmt.excluded.last_periodo),
+                    (stmt.excluded.last_periodo > table.c.last_periodo, stmt.excluded.last_periodo),
+                    else_=table.c.last_periodo
+                )
+            }
+        )
+        db.execute(stmt)
+
+def get_historial_keys_by_periodos(db: Session, periodos: List[str]) -> set:
+    """Claves (docente_id, curso_id, periodo) ya registradas en los periodos indicados."""
+    if not periodos:
+        return set()
+    rows = db.query(Historial.docente_id, Historial.curso_id, Historial.periodo).filter(Historial.periodo.in_(periodos)).all()
+    return {tuple(row) for row in rows}
+
+def upsert_historial_counts(db: Session, counts: Dict[tuple, int], resultado: str = "Asignado en Horario",
+                            batch_size: int = HISTORIAL_UPSERT_BATCH_SIZE) -> int:
+    """
+    Inserta o incrementa 'veces' para cada clave (docente_id, curso_id, periodo) con
+    INSERT ... ON CONFLICT DO UPDATE en lotes. No hace commit.
+    Devuelve cuántas claves eran nuevas.
+    """
+    if not counts:
+        return 0
+    existing = get_historial_keys_by_periodos(db, sorted({key[2] for key in counts}))
+    new_keys = [key for key in counts if key not in existing]
+    new_count = len(new_keys)
+
+    # Cada clave nueva es un semestre más del docente en el curso
+    increments: Dict[tuple, tuple] = {}
+    for doc_id, cur_id, periodo in new_keys:
+        nuevos, ultimo = increments.get((cur_id, doc_id), (0, periodo))
+        increments[(cur_id, doc_id)] = (nuevos + 1, max(ultimo, periodo))
+    now = datetime.utcnow()
+    rows = [
+        {'docente_id': doc_id, 'curso_id': cur_id, 'periodo': periodo, 'resultado': resultado,
+         'veces': veces, 'ultima_vez': now, 'created_at': now}
+        for (doc_id, cur_id, periodo), veces in counts.items()
+    ]
+
+    insert = _dialect_insert(db)
+    if insert is None:
+        # Otros motores: actualizaciones e inserciones con las claves ya cargadas
+        for row in rows:
+            key = (row['docente_id'], row['curso_id'], row['periodo'])
+            if key in existing:
+                db.query(Historial).filter(
+                    Historial.docente_id == key[0], Historial.curso_id == key[1], Historial.periodo == key[2]
+                ).update({Historial.veces: Historial.veces + row['veces'], Historial.ultima_vez: now}, synchronize_session=False)
+            else:
+                db.add(Historial(**row))
+        db.flush()
+        _increment_historial_resumen(db, increments)
+        return new_count
+
+    table = Historial.__table__
+    for start in range(0, len(rows), batch_size):
+        stmt = insert(table).values(rows[start:start + batch_size])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.docente_id, table.c.curso_id, table.c.periodo],
+            set_={'veces': table.c.veces + stmt.excluded.veces, 'ultima_vez': stmt.excluded.ultima_vez}
+        )
+        db.execute(stmt)
+    _increment_historial_resumen(db, increments)
+    return new_count
+
 
 def create_recomendacion(db: Session, curso_id: int, docente_id: int, score: float, confidence: float, explanations: list) -> Recomendacion:
     recomendacion = Recomendacion(curso_id=curso_id, docente_id=docente_id, score=score, confidence=confidence, explanations=explanations)
@@ -105,22 +300,44 @@ def invalidate_recomendaciones_by_curso(db: Session, curso_id: int):
     db.commit()
 
 
-def create_procesamiento(db: Session, folder_id: str, folder_type: str, files_total: int) -> Procesamiento:
-    procesamiento = Procesamiento(folder_id=folder_id, folder_type=folder_type, status='processing', files_total=files_total)
+def get_drive_fingerprints(db: Session, model) -> Dict[str, dict]:
+    """
+    drive_file_id -> {id, drive_folder_id, drive_md5_checksum, drive_modified_time}
+    para Docente, Curso o ArchivoHorario, en una sola consulta de columnas.
+    """
+    rows = db.query(
+        model.id, model.drive_file_id, model.drive_folder_id, model.drive_md5_checksum, model.drive_modified_time
+    ).filter(model.drive_file_id.isnot(None)).all()
+    return {
+        row.drive_file_id: {
+            'id': row.id,
+            'drive_folder_id': row.drive_folder_id,
+            'drive_md5_checksum': row.drive_md5_checksum,
+            'drive_modified_time': row.drive_modified_time,
+        }
+        for row in rows
+    }
+
+def save_archivo_horario(db: Session, drive_file_id: str, nombre: str, registros: int, **tracking) -> ArchivoHorario:
+    archivo = db.query(ArchivoHorario).filter(ArchivoHorario.drive_file_id == drive_file_id).first()
+    if not archivo:
+        archivo = ArchivoHorario(drive_file_id=drive_file_id)
+        db.add(archivo)
+    archivo.nombre = nombre
+    archivo.registros = registros
+    archivo.procesado_at = datetime.utcnow()
+    for key, value in tracking.items():
+        setattr(archivo, key, value)
+    db.commit()
+    return archivo
+
+def create_procesamiento(db: Session, folder_id: str, folder_type: str, files_total: int, status: str = 'processing') -> Procesamiento:
+    procesamiento = Procesamiento(folder_id=folder_id, folder_type=folder_type, status=status, files_total=files_total)
     db.add(procesamiento)
     db.commit()
     db.refresh(procesamiento)
     return procesamiento
 
-def update_procesamiento_progress(db: Session, procesamiento_id: int, files_processed: int):
-    procesamiento = db.query(Procesamiento).filter(Procesamiento.id == procesamiento_id).first()
-    if procesamiento:
-        procesamiento.files_processed = files_processed
-        if files_processed >= procesamiento.files_total:
-            procesamiento.status = 'completed'
-            procesamiento.completed_at = datetime.utcnow()
-        db.commit()
-
 def mark_procesamiento_error(db: Session, procesamiento_id: int, error_message: str):
     procesamiento = db.query(Procesamiento).filter(Procesamiento.id == procesamiento_id).first()
     if procesamiento:
@@ -129,6 +346,154 @@ def mark_procesamiento_error(db: Session, procesamiento_id: int, error_message:
         procesamiento.completed_at = datetime.utcnow()
         db.commit()
 
+# --- COLA DE PROCESAMIENTOS ---
+
+PROCESAMIENTO_ACTIVE_STATUSES = ('queued', 'listing', 'processing', 'interrupted')
+
+def get_procesamiento(db: Session, procesamiento_id: int) -> Optional[Procesamiento]:
+    return db.query(Procesamiento).filter(Procesamiento.id == procesamiento_id).first()
+
+def get_active_procesamiento(db: Session, folder_id: str, folder_type: str) -> Optional[Procesamiento]:
+    """Procesamiento sin terminar de la misma carpeta y tipo (se reanuda en vez de crear otro)."""
+    return db.query(Procesamiento).filter(
+        Procesamiento.folder_id == folder_id,
+        Procesamiento.folder_type == folder_type,
+        Procesamiento.status.in_(PROCESAMIENTO_ACTIVE_STATUSES)
+    ).order_by(Procesamiento.id.desc()).first()
+
+def set_procesamiento_status(db: Session, procesamiento_id: int, status: str, **fields):
+    procesamiento = get_procesamiento(db, procesamiento_id)
+    if procesamiento:
+        procesamiento.status = status
+        for key, value in fields.items():
+            setattr(procesamiento, key, value)
+        db.commit()
+
+def mark_interrupted_procesamientos(db: Session) -> int:
+    """
+    Al arrancar: los procesamientos que quedaron a medias (caída del servidor) pasan a
+    'interrupted' y sus archivos en curso vuelven a 'pending' para reanudarse.
+    """
+    interrupted = db.query(Procesamiento).filter(
+        Procesamiento.status.in_(('queued', 'listing', 'processing'))
+    ).update({Procesamiento.status: 'interrupted'}, synchronize_session=False)
+    db.query(ArchivoProcesamiento).filter(
+        ArchivoProcesamiento.status == 'processing'
+    ).update({ArchivoProcesamiento.status: 'pending'}, synchronize_session=False)
+    db.commit()
+    return interrupted
+
+def register_archivos_procesamiento(db: Session, procesamiento_id: int, files: List[Dict], status: str = 'pending', resultados: Optional[Dict[str, int]] = None) -> int:
+    """Registra los archivos listados de Drive (ignora los ya registrados). Devuelve cuántos agregó."""
+    existing = {row[0] for row in db.query(ArchivoProcesamiento.drive_file_id).filter(ArchivoProcesamiento.procesamiento_id == procesamiento_id)}
+    resultados = resultados or {}
+    added = 0
+    for file in files:
+        if file['id'] in existing:
+            continue
+        existing.add(file['id'])
+        db.add(ArchivoProcesamiento(
+            procesamiento_id=procesamiento_id,
+            drive_file_id=file['id'],
+            nombre=file.get('name'),
+            mime_type=file.get('mimeType'),
+            drive_md5_checksum=file.get('md5Checksum'),
+            drive_modified_time=file.get('modifiedTime'),
+            status=status,
+            resultado_id=resultados.get(file['id'])
+        ))
+        added += 1
+    db.commit()
+    return added
+
+def get_archivos_procesamiento(db: Session, procesamiento_id: int, statuses: Optional[List[str]] = None) -> List[ArchivoProcesamiento]:
+    query = db.query(ArchivoProcesamiento).filter(ArchivoProcesamiento.procesamiento_id == procesamiento_id)
+    if statuses:
+        query = query.filter(ArchivoProcesamiento.status.in_(statuses))
+    return query.order_by(ArchivoProcesamiento.id).all()
+
+def mark_archivo_procesamiento(db: Session, archivo_id: int, status: str, resultado_id: Optional[int] = None, error_message: Optional[str] = None):
+    archivo = db.query(ArchivoProcesamiento).filter(ArchivoProcesamiento.id == archivo_id).first()
+    if not archivo:
+        return
+    archivo.status = status
+    if status == 'processing':
+        archivo.attempts = (archivo.attempts or 0) + 1
+        archivo.started_at = datetime.utcnow()
+        archivo.error_message = None
+    else:
+        archivo.finished_at = datetime.utcnow()
+        archivo.resultado_id = resultado_id
+        archivo.error_message = error_message
+    db.commit()
+
+def count_archivos_by_status(db: Session, procesamiento_id: int) -> Dict[str, int]:
+    rows = db.query(ArchivoProcesamiento.status, func.count(ArchivoProcesamiento.id)).filter(
+        ArchivoProcesamiento.procesamiento_id == procesamiento_id
+    ).group_by(ArchivoProcesamiento.status).all()
+    return {status: count for status, count in rows}
+
+def sync_procesamiento_counts(db: Session, procesamiento_id: int) -> Dict[str, int]:
+    """Actualiza files_processed / files_failed desde el estado de los archivos."""
+    counts = count_archivos_by_status(db, procesamiento_id)
+    procesamiento = get_procesamiento(db, procesamiento_id)
+    if procesamiento:
+        procesamiento.files_processed = counts.get('done', 0) + counts.get('error', 0)
+        procesamiento.files_failed = counts.get('error', 0)
+        db.commit()
+    return counts
+
+def get_procesamiento_status(db: Session, procesamiento_id: int, max_errors: int = 100) -> Optional[Dict]:
+    """Estado de un procesamiento con throughput (archivos/min de la ejecución actual), ETA y errores por archivo."""
+    procesamiento = get_procesamiento(db, procesamiento_id)
+    if not procesamiento:
+        return None
+    counts = count_archivos_by_status(db, procesamiento_id)
+    pending = counts.get('pending', 0) + counts.get('processing', 0)
+    finished = counts.get('done', 0) + counts.get('error', 0)
+
+    throughput = None
+    eta_seconds = None
+    if procesamiento.run_started_at:
+        finished_in_run = db.query(func.count(ArchivoProcesamiento.id)).filter(
+            ArchivoProcesamiento.procesamiento_id == procesamiento_id,
+            ArchivoProcesamiento.status.in_(('done', 'error')),
+            ArchivoProcesamiento.finished_at >= procesamiento.run_started_at
+        ).scalar()
+        end = procesamiento.completed_at or datetime.utcnow()
+        elapsed = (end - procesamiento.run_started_at).total_seconds()
+        if finished_in_run and elapsed > 0:
+            throughput = finished_in_run / elapsed * 60
+            if pending and procesamiento.status == 'processing':
+                eta_seconds = round(pending / throughput * 60)
+
+    errores = db.query(ArchivoProcesamiento).filter(
+        ArchivoProcesamiento.procesamiento_id == procesamiento_id,
+        ArchivoProcesamiento.status == 'error'
+    ).order_by(ArchivoProcesamiento.finished_at).limit(max_errors).all()
+
+    return {
+        "id": procesamiento.id,
+        "folder_id": procesamiento.folder_id,
+        "folder_type": procesamiento.folder_type,
+        "status": procesamiento.status,
+        "files_total": procesamiento.files_total,
+        "files_processed": finished,
+        "files_failed": counts.get('error', 0),
+        "files_pending": pending,
+        "files_unchanged": counts.get('unchanged', 0),
+        "throughput_per_min": round(throughput, 2) if throughput else None,
+        "eta_seconds": eta_seconds,
+        "started_at": procesamiento.started_at.isoformat() if procesamiento.started_at else None,
+        "completed_at": procesamiento.completed_at.isoformat() if procesamiento.completed_at else None,
+        "error_message": procesamiento.error_message,
+        "error_details": [
+            {"filename": e.nombre, "drive_file_id": e.drive_file_id, "error": e.error_message, "attempts": e.attempts}
+            for e in errores
+        ],
+        "diff": (procesamiento.resultado or {}).get('diff'),
+    }
+
 
 def get_recomendaciones_cache(db: Session, curso_id: int, max_age_days: Optional[int] = 7) -> Optional[List[RecomendacionCache]]:
     query = db.query(RecomendacionCache).filter(RecomendacionCache.curso_id == curso_id)
@@ -138,24 +503,74 @@ def get_recomendaciones_cache(db: Session, curso_id: int, max_age_days: Optional
     cache = query.order_by(RecomendacionCache.ranking_position).all()
     return cache if cache else None
 
+def _build_cache_rows(curso_id: int, recommendations: List[dict], version_algoritmo: str, fecha: datetime) -> List[dict]:
+    return [
+        {
+            'curso_id': curso_id,
+            'docente_id': rec['docente_id'],
+            'score_combinado': rec.get('score_combinado', 0.0),
+            'score_historico': rec.get('score_historico', 0.0),
+            'score_semantico': rec.get('score_semantico', 0.0),
+            'evidencias': rec.get('evidencias', []),
+            'shap_explanations': rec.get('shap_explanations', {}),
+            'ranking_position': idx + 1,
+            'version_algoritmo': version_algoritmo,
+            'fecha_generada': fecha
+        }
+        for idx, rec in enumerate(recommendations)
+    ]
+
+def get_recomendaciones_cache_with_docentes(db: Session, curso_id: int, max_age_days: Optional[int] = 7, limit: Optional[int] = None) -> List:
+    """
+    Entradas del cache ya unidas con las columnas del docente que usa la API, en un solo SELECT.
+    Solo se cargan esas columnas (sin cv_text ni objetos ORM completos); el filtro
+    curso_id + fecha_generada usa idx_recomendacion_curso_fecha.
+    """
+    query = db.query(
+        RecomendacionCache.docente_id,
+        RecomendacionCache.score_combinado,
+        RecomendacionCache.score_historico,
+        RecomendacionCache.score_semantico,
+        RecomendacionCache.evidencias,
+        RecomendacionCache.shap_explanations,
+        Docente.nombre,
+        Docente.email,
+        Docente.grado,
+        Docente.areas,
+        Docente.herramientas,
+        Docente.lenguajes,
+        Docente.metodologias,
+    ).join(Docente, Docente.id == RecomendacionCache.docente_id).filter(RecomendacionCache.curso_id == curso_id)
+    if max_age_days is not None:
+        fecha_limite = datetime.utcnow() - timedelta(days=max_age_days)
+        query = query.filter(RecomendacionCache.fecha_generada >= fecha_limite)
+    query = query.order_by(RecomendacionCache.ranking_position)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
 def save_recomendaciones_cache(db: Session, curso_id: int, recommendations: List[dict], version_algoritmo: str = "sbert_v1.0") -> None:
     try:
         db.query(RecomendacionCache).filter(RecomendacionCache.curso_id == curso_id).delete()
-        for idx, rec in enumerate(recommendations):
-            cache_entry = RecomendacionCache(
-                curso_id=curso_id,
-                docente_id=rec['docente_id'],
-                score_combinado=rec.get('score_combinado', 0.0),
-                score_historico=rec.get('score_historico', 0.0),
-                score_semantico=rec.get('score_semantico', 0.0),
-                evidencias=rec.get('evidencias', []),
-                shap_explanations=rec.get('shap_explanations', {}),
-                ranking_position=idx + 1,
-                version_algoritmo=version_algoritmo,
-                fecha_generada=datetime.utcnow()
-            )
-            db.add(cache_entry)
+        for row in _build_cache_rows(curso_id, recommendations, version_algoritmo, datetime.utcnow()):
+            db.add(RecomendacionCache(**row))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+def save_recomendaciones_cache_bulk(db: Session, recommendations_by_curso: Dict[int, List[dict]], version_algoritmo: str = "sbert_v1.0") -> int:
+    """Reemplaza el cache de todos los cursos indicados en una sola transacción."""
+    try:
+        fecha = datetime.utcnow()
+        rows = []
+        for curso_id, recommendations in recommendations_by_curso.items():
+            rows.extend(_build_cache_rows(curso_id, recommendations, version_algoritmo, fecha))
+        db.query(RecomendacionCache).filter(RecomendacionCache.curso_id.in_(list(recommendations_by_curso.keys()))).delete(synchronize_session=False)
+        if rows:
+            db.bulk_insert_mappings(RecomendacionCache, rows)
         db.commit()
+        return len(rows)
     except Exception:
         db.rollback()
         raise
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -12,6 +12,15 @@ engine = create_engine(
     connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
 )
 
+if "sqlite" in DATABASE_URL:
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL: las lecturas de la ingesta no se bloquean mientras db_writer confirma un lote
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.close()
+
 # Crear SessionLocal
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -30,4 +39,104 @@ def get_db():
 def init_db():
     from . import models  # Importar modelos
     Base.metadata.create_all(bind=engine)
+    ensure_historial_unique_key()
+    ensure_historial_resumen()
+    ensure_drive_tracking_columns()
+    ensure_procesamiento_columns()
     print("Base de datos inicializada")
+
+def ensure_historial_unique_key():
+    """
+    Bases creadas antes de la restricción única de historiales: fusiona las filas
+    duplicadas (sumando 'veces') y crea el índice único (docente_id, curso_id, periodo).
+    """
+    inspector = inspect(engine)
+    if "historiales" not in inspector.get_table_names():
+        return
+    existing = {idx["name"] for idx in inspector.get_indexes("historiales")}
+    existing |= {uc["name"] for uc in inspector.get_unique_constraints("historiales")}
+    if "uq_historial_docente_curso_periodo" in existing:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE historiales SET veces = (
+                SELECT SUM(COALESCE(h2.veces, 1)) FROM historiales h2
+                WHERE h2.docente_id = historiales.docente_id
+                  AND h2.curso_id = historiales.curso_id
+                  AND h2.periodo = historiales.periodo
+            )
+            WHERE id IN (
+                SELECT MIN(id) FROM historiales
+                GROUP BY docente_id, curso_id, periodo HAVING COUNT(*) > 1
+            )
+        """))
+        conn.execute(text("""
+            DELETE FROM historiales WHERE id NOT IN (
+                SELECT MIN(id) FROM historiales GROUP BY docente_id, curso_id, periodo
+            )
+        """))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_historial_docente_curso_periodo "
+            "ON historiales (docente_id, curso_id, periodo)"
+        ))
+    print("Restricción única de historiales creada")
+
+def ensure_historial_resumen():
+    """
+    Índice por curso_id en historiales (create_all no lo agrega a tablas existentes)
+    y carga inicial de historial_resumen si está vacío pero ya hay historial.
+    """
+    inspector = inspect(engine)
+    if "historiales" not in inspector.get_table_names():
+        return
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_historial_curso ON historiales (curso_id)"))
+        resumen_vacio = conn.execute(text("SELECT COUNT(*) FROM historial_resumen")).scalar() == 0
+        hay_historial = conn.execute(text("SELECT COUNT(*) FROM historiales")).scalar() > 0
+    if resumen_vacio and hay_historial:
+        from .crud import rebuild_historial_resumen
+        db = SessionLocal()
+        try:
+            rows = rebuild_historial_resumen(db)
+            print(f"Resumen de historial reconstruido: {rows} pares curso-docente")
+        finally:
+            db.close()
+
+# Columnas añadidas después de crear las tablas (create_all no altera tablas existentes)
+DRIVE_TRACKING_COLUMNS = {
+    "drive_folder_id": "VARCHAR",
+    "drive_md5_checksum": "VARCHAR",
+    "drive_modified_time": "VARCHAR",
+}
+
+def ensure_drive_tracking_columns():
+    """Agrega a docentes y cursos las columnas de seguimiento de Drive si faltan."""
+    inspector = inspect(engine)
+    tables = inspector.get_table_names()
+    with engine.begin() as conn:
+        for table in ("docentes", "cursos"):
+            if table not in tables:
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table)}
+            for column, sql_type in DRIVE_TRACKING_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}"))
+                    print(f"Columna {table}.{column} agregada")
+
+PROCESAMIENTO_COLUMNS = {
+    "files_failed": "INTEGER DEFAULT 0",
+    "run_started_at": "TIMESTAMP",
+    "resultado": "JSON",
+}
+
+def ensure_procesamiento_columns():
+    """Agrega a procesamientos las columnas de la cola de trabajos si faltan."""
+    inspector = inspect(engine)
+    if "procesamientos" not in inspector.get_table_names():
+        return
+    existing = {col["name"] for col in inspector.get_columns("procesamientos")}
+    with engine.begin() as conn:
+        for column, sql_type in PROCESAMIENTO_COLUMNS.items():
+            if column not in existing:
+                conn.execute(text(f"ALTER TABLE procesamientos ADD COLUMN {column} {sql_type}"))
+                print(f"Columna procesamientos.{column} agregada")
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from .db_session import SessionLocal, engine
+
+# Escrituras agrupadas en una sola transacción (y un solo commit)
+DB_WRITER_BATCH_SIZE = int(os.getenv("DB_WRITER_BATCH_SIZE", "50"))
+# Escrituras en espera como máximo; al llenarse, quien escribe espera (backpressure)
+DB_WRITER_QUEUE_SIZE = int(os.getenv("DB_WRITER_QUEUE_SIZE", "1000"))
+
+_STOP = object()
+
+
+class BatchSession(Session):
+    """
+    Sesión del writer. Dentro de un lote, commit() solo hace flush (el writer confirma
+    el lote entero al final) y rollback() marca el lote para repetirlo operación por
+    operación, así el rollback de una operación no deshace en silencio las demás.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batching = False
+        self.batch_rolled_back = False
+
+    def commit(self):
+        if self.batching:
+            self.flush()
+        else:
+            super().commit()
+
+    def rollback(self):
+        if self.batching:
+            self.batch_rolled_back = True
+        super().rollback()
+
+
+WriterSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=BatchSession)
+
+
+def run_in_session(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Ejecuta fn(db, ...) con una sesión propia (una por tarea) y la cierra."""
+    db = SessionLocal()
+    try:
+        return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+async def read_in_session(fn: Callable[..., Any], *args) -> Any:
+    """run_in_session en el executor, para consultas desde corrutinas sin bloquear el event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, run_in_session, fn, *args)
+
+
+class DBWriter:
+    """
+    Único escritor de la ingesta concurrente: un hilo con su propia sesión que ejecuta
+    las operaciones fn(db, ...) en orden de llegada. Las que se acumulan mientras se
+    confirma un lote se agrupan (hasta batch_size) en una sola transacción. Si alguna
+    falla, el lote se deshace y se repite operación por operación, de modo que cada
+    una recibe su propio resultado o excepción.
+
+    Así las tareas concurrentes no comparten Session y la BD (SQLite incluida) solo
+    ve un escritor, sin importar cuántos archivos se descarguen y extraigan a la vez.
+    """
+
+    def __init__(self, session_factory: Callable[[], BatchSession] = WriterSessionLocal,
+                 batch_size: int = DB_WRITER_BATCH_SIZE, max_queue: int = DB_WRITER_QUEUE_SIZE):
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {'operations': 0, 'batches': 0, 'commits': 0, 'replayed_batches': 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        """Termina de escribir lo encolado y detiene el hilo."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Encola fn(db, *args, **kwargs); bloquea si la cola está llena."""
+        self.start()
+        future: Future = Future()
+        self._queue.put((fn, args, kwargs, future))
+        return future
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Versión async de submit(): espera el resultado sin bloquear el event loop."""
+        self.start()
+        future: Future = Future()
+        item = (fn, args, kwargs, future)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._queue.put, item)
+        return await asyncio.wrap_future(future)
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            batch = [item for item in batch if item[3].set_running_or_notify_cancel()]
+            if batch:
+                self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch):
+        self.stats['operations'] += len(batch)
+        self.stats['batches'] += 1
+        if len(batch) > 1 and self._write_batched(batch):
+            return
+        if len(batch) > 1:
+            self.stats['replayed_batches'] += 1
+        for item in batch:
+            self._write_single(item)
+
+    def _write_batched(self, batch) -> bool:
+        db = self.session_factory()
+        db.batching = True
+        results = []
+        try:
+            for fn, args, kwargs, _ in batch:
+                results.append(fn(db, *args, **kwargs))
+                if db.batch_rolled_back:
+                    raise RuntimeError("rollback dentro del lote")
+            db.batching = False
+            db.commit()
+            self.stats['commits'] += 1
+        except Exception:
+            db.batching = False
+            db.rollback()
+            return False
+        finally:
+            db.close()
+        for (_, _, _, future), result in zip(batch, results):
+            future.set_result(result)
+        return True
+
+    def _write_single(self, item):
+        fn, args, kwargs, future = item
+        db = self.session_factory()
+        try:
+            result = fn(db, *args, **kwargs)
+            db.commit()
+            self.stats['commits'] += 1
+            future.set_result(result)
+        except Exception as e:
+            db.rollback()
+            future.set_exception(e)
+        finally:
+            db.close()
+
+    def status(self) -> Dict[str, int]:
+        return {**self.stats, 'queued': self._queue.qsize()}
+
+
+# Instancia global
+db_writer = DBWriter()
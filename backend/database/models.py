@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, JSON, Boolean, Index
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, JSON, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .db_session import Base
@@ -20,6 +20,10 @@ class Docente(Base):
     cv_text = Column(Text, nullable=True)
     embedding_version = Column(String, default="v1.0")
     embedding_hash = Column(String, nullable=True)
+    # Versión del archivo de Drive de la que se construyó el registro (ingesta incremental)
+    drive_folder_id = Column(String, nullable=True, index=True)
+    drive_md5_checksum = Column(String, nullable=True)
+    drive_modified_time = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     historiales = relationship("Historial", back_populates="docente")
@@ -47,6 +51,10 @@ class Curso(Base):
     contenidos = Column(JSON, default=list)
     embedding_version = Column(String, default="v1.0")
     embedding_hash = Column(String, nullable=True)
+    # Versión del archivo de Drive de la que se construyó el registro (ingesta incremental)
+    drive_folder_id = Column(String, nullable=True, index=True)
+    drive_md5_checksum = Column(String, nullable=True)
+    drive_modified_time = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     historiales = relationship("Historial", back_populates="curso")
@@ -73,12 +81,45 @@ class Historial(Base):
 
     __table_args__ = (
         Index('idx_historial_docente_curso', 'docente_id', 'curso_id'),
+        # Una fila por (docente, curso, periodo): base del upsert en lote del historial
+        UniqueConstraint('docente_id', 'curso_id', 'periodo', name='uq_historial_docente_curso_periodo'),
+        Index('idx_historial_curso', 'curso_id'),
     )
 
     def __repr__(self):
         return f"<Historial(docente_id={self.docente_id}, curso_id={self.curso_id}, periodo='{self.periodo}')>"
 
 
+class HistorialResumen(Base):
+    """Agregado de historiales por (curso, docente), mantenido por la ingesta de horarios."""
+    __tablename__ = "historial_resumen"
+    
+    curso_id = Column(Integer, ForeignKey("cursos.id"), primary_key=True)
+    docente_id = Column(Integer, ForeignKey("docentes.id"), primary_key=True)
+    semesters_taught = Column(Integer, nullable=False, default=0)
+    last_periodo = Column(String, nullable=True)
+
+    def __repr__(self):
+        return f"<HistorialResumen(curso_id={self.curso_id}, docente_id={self.docente_id}, semesters_taught={self.semesters_taught})>"
+
+
+class ArchivoHorario(Base):
+    """PDF de horario ya ingerido, con la versión de Drive procesada."""
+    __tablename__ = "archivos_horario"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    drive_file_id = Column(String, unique=True, index=True, nullable=False)
+    nombre = Column(String, nullable=True)
+    drive_folder_id = Column(String, nullable=True, index=True)
+    drive_md5_checksum = Column(String, nullable=True)
+    drive_modified_time = Column(String, nullable=True)
+    registros = Column(Integer, default=0)
+    procesado_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ArchivoHorario(drive_file_id='{self.drive_file_id}', nombre='{self.nombre}')>"
+
+
 class Recomendacion(Base):
     __tablename__ = "recomendaciones"
     
@@ -134,9 +175,55 @@ class Procesamiento(Base):
     status = Column(String, nullable=False)
     files_processed = Column(Integer, default=0)
     files_total = Column(Integer, default=0)
+    files_failed = Column(Integer, default=0)
     error_message = Column(Text, nullable=True)
     started_at = Column(DateTime, default=datetime.utcnow)
+    # Inicio de la ejecución actual (cambia al reanudar): base del throughput y el ETA
+    run_started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
+    # diff de Drive y, al terminar, la respuesta final del procesamiento
+    resultado = Column(JSON, nullable=True)
 
     def __repr__(self):
         return f"<Procesamiento(id={self.id}, type='{self.type}', status='{self.status}')>"
+
+
+class ArchivoProcesamiento(Base):
+    """
+    Estado persistido de cada archivo de un procesamiento:
+    pending -> processing -> done | error, o unchanged si no cambió en Drive.
+    """
+    __tablename__ = "archivos_procesamiento"
+
+    id = Column(Integer, primary_key=True, index=True)
+    procesamiento_id = Column(Integer, ForeignKey("procesamientos.id"), nullable=False, index=True)
+    drive_file_id = Column(String, nullable=False)
+    nombre = Column(String, nullable=True)
+    mime_type = Column(String, nullable=True)
+    drive_md5_checksum = Column(String, nullable=True)
+    drive_modified_time = Column(String, nullable=True)
+    status = Column(String, nullable=False, default='pending')
+    # docente_id / curso_id guardado, o registros de historial en horarios
+    resultado_id = Column(Integer, nullable=True)
+    error_message = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('procesamiento_id', 'drive_file_id', name='uq_archivo_procesamiento'),
+        Index('idx_archivo_procesamiento_status', 'procesamiento_id', 'status'),
+    )
+
+    def to_drive_file(self) -> dict:
+        """Reconstruye el dict del listado de Drive para reanudar sin volver a listar."""
+        return {
+            'id': self.drive_file_id,
+            'name': self.nombre,
+            'mimeType': self.mime_type,
+            'md5Checksum': self.drive_md5_checksum,
+            'modifiedTime': self.drive_modified_time,
+        }
+
+    def __repr__(self):
+        return f"<ArchivoProcesamiento(procesamiento_id={self.procesamiento_id}, nombre='{self.nombre}', status='{self.status}')>"
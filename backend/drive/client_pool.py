@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Tuple
+
+# Clientes de Drive simultáneos por token (uno por hilo que descarga)
+DRIVE_POOL_SIZE = int(os.getenv("DRIVE_POOL_SIZE", "8"))
+# Los tokens OAuth caducan en ~1h: los clientes sin uso se descartan antes
+DRIVE_POOL_IDLE_SECONDS = int(os.getenv("DRIVE_POOL_IDLE_SECONDS", "900"))
+
+
+class DriveClientPool:
+    """
+    Pool thread-safe de clientes de Drive por token de acceso.
+
+    Cada cliente tiene su propio transporte HTTP (conexiones keep-alive), así que
+    solo lo usa un hilo a la vez: los hilos lo toman con lease() y lo devuelven al
+    terminar. Los clientes se reutilizan durante toda la ingesta en vez de
+    reconstruir el servicio (discovery + TLS) por cada archivo.
+
+    `client_factory(access_token)` construye un cliente nuevo.
+    """
+
+    def __init__(self, client_factory: Callable[[str], Any], max_per_token: int = DRIVE_POOL_SIZE,
+                 idle_seconds: int = DRIVE_POOL_IDLE_SECONDS):
+        self.client_factory = client_factory
+        self.max_per_token = max(1, max_per_token)
+        self.idle_seconds = idle_seconds
+        self._cond = threading.Condition()
+        self._idle: Dict[str, List[Tuple[Any, float]]] = {}
+        self._in_use: Dict[str, int] = {}
+        self.created = 0
+        self.leases = 0
+        self.discarded = 0
+
+    def _evict_idle(self, now: float):
+        for token in list(self._idle):
+            fresh = [(client, used) for client, used in self._idle[token] if now - used < self.idle_seconds]
+            self.discarded += len(self._idle[token]) - len(fresh)
+            if fresh:
+                self._idle[token] = fresh
+            elif not self._in_use.get(token):
+                del self._idle[token]
+                self._in_use.pop(token, None)
+            else:
+                self._idle[token] = []
+
+    def _acquire(self, access_token: str):
+        with self._cond:
+            while True:
+                self._evict_idle(time.monotonic())
+                idle = self._idle.setdefault(access_token, [])
+                if idle:
+                    client, _ = idle.pop()
+                    break
+                if self._in_use.get(access_token, 0) < self.max_per_token:
+                    client = None
+                    break
+                self._cond.wait()
+            self._in_use[access_token] = self._in_use.get(access_token, 0) + 1
+            self.leases += 1
+
+        if client is None:
+            try:
+                client = self.client_factory(access_token)
+            except Exception:
+                self._release(access_token, None)
+                raise
+            with self._cond:
+                self.created += 1
+        return client
+
+    def _release(self, access_token: str, client):
+        with self._cond:
+            self._in_use[access_token] -= 1
+            if client is not None:
+                self._idle.setdefault(access_token, []).append((client, time.monotonic()))
+            else:
+                self.discarded += 1
+            self._cond.notify()
+
+    @contextmanager
+    def lease(self, access_token: str):
+        """
+        Presta un cliente para el token (espera si ya hay max_per_token en uso).
+        Si el bloque lanza una excepción, el cliente se descarta: su conexión puede
+        haber quedado a medias.
+        """
+        client = self._acquire(access_token)
+        try:
+            yield client
+        except BaseException:
+            self._release(access_token, None)
+            raise
+        self._release(access_token, client)
+
+    def clear(self, access_token: str = None):
+        """Descarta los clientes ociosos (de un token o de todos)."""
+        with self._cond:
+            tokens = [access_token] if access_token else list(self._idle)
+            for token in tokens:
+                self.discarded += len(self._idle.pop(token, []))
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                'tokens': len(self._idle),
+                'idle': sum(len(clients) for clients in self._idle.values()),
+                'in_use': sum(self._in_use.values()),
+                'created': self.created,
+                'leases': self.leases,
+                'discarded': self.discarded,
+            }
@@ -0,0 +1,58 @@
+from typing import Any, Dict, List, Optional
+
+
+def tracking_fields(file: Dict[str, Any], folder_id: Optional[str]) -> Dict[str, Optional[str]]:
+    """Columnas de seguimiento a guardar junto al registro construido desde `file`."""
+    return {
+        'drive_folder_id': folder_id,
+        'drive_md5_checksum': file.get('md5Checksum'),
+        'drive_modified_time': file.get('modifiedTime'),
+    }
+
+
+def file_changed(file: Dict[str, Any], known: Dict[str, Any]) -> bool:
+    """
+    Compara el archivo listado con la versión guardada: md5Checksum si ambos lo
+    tienen (archivos binarios), si no modifiedTime. Sin huella guardada cuenta como cambio.
+    """
+    if file.get('md5Checksum') and known.get('drive_md5_checksum'):
+        return file['md5Checksum'] != known['drive_md5_checksum']
+    if file.get('modifiedTime') and known.get('drive_modified_time'):
+        return file['modifiedTime'] != known['drive_modified_time']
+    return True
+
+
+def compute_drive_diff(files: List[Dict[str, Any]], known: Dict[str, Dict[str, Any]], folder_id: Optional[str] = None) -> Dict[str, list]:
+    """
+    Clasifica los archivos listados contra los registros guardados (drive_file_id -> huella):
+    - new / changed / unchanged: archivos de Drive (dicts del listado)
+    - deleted: drive_file_ids guardados desde esta carpeta que ya no aparecen
+    """
+    diff = {'new': [], 'changed': [], 'unchanged': [], 'deleted': []}
+    listed_ids = set()
+    for file in files:
+        listed_ids.add(file['id'])
+        record = known.get(file['id'])
+        if record is None:
+            diff['new'].append(file)
+        elif file_changed(file, record):
+            diff['changed'].append(file)
+        else:
+            diff['unchanged'].append(file)
+
+    if folder_id:
+        diff['deleted'] = [
+            drive_file_id for drive_file_id, record in known.items()
+            if record.get('drive_folder_id') == folder_id and drive_file_id not in listed_ids
+        ]
+    return diff
+
+
+def diff_summary(diff: Dict[str, list]) -> Dict[str, Any]:
+    return {
+        'nuevos': len(diff['new']),
+        'modificados': len(diff['changed']),
+        'sin_cambios': len(diff['unchanged']),
+        'eliminados': len(diff['deleted']),
+        'eliminados_ids': diff['deleted'],
+    }
@@ -1,8 +1,29 @@
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseDownload
 from typing import List, Dict, Optional, Any
+from pathlib import Path
 import os
+import time
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+
+from backend.drive.client_pool import DriveClientPool
+from backend.drive.folder_lister import DriveFolderLister
+
+DRIVE_HTTP_TIMEOUT = int(os.getenv("DRIVE_HTTP_TIMEOUT", "120"))
+# Descargas en streaming: tamaño de bloque (memoria máxima por descarga) y reintentos por bloque
+DRIVE_DOWNLOAD_CHUNK_SIZE = int(os.getenv("DRIVE_DOWNLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+DRIVE_DOWNLOAD_MAX_RETRIES = int(os.getenv("DRIVE_DOWNLOAD_MAX_RETRIES", "3"))
+DRIVE_SPOOL_DIR = Path(os.getenv("DRIVE_SPOOL_DIR", "backend/data/drive_spool"))
+
+
+def build_drive_client(access_token: str):
+    """Cliente de Drive con su propio transporte httplib2 (mantiene las conexiones abiertas)."""
+    http = AuthorizedHttp(Credentials(token=access_token), http=httplib2.Http(timeout=DRIVE_HTTP_TIMEOUT))
+    return build('drive', 'v3', http=http, cache_discovery=False)
 
 
 class DriveService:
@@ -10,6 +31,13 @@ class DriveService:
     
     def __init__(self):
         self.service = None
+        self._credentials = None
+        # Clientes reutilizables para descargas concurrentes (uno por hilo a la vez)
+        self.client_pool = DriveClientPool(build_drive_client)
+
+    def _new_service(self):
+        """Cliente independiente con las mismas credenciales (uno por hilo)."""
+        return build_drive_client(self._credentials.token)
     
     def build_service(self, access_token: str):
         """
@@ -21,6 +49,7 @@ class DriveService:
         try:
             credentials = Credentials(token=access_token)
             self.service = build('drive', 'v3', credentials=credentials)
+            self._credentials = credentials
             return True
         except Exception as e:
             print(f"❌ Error construyendo servicio Drive: {e}")
@@ -80,52 +109,14 @@ class DriveService:
             if not self.service:
                 return []
             
-            all_files = []
-            
-            # Primero, obtener todos los archivos directos (no carpetas)
-            query = f"'{folder_id}' in parents and trashed=false and mimeType != 'application/vnd.google-apps.folder'"
-            
-            print(f"🔍 Query: {query}")
-            
-            results = self.service.files().list(
-                q=query,
-                pageSize=1000,
-                fields="files(id, name, mimeType, size, createdTime, modifiedTime, parents)",
-                orderBy="name"
-            ).execute()
-            
-            files = results.get('files', [])
-            print(f"📄 Encontrados {len(files)} archivos directos en carpeta {folder_id}")
+            # Todas las páginas, subcarpetas por niveles y varias carpetas por consulta
+            lister = DriveFolderLister(self._new_service)
+            all_files = lister.list_files(folder_id, file_types, recursive=recursive)
             
             # Mostrar los tipos MIME encontrados
-            mime_types = set([f.get('mimeType') for f in files])
+            mime_types = set([f.get('mimeType') for f in all_files])
             print(f"📋 Tipos MIME encontrados: {mime_types}")
-            
-            # Filtrar por tipos si se especifican
-            if file_types:
-                files = [f for f in files if f.get('mimeType') in file_types]
-                print(f"✅ Después de filtrar: {len(files)} archivos")
-            
-            all_files.extend(files)
-            
-            # Si es recursivo, buscar en subcarpetas
-            if recursive:
-                subfolder_query = f"'{folder_id}' in parents and trashed=false and mimeType='application/vnd.google-apps.folder'"
-                subfolder_results = self.service.files().list(
-                    q=subfolder_query,
-                    pageSize=100,
-                    fields="files(id, name)"
-                ).execute()
-                
-                subfolders = subfolder_results.get('files', [])
-                print(f"📁 Encontradas {len(subfolders)} subcarpetas")
-                
-                for subfolder in subfolders:
-                    print(f"  📁 Buscando en subcarpeta: {subfolder['name']}")
-                    subfolder_files = self.list_files_in_folder(subfolder['id'], file_types, recursive=True)
-                    all_files.extend(subfolder_files)
-            
-            print(f"✅ Total: {len(all_files)} archivos encontrados")
+            print(f"✅ Total: {len(all_files)} archivos encontrados ({lister.requests_made} consultas a Drive)")
             return all_files
             
         except HttpError as e:
@@ -228,15 +219,12 @@ class DriveService:
 
     def download_file_thread_safe(self, file_id: str, access_token: str) -> Optional[bytes]:
         """
-        Descarga segura para hilos: Crea una instancia nueva del servicio para evitar conflictos SSL.
+        Descarga segura para hilos: toma un cliente del pool (exclusivo mientras dura
+        la descarga) para evitar conflictos SSL sin reconstruir el servicio por archivo.
         """
         try:
-            # Construir servicio local (aislado del global)
-            creds = Credentials(token=access_token)
-            local_service = build('drive', 'v3', credentials=creds, cache_discovery=False)
-            
-            request = local_service.files().get_media(fileId=file_id)
-            file_content = request.execute()
+            with self.client_pool.lease(access_token) as client:
+                file_content = client.files().get_media(fileId=file_id).execute()
             
             print(f"✅ Archivo descargado (Thread-Safe): {len(file_content)} bytes")
             return file_content
@@ -245,6 +233,71 @@ class DriveService:
             print(f"❌ Error descarga thread-safe: {e}")
             return None
 
+    def spool_path(self, file_id: str, file_name: str) -> Path:
+        """Ruta de descarga con el nombre real (el periodo se lee del nombre), aislada por file_id."""
+        safe_name = file_name.replace("/", "_").replace("\\", "_")
+        if safe_name in ("", ".", ".."):
+            safe_name = file_id
+        return DRIVE_SPOOL_DIR / file_id.replace("/", "_") / safe_name
+
+    def release_spool(self, path) -> None:
+        """
+        Borra un archivo descargado con spool_path y su carpeta por file_id si quedó vacía.
+        Solo actúa dentro de DRIVE_SPOOL_DIR; cualquier otra ruta se ignora.
+        """
+        path = Path(path).resolve()
+        spool_root = DRIVE_SPOOL_DIR.resolve()
+        if spool_root not in path.parents:
+            print(f"⚠️ release_spool: {path} está fuera de {spool_root}, no se borra")
+            return
+        try:
+            path.unlink(missing_ok=True)
+            if path.parent != spool_root:
+                path.parent.rmdir()
+        except OSError:
+            pass
+
+    def download_file_to_path(self, file_id: str, access_token: str, dest_path,
+                              chunk_size: int = DRIVE_DOWNLOAD_CHUNK_SIZE,
+                              max_retries: int = DRIVE_DOWNLOAD_MAX_RETRIES) -> Optional[str]:
+        """
+        Descarga en streaming (MediaIoBaseDownload) directo a dest_path, bloque a bloque:
+        la memoria usada queda acotada a chunk_size aunque el PDF sea grande.
+
+        Los errores HTTP reintentables (429/5xx) los reintenta next_chunk; si se corta la
+        conexión, la descarga se reanuda desde el último bloque escrito.
+
+        Returns:
+            La ruta del archivo descargado, o None si falló (no deja archivos a medias)
+        """
+        dest_path = Path(dest_path)
+        try:
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.client_pool.lease(access_token) as client, open(dest_path, 'wb') as fh:
+                request = client.files().get_media(fileId=file_id)
+                downloader = MediaIoBaseDownload(fh, request, chunksize=chunk_size)
+                done = False
+                failures = 0
+                while not done:
+                    try:
+                        _, done = downloader.next_chunk(num_retries=max_retries)
+                        failures = 0
+                    except (OSError, httplib2.HttpLib2Error) as e:
+                        failures += 1
+                        if failures > max_retries:
+                            raise
+                        print(f"    ⚠️ Reanudando descarga {file_id} desde el byte {fh.tell()} ({failures}/{max_retries}): {e}")
+                        time.sleep(failures)
+
+            print(f"✅ Archivo descargado (streaming): {dest_path.stat().st_size} bytes")
+            return str(dest_path)
+
+        except Exception as e:
+            print(f"❌ Error descarga streaming: {e}")
+            # Solo el archivo a medias: la carpeta es de quien eligió dest_path
+            dest_path.unlink(missing_ok=True)
+            return None
+
 
 # Instancia global del servicio
 drive_service = DriveService()
@@ -0,0 +1,103 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Consultas files().list simultáneas durante el recorrido de subcarpetas
+DRIVE_LIST_CONCURRENCY = int(os.getenv("DRIVE_LIST_CONCURRENCY", "4"))
+# Carpetas por consulta ('a' in parents or 'b' in parents ...)
+DRIVE_PARENTS_PER_QUERY = int(os.getenv("DRIVE_PARENTS_PER_QUERY", "20"))
+DRIVE_LIST_PAGE_SIZE = 1000
+
+FILE_FIELDS = "id, name, mimeType, size, md5Checksum, createdTime, modifiedTime, parents"
+
+
+class DriveFolderLister:
+    """
+    Listado de carpetas de Drive: sigue todas las páginas (nextPageToken) y recorre
+    las subcarpetas por niveles (BFS). Cada nivel se consulta agrupando varias carpetas
+    por petición, con un número acotado de peticiones en paralelo.
+
+    `service_factory` construye un cliente de Drive; se llama una vez por hilo porque
+    los clientes de googleapiclient no son thread-safe.
+    """
+
+    def __init__(self, service_factory: Callable[[], Any], max_workers: int = DRIVE_LIST_CONCURRENCY,
+                 parents_per_query: int = DRIVE_PARENTS_PER_QUERY, page_size: int = DRIVE_LIST_PAGE_SIZE):
+        self.service_factory = service_factory
+        self.max_workers = max(1, max_workers)
+        self.parents_per_query = max(1, parents_per_query)
+        self.page_size = page_size
+        self._local = threading.local()
+        self.requests_made = 0
+        self._counter_lock = threading.Lock()
+
+    def _service(self):
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self.service_factory()
+            self._local.service = service
+        return service
+
+    def list_all_pages(self, query: str, fields: str = FILE_FIELDS, order_by: Optional[str] = "name") -> List[Dict[str, Any]]:
+        """Ejecuta files().list siguiendo nextPageToken hasta agotar los resultados."""
+        service = self._service()
+        items = []
+        page_token = None
+        while True:
+            params = {
+                'q': query,
+                'pageSize': self.page_size,
+                'fields': f"nextPageToken, files({fields})",
+            }
+            if order_by:
+                params['orderBy'] = order_by
+            if page_token:
+                params['pageToken'] = page_token
+            response = service.files().list(**params).execute()
+            with self._counter_lock:
+                self.requests_made += 1
+            items.extend(response.get('files', []))
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return items
+
+    def _children_query(self, parent_ids: List[str], file_types: Optional[List[str]], include_folders: bool) -> str:
+        parents = " or ".join(f"'{parent_id}' in parents" for parent_id in parent_ids)
+        query = f"({parents}) and trashed=false"
+        if file_types:
+            mime_types = list(file_types) + ([FOLDER_MIME_TYPE] if include_folders else [])
+            query += " and (" + " or ".join(f"mimeType='{mime}'" for mime in mime_types) + ")"
+        elif not include_folders:
+            query += f" and mimeType != '{FOLDER_MIME_TYPE}'"
+        return query
+
+    def list_files(self, folder_id: str, file_types: Optional[List[str]] = None, recursive: bool = True) -> List[Dict[str, Any]]:
+        """Archivos (no carpetas) bajo folder_id, filtrados por tipo MIME, sin duplicados."""
+        files: List[Dict[str, Any]] = []
+        seen_files = set()
+        visited_folders = {folder_id}
+        level = [folder_id]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while level:
+                chunks = [level[i:i + self.parents_per_query] for i in range(0, len(level), self.parents_per_query)]
+                queries = [self._children_query(chunk, file_types, recursive) for chunk in chunks]
+                next_level = []
+                # executor.map conserva el orden de los grupos: resultado determinista
+                for items in executor.map(self.list_all_pages, queries):
+                    for item in items:
+                        if item.get('mimeType') == FOLDER_MIME_TYPE:
+                            if recursive and item['id'] not in visited_folders:
+                                visited_folders.add(item['id'])
+                                next_level.append(item['id'])
+                        elif file_types and item.get('mimeType') not in file_types:
+                            continue
+                        elif item['id'] not in seen_files:
+                            seen_files.add(item['id'])
+                            files.append(item)
+                level = next_level
+
+        return files
@@ -1,5 +1,6 @@
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from typing import Optional, List
 from sqlalchemy.orm import Session
 import numpy as np
@@ -8,6 +9,8 @@ from dotenv import load_dotenv
 from pathlib import Path
 from pathlib import Path
 import os
+import platform
+import json
 import asyncio # <--- IMPORTANTE PARA PARALELISMO
 
 # --- 1. CONFIGURACIÓN INICIAL: CARGAR VARIABLES DE ENTORNO ---
@@ -27,16 +30,17 @@ else:
 # --- 2. IMPORTS DE SERVICIOS ---
 from backend.auth.firebase import firebase_auth
 from backend.drive.drive_service import drive_service
-from backend.services.pdf_processor import pdf_processor
-from backend.services.docx_processor import docx_processor
-from backend.services.schedule_processor import schedule_processor # <--- ESTO FALTABA
 from backend.services.recommendation_engine import recommendation_engine
+from backend.precompute_recommendations import run_precompute
 from backend.services.embeddings_manager import embeddings_manager
-from backend.services.ner_service import extract_entities # Para debug
+from backend.services.ner_service import extract_entities, NER_MODEL_NAME # Para debug
+from backend.services.model_registry import model_registry, MODEL_PREWARM
 from backend.models.schemas import UserLogin, UserResponse, AuthResponse, SystemStatus
 from backend.database.db_session import get_db, init_db
 from backend.database import crud
-from backend.database.models import Docente, Curso
+from backend.database.models import Docente
+from backend.services.ingestion_jobs import ingestion_queue
+from backend.services.progress_events import FINAL_EVENTS, progress_broker
 
 # Inicializar la base de datos
 init_db()
@@ -64,6 +68,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def on_startup():
+    # El servidor ya acepta peticiones; los modelos se cargan en el primer uso
+    # o, si MODEL_PREWARM está activo, en un hilo en segundo plano.
+    model_registry.mark_app_ready()
+    print(f"⏱️ API lista en {model_registry.app_ready_seconds:.2f}s")
+    if MODEL_PREWARM:
+        model_registry.prewarm(["sbert", "gemini", NER_MODEL_NAME])
+    await ingestion_queue.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await ingestion_queue.stop()
+
 # --- 4. RUTAS BÁSICAS Y AUTENTICACIÓN ---
 @app.get("/")
 async def read_root():
@@ -84,10 +102,12 @@ async def api_status(db: Session = Depends(get_db)):
     return SystemStatus(
         status="running",
         version="1.0.0",
+        python_version=platform.python_version(),
         features=["Firebase Auth", "Drive Integration", "NER Processing", "SBERT Recommendations", "Schedule Analysis"],
         firebase_connected=firebase_auth.app is not None,
         drive_connected=drive_service.service is not None,
-        database_connected=db_ok
+        database_connected=db_ok,
+        cold_start=model_registry.status()
     )
 
 @app.post("/api/auth/verify", response_model=AuthResponse)
@@ -179,6 +199,21 @@ async def list_folder_files(folder_id: str, authorization: Optional[str] = Heade
 
 # --- 6. PROCESAMIENTO DE ARCHIVOS ---
 
+# Los procesamientos se ejecutan en segundo plano (ingestion_queue): los endpoints
+# encolan la carpeta y devuelven el id del Procesamiento para consultar su estado.
+def enqueue_ingestion(db: Session, folder_id: str, folder_type: str, google_token: Optional[str]):
+    if not google_token:
+        raise HTTPException(status_code=401, detail="Token de Google requerido")
+    if not drive_service.build_service(google_token):
+        raise HTTPException(status_code=500, detail="Error conectando con Drive")
+    procesamiento = ingestion_queue.enqueue(db, folder_id, folder_type, google_token)
+    return {
+        "success": True,
+        "procesamiento_id": procesamiento.id,
+        "status": procesamiento.status,
+        "status_url": f"/api/procesamientos/{procesamiento.id}"
+    }
+
 # A. PROCESAR CVs
 @app.post("/api/drive/process-cvs/{folder_id}")
 async def process_cvs(
@@ -187,90 +222,7 @@ async def process_cvs(
     user: dict = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
-    if not google_token:
-        raise HTTPException(status_code=401, detail="Token de Google requerido")
-    try:
-        if not drive_service.build_service(google_token):
-            raise HTTPException(status_code=500, detail="Error conectando con Drive")
-        
-        file_types = ['application/pdf']
-        files = drive_service.list_files_in_folder(folder_id, file_types, recursive=False)
-        print(f"📄 Procesando {len(files)} CVs...")
-
-        procesamiento = crud.create_procesamiento(db, folder_id=folder_id, folder_type='cvs', files_total=len(files))
-        processed_cvs = []
-        errors = []
-
-        # SEMÁFORO PARA CONTROLAR CONCURRENCIA (Reducido a 2 para máxima estabilidad)
-        semaphore = asyncio.Semaphore(2)
-
-        async def process_single_cv(idx, file):
-            async with semaphore:
-                try:
-                    print(f"  ...Iniciando CV ({idx+1}/{len(files)}): {file['name']}")
-                    
-                    # RETRY LOGIC PARA DESCARGA (3 intentos) + THREAD SAFE
-                    max_retries = 3
-                    file_content = None
-                    last_error = None
-                    
-                    for attempt in range(max_retries):
-                        try:
-                            loop = asyncio.get_event_loop()
-                            if attempt > 0: await asyncio.sleep(1 * attempt)
-                            # USAR MÉTODO THREAD-SAFE
-                            file_content = await loop.run_in_executor(None, drive_service.download_file_thread_safe, file['id'], google_token)
-                            if file_content: break
-                        except Exception as e:
-                            last_error = e
-                            print(f"    ⚠️ Retry {attempt+1}/{max_retries} descarga {file['name']}: {e}")
-                    
-                    if not file_content:
-                        return {'error': f'Fallo descarga tras {max_retries} intentos: {last_error}', 'file': file}
-
-                    # Procesamiento CPU-bound
-                    cv_info = await loop.run_in_executor(None, pdf_processor.extract_cv_info, file_content, file['name'])
-                    
-                    if cv_info['success']:
-                        docente_id = pdf_processor.save_docente_to_db(db, cv_info, file['id'])
-                        if docente_id:
-                            crud.update_procesamiento_progress(db, procesamiento.id, idx + 1)
-                            return {'success': True, 'docente_id': docente_id}
-                        else:
-                            return {'error': 'Error al guardar en BD', 'file': file}
-                    else:
-                        return {'error': cv_info.get('error'), 'file': file}
-                        
-                except Exception as e:
-                    return {'error': str(e), 'file': file}
-
-        # Lanzar tareas
-        tasks = [process_single_cv(i, f) for i, f in enumerate(files)]
-        results = await asyncio.gather(*tasks)
-
-        # Procesar resultados
-        for res in results:
-            if res.get('success'):
-                d = crud.get_docente_by_id(db, res['docente_id'])
-                if d: processed_cvs.append(d)
-            else:
-                errors.append({'filename': res['file']['name'], 'error': res['error']})
-        
-        if errors:
-            crud.mark_procesamiento_error(db, procesamiento.id, f"{len(errors)} errores")
-        
-        crud.clear_recomendaciones_cache(db) # Invalidar cache
-        
-        return {
-            "success": True,
-            "processed": len(processed_cvs),
-            "errors": len(errors),
-            "docentes": [d.to_dict() if hasattr(d, 'to_dict') else d.__dict__ for d in processed_cvs],
-            "error_details": errors
-        }
-    except Exception as e:
-        print(f"❌ Error procesando CVs: {e}")
-        raise HTTPException(status_code=500, detail=f"Error procesando CVs: {str(e)}")
+    return enqueue_ingestion(db, folder_id, 'cvs', google_token)
 
 # B. PROCESAR SÍLABOS
 @app.post("/api/drive/process-syllabi/{folder_id}")
@@ -280,228 +232,107 @@ async def process_syllabi(
     user: dict = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
-    if not google_token:
-        raise HTTPException(status_code=401, detail="Token de Google requerido")
-    try:
-        if not drive_service.build_service(google_token):
-            raise HTTPException(status_code=500, detail="Error conectando con Drive")
-        
-        file_types = ['application/vnd.openxmlformats-officedocument.wordprocessingml.document']
-        files = drive_service.list_files_in_folder(folder_id, file_types, recursive=True)
-        print(f"📚 Procesando {len(files)} sílabos...")
-
-        procesamiento = crud.create_procesamiento(db, folder_id=folder_id, folder_type='syllabi', files_total=len(files))
-        processed_cursos = []
-        errors = []
-
-        semaphore = asyncio.Semaphore(2)
-
-        async def process_single_syllabus(idx, file):
-            async with semaphore:
-                try:
-                    loop = asyncio.get_event_loop()
-                    print(f"  ...Iniciando Sílabo ({idx+1}/{len(files)}): {file['name']}")
-                    
-                    # OPTIMIZACIÓN: Verificar si ya existe en BD para saltar descarga y AI
-                    # Esto permite reanudar procesos interrumpidos sin gastar quota
-                    existing_curso = await loop.run_in_executor(None, crud.get_curso_by_drive_id, db, file['id'])
-                    if existing_curso:
-                        print(f"    ⏩ Saltando {file['name']} (Ya procesado)")
-                        return {'success': True, 'curso_id': existing_curso.id}
-                    
-                    max_retries = 3
-                    file_content = None
-                    last_error = None
-                    
-                    for attempt in range(max_retries):
-                        try:
-                            loop = asyncio.get_event_loop()
-                            if attempt > 0: await asyncio.sleep(1 * attempt)
-                            # DEBUG: Verificar si entra aquí
-                            print(f"    ⬇️ Intentando descargar {file['name']} (Intento {attempt+1})")
-                            # USAR MÉTODO THREAD-SAFE
-                            file_content = await loop.run_in_executor(None, drive_service.download_file_thread_safe, file['id'], google_token)
-                            if file_content: break
-                        except Exception as e:
-                            last_error = e
-                            print(f"    ⚠️ Retry {attempt+1}/{max_retries} descarga {file['name']}: {e}")
-
-                    if not file_content:
-                        return {'error': f'Fallo descarga tras {max_retries} intentos: {last_error}', 'file': file}
-
-                    syllabus_info = await loop.run_in_executor(None, docx_processor.extract_syllabus_info, file_content, file['name'])
-                    
-                    if syllabus_info['success']:
-                        curso_id = docx_processor.save_curso_to_db(db, syllabus_info, file['id'])
-                        if curso_id:
-                            crud.update_procesamiento_progress(db, procesamiento.id, idx + 1)
-                            return {'success': True, 'curso_id': curso_id}
-                        else:
-                            return {'error': 'Error al guardar en BD', 'file': file}
-                    else:
-                        return {'error': syllabus_info.get('error'), 'file': file}
-                        
-                except Exception as e:
-                    print(f"    ❌ Error en {file['name']}: {e}")
-                    return {'error': str(e), 'file': file}
-
-        tasks = [process_single_syllabus(i, f) for i, f in enumerate(files)]
-        results = await asyncio.gather(*tasks)
-
-        for res in results:
-            if res.get('success'):
-                c = crud.get_curso_by_id(db, res['curso_id'])
-                if c: processed_cursos.append(c)
-            else:
-                errors.append({'filename': res['file']['name'], 'error': res['error']})
-
-        if errors:
-            crud.mark_procesamiento_error(db, procesamiento.id, f"{len(errors)} errores")
-
-        crud.clear_recomendaciones_cache(db)
-
-        ciclos_cursos = {}
-        for curso in processed_cursos:
-            ciclo_str = str(curso.ciclo or 1)
-            if ciclo_str not in ciclos_cursos:
-                ciclos_cursos[ciclo_str] = []
-            
-            # Crear objeto simple para evitar errores de serialización
-            curso_obj = {
-                "id": curso.id,
-                "nombre": curso.nombre,
-                "codigo": curso.codigo,
-                "ciclo": curso.ciclo
-            }
-            ciclos_cursos[ciclo_str].append(curso_obj)
-        
-        return {
-            "success": True,
-            "processed": len(processed_cursos),
-            "errors": len(errors),
-            "ciclos": sorted(ciclos_cursos.keys(), key=lambda x: int(x) if x.isdigit() else 99),
-            "cursos_por_ciclo": ciclos_cursos,
-            "error_details": errors
-        }
-    except Exception as e:
-        print(f"❌ Error procesando sílabos: {e}")
-        raise HTTPException(status_code=500, detail=f"Error procesando sílabos: {str(e)}")
+    return enqueue_ingestion(db, folder_id, 'syllabi', google_token)
 
-# C. PROCESAR HORARIOS (¡LA PARTE NUEVA!)
+# C. PROCESAR HORARIOS
 @app.post("/api/drive/process-schedules/{folder_id}")
 async def process_schedules(
     folder_id: str, 
     google_token: Optional[str] = Header(None, alias="X-Google-Token"),
     user: dict = Depends(get_current_user), 
     db: Session = Depends(get_db)
+):
+    return enqueue_ingestion(db, folder_id, 'schedules', google_token)
+
+# D. ESTADO DE LOS PROCESAMIENTOS
+@app.get("/api/procesamientos/{procesamiento_id}")
+async def get_procesamiento_status(procesamiento_id: int, db: Session = Depends(get_db), user: dict = Depends(get_current_user)):
+    status = crud.get_procesamiento_status(db, procesamiento_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Procesamiento no encontrado")
+    # Al terminar se incluye la respuesta final (docentes, cursos por ciclo o registros de historial)
+    if status["status"] in ("completed", "error"):
+        status["resultado"] = ingestion_queue.build_resultado(db, procesamiento_id)
+    return {"success": True, **status}
+
+# Segundos sin eventos tras los que el stream SSE envía un latido con las tasas actuales
+SSE_HEARTBEAT_SECONDS = int(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+def format_sse(message: dict) -> str:
+    lines = []
+    if 'id' in message:
+        lines.append(f"id: {message['id']}")
+    lines.append(f"event: {message['event']}")
+    lines.append(f"data: {json.dumps(message, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+@app.get("/api/procesamientos/{procesamiento_id}/events")
+async def procesamiento_events(
+    procesamiento_id: int,
+    request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: Session = Depends(get_db),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Stream SSE del procesamiento: primero un 'snapshot' del estado en la BD y luego los
+    eventos publicados por los workers (queued, listing, listed, processing, file con
+    state downloaded/extracted/ner_done/saved/failed, completed, error). Si no hay
+    eventos en SSE_HEARTBEAT_SECONDS se envía un 'progress' con las tasas actuales.
+    """
+    if not crud.get_procesamiento(db, procesamiento_id):
+        raise HTTPException(status_code=404, detail="Procesamiento no encontrado")
+
+    # Suscribirse antes de leer el estado para no perder eventos intermedios
+    last_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    subscription = progress_broker.subscribe(procesamiento_id, last_id)
+    status = crud.get_procesamiento_status(db, procesamiento_id)
+    db.close()  # El stream no usa la BD: no retener la conexión mientras dure
+
+    async def stream():
+        with subscription:
+            yield format_sse({'event': 'snapshot', **status, 'progress': ingestion_queue.progress_snapshot(procesamiento_id)})
+            if not ingestion_queue.is_running(procesamiento_id) and status['status'] in ('completed', 'error', 'interrupted'):
+                return
+            while not await request.is_disconnected():
+                message = await subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                if message is None:
+                    yield format_sse({
+                        'event': 'progress',
+                        'procesamiento_id': procesamiento_id,
+                        'progress': ingestion_queue.progress_snapshot(procesamiento_id)
+                    })
+                    continue
+                yield format_sse(message)
+                if message['event'] in FINAL_EVENTS:
+                    return
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/api/procesamientos/{procesamiento_id}/resume")
+async def resume_procesamiento(
+    procesamiento_id: int,
+    google_token: Optional[str] = Header(None, alias="X-Google-Token"),
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     if not google_token:
         raise HTTPException(status_code=401, detail="Token de Google requerido")
-
-    try:
-        if not drive_service.build_service(google_token):
-            raise HTTPException(status_code=500, detail="Error conectando con Drive")
-        
-        # Buscar PDFs de horarios
-        files = drive_service.list_files_in_folder(folder_id, ['application/pdf'], recursive=True)
-        print(f"📅 Procesando {len(files)} horarios...")
-
-        procesamiento = crud.create_procesamiento(db, folder_id=folder_id, folder_type='schedules', files_total=len(files))
-        
-        total_records = 0
-        errors = []
-
-        semaphore = asyncio.Semaphore(2)
-
-        async def process_single_schedule(idx, file):
-            async with semaphore:
-                try:
-                    print(f"  ...Iniciando Horario ({idx+1}/{len(files)}): {file['name']}")
-                    
-                    max_retries = 3
-                    file_content = None
-                    last_error = None
-                    
-                    for attempt in range(max_retries):
-                        try:
-                            loop = asyncio.get_event_loop()
-                            if attempt > 0: await asyncio.sleep(1 * attempt)
-                            # USAR MÉTODO THREAD-SAFE
-                            file_content = await loop.run_in_executor(None, drive_service.download_file_thread_safe, file['id'], google_token)
-                            if file_content: break
-                        except Exception as e:
-                            last_error = e
-                            print(f"    ⚠️ Retry {attempt+1}/{max_retries} descarga {file['name']}: {e}")
-
-                    if not file_content: return {'records': 0}
-
-                    # Guardar contenido en archivo temporal
-                    import tempfile
-                    import os
-                    
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-                        tmp_file.write(file_content)
-                        tmp_path = tmp_file.name
-                    
-                    real_name_path = None
-                    try:
-                        temp_dir = os.path.dirname(tmp_path)
-                        real_name_path = os.path.join(temp_dir, file['name'].replace("/", "_"))
-                        
-                        if os.path.exists(real_name_path): os.remove(real_name_path)
-                        os.rename(tmp_path, real_name_path)
-                        
-                        # Ejecutar extracción en executor (CPU bound + I/O)
-                        extracted_data = await loop.run_in_executor(None, schedule_processor.extract_schedule_data, real_name_path)
-                        
-                        # Guardar en BD (Síncrono)
-                        records_saved = schedule_processor.save_history_to_db(db, extracted_data)
-                        
-                        crud.update_procesamiento_progress(db, procesamiento.id, idx + 1)
-                        return {'records': records_saved}
-                        
-                    finally:
-                        if real_name_path and os.path.exists(real_name_path): os.remove(real_name_path)
-                        if os.path.exists(tmp_path): os.remove(tmp_path)
-                        
-                except Exception as e:
-                    print(f"  ❌ Error en horario {file['name']}: {e}")
-                    return {'error': str(e), 'file': file}
-
-        tasks = [process_single_schedule(i, f) for i, f in enumerate(files)]
-        results = await asyncio.gather(*tasks)
-
-        for res in results:
-            if 'records' in res:
-                total_records += res['records']
-            elif 'error' in res:
-                errors.append({'filename': res['file']['name'], 'error': res['error']})
-
-        if errors:
-            crud.mark_procesamiento_error(db, procesamiento.id, f"{len(errors)} errores")
-        
-        # Limpiar cache porque el historial afecta al ranking
-        crud.clear_recomendaciones_cache(db)
-
-        return {
-            "success": True,
-            "processed_files": len(files),
-            "total_history_records": total_records,
-            "errors": len(errors),
-            "error_details": errors
-        }
-        
-    except Exception as e:
-        print(f"❌ Error procesando horarios: {e}")
-        raise HTTPException(status_code=500, detail=f"Error procesando horarios: {str(e)}")
+    procesamiento = crud.get_procesamiento(db, procesamiento_id)
+    if not procesamiento:
+        raise HTTPException(status_code=404, detail="Procesamiento no encontrado")
+    procesamiento = ingestion_queue.resume(db, procesamiento, google_token)
+    return {"success": True, "procesamiento_id": procesamiento.id, "status": procesamiento.status}
 
 # --- 7. CONSULTAS A LA BD (PROTEGIDAS) ---
 @app.get("/api/docentes")
-async def get_docentes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), user: dict = Depends(get_current_user)):
-    docentes = crud.get_all_docentes(db, skip=skip, limit=limit)
+async def get_docentes(after_id: Optional[int] = None, limit: int = 100, db: Session = Depends(get_db), user: dict = Depends(get_current_user)):
+    # Paginación por keyset: el cliente pide la siguiente página con after_id=next_after_id
+    docentes = crud.get_docentes_page(db, after_id=after_id, limit=limit)
     return {
         "success": True, 
         "total": len(docentes), 
+        "next_after_id": docentes[-1].id if len(docentes) == limit else None,
         "docentes": [
             {
                 "id": d.id, 
@@ -522,11 +353,13 @@ async def get_ciclos(db: Session = Depends(get_db), user: dict = Depends(get_cur
     return {"success": True, "ciclos": ciclos}
 
 @app.get("/api/cursos")
-async def get_cursos(ciclo: Optional[int] = None, db: Session = Depends(get_db), user: dict = Depends(get_current_user)):
-    cursos = crud.get_cursos_by_ciclo(db, ciclo) if ciclo else crud.get_all_cursos(db)
+async def get_cursos(ciclo: Optional[int] = None, after_id: Optional[int] = None, limit: int = 500, db: Session = Depends(get_db), user: dict = Depends(get_current_user)):
+    # Paginación por keyset: el cliente pide la siguiente página con after_id=next_after_id
+    cursos = crud.get_cursos_page(db, after_id=after_id, limit=limit, ciclo=ciclo)
     return {
         "success": True, 
         "total": len(cursos), 
+        "next_after_id": cursos[-1].id if len(cursos) == limit else None,
         "cursos": [
             {
                 "id": c.id, 
@@ -567,6 +400,24 @@ async def recommend_docentes(curso_id: int, top_k: int = 100, user: dict = Depen
         print(f"❌ Error generando recomendaciones de docentes: {e}")
         raise HTTPException(status_code=500, detail=f"Error generando recomendaciones: {str(e)}")
 
+@app.post("/api/recommend/precompute")
+async def precompute_recommendations(top_k: int = 100, user: dict = Depends(get_current_user)):
+    """
+    Calcula la matriz cursos x docentes completa y llena el cache de recomendaciones.
+    Corre en el executor con su propia sesión: no bloquea el event loop (workers de
+    ingesta y streams SSE siguen atendiéndose mientras tanto).
+    """
+    try:
+        print(f"🧮 Precalculando recomendaciones (top_k={top_k}) para todos los cursos...")
+        loop = asyncio.get_running_loop()
+        summary = await loop.run_in_executor(None, run_precompute, top_k)
+        return {"success": True, **summary}
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"❌ Error precalculando recomendaciones: {e}")
+        raise HTTPException(status_code=500, detail=f"Error precalculando recomendaciones: {str(e)}")
+
 # --- 9. ENDPOINTS DE DEBUG (PARA VERIFICAR NER) ---
 @app.get("/api/debug/ner-profile/docente/{docente_id}")
 async def debug_docente_ner_profile(docente_id: int, db: Session = Depends(get_db)):
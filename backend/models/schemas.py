@@ -25,6 +25,7 @@ class SystemStatus(BaseModel):
     firebase_connected: bool = False
     drive_connected: bool = False
     database_connected: bool = False
+    cold_start: Dict[str, Any] = {}
 
 class ErrorResponse(BaseModel):
     error: str
@@ -0,0 +1,34 @@
+"""
+Job de precálculo: genera el cache de recomendaciones de todos los cursos.
+Pensado para ejecutarse después de la ingesta (CVs, sílabos, horarios).
+
+Uso (desde la raíz del repositorio):
+    python -m backend.precompute_recommendations --top-k 100
+"""
+import argparse
+import time
+
+from backend.database.db_session import SessionLocal, init_db
+from backend.services.recommendation_engine import recommendation_engine
+
+
+def run_precompute(top_k: int = 100) -> dict:
+    """Ejecuta el modo batch del motor y devuelve el resumen"""
+    db = SessionLocal()
+    try:
+        return recommendation_engine.precompute_all_recommendations(db=db, top_k=top_k)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precalcula las recomendaciones de todos los cursos")
+    parser.add_argument("--top-k", type=int, default=100, help="Docentes guardados por curso")
+    args = parser.parse_args()
+
+    init_db()
+    print(f"🧮 Precalculando recomendaciones (top_k={args.top_k})...")
+    start = time.perf_counter()
+    summary = run_precompute(top_k=args.top_k)
+    elapsed = time.perf_counter() - start
+    print(f"✅ {summary['entradas']} entradas para {summary['cursos']} cursos y {summary['docentes']} docentes en {elapsed:.1f}s")
@@ -1,47 +1,30 @@
 import logging
-import json
-import os
-import time
-import vertexai
-from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from docx import Document
 from io import BytesIO
-from vertexai.generative_models import GenerativeModel
 from sqlalchemy.orm import Session
+from backend.services.model_registry import model_registry, VERTEX_MODEL_NAME
+from backend.services.llm_response_cache import llm_response_cache
+from backend.services.gemini_rate_limiter import gemini_rate_limiter, parse_json_response
 
 # Configuración de logger
 logger = logging.getLogger(__name__)
 
 # Intentamos importar NER
 try:
-    from .ner_service import extract_entities
+    from .ner_service import extract_entities, extract_entities_batch
 except ImportError:
     def extract_entities(text): return {}
+    def extract_entities_batch(texts): return [{} for _ in texts]
 
-class DOCXProcessor:
-    def __init__(self):
-        current_file = Path(__file__).resolve()
-        root_dir = current_file.parent.parent.parent
-        json_filename = "vertex_credenciales.json"
-        path_to_keys = root_dir / json_filename
-
-        self.project_id = "lector-pdfs-479603"
-        self.location = "us-central1"
+# Subir al cambiar el prompt de sílabos (invalida las respuestas cacheadas)
+SYLLABUS_PROMPT_VERSION = "syllabus_v1"
 
-        if not path_to_keys.exists():
-            logger.error(f"No se encontró el archivo '{json_filename}' en {root_dir}")
-            self.model = None
-            return
-
-        try:
-            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(path_to_keys)
-            vertexai.init(project=self.project_id, location=self.location)
-            self.model = GenerativeModel("gemini-2.0-flash-001")
-            logger.info(f"Vertex AI (DOCX) inicializado en el proyecto {self.project_id}")
-        except Exception as e:
-            logger.error(f"Error iniciando Vertex AI en DOCXProcessor: {e}")
-            self.model = None
+class DOCXProcessor:
+    @property
+    def model(self):
+        # Modelo Gemini compartido (Vertex AI se inicializa una sola vez, en el primer uso)
+        return model_registry.get("gemini")
 
     def extract_text_from_docx(self, docx_bytes: bytes) -> str:
         """Extrae todo el texto plano del DOCX, incluyendo tablas."""
@@ -73,6 +56,13 @@ class DOCXProcessor:
         """
         Usa Vertex AI para entender la estructura del Sílabo UPAO.
         """
+        # El prompt solo usa los primeros 7000 caracteres: esa es la entrada que se direcciona
+        cache_key = llm_response_cache.make_key(raw_text[:7000], SYLLABUS_PROMPT_VERSION, VERTEX_MODEL_NAME)
+        cached = llm_response_cache.get(cache_key)
+        if cached is not None:
+            logger.info("♻️ Sílabo en cache LLM")
+            return cached
+
         if not self.model:
             return {}
 
@@ -92,28 +82,17 @@ class DOCXProcessor:
         {raw_text[:7000]}
         """
 
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                # Rate Limiting: Esperar un poco antes de cada intento
-                time.sleep(2 + (attempt * 2)) 
-                
-                response = self.model.generate_content(prompt)
-                cleaned_response = response.text.replace("```json", "").replace("```", "").strip()
-                return json.loads(cleaned_response)
-            except Exception as e:
-                error_str = str(e)
-                if "429" in error_str or "Resource exhausted" in error_str:
-                    wait_time = (attempt + 1) * 10
-                    logger.warning(f"⚠️ Quota excedida (429) en sílabo. Reintentando en {wait_time}s... ({attempt+1}/{max_retries})")
-                    time.sleep(wait_time)
-                else:
-                    logger.error(f"Error parsing sílabo con Vertex AI: {e}")
-                    return {}
-        
-        return {}
-
-    def extract_syllabus_info(self, docx_bytes: bytes, filename: str = "") -> Dict:
+        # Cuotas compartidas con CVs y horarios; backoff adaptativo ante 429/503
+        try:
+            data = gemini_rate_limiter.generate(self.model, prompt, label="sílabo", max_retries=3, parse=parse_json_response)
+        except Exception as e:
+            logger.error(f"Error parsing sílabo con Vertex AI: {e}")
+            return {}
+
+        llm_response_cache.set(cache_key, data)
+        return data
+
+    def extract_syllabus_info(self, docx_bytes: bytes, filename: str = "", with_entities: bool = True) -> Dict:
         try:
             # 1. Leer texto crudo
             full_text = self.extract_text_from_docx(docx_bytes)
@@ -132,31 +111,39 @@ class DOCXProcessor:
             if not nombre and filename:
                 nombre = filename.replace('.docx', '').replace('_', ' ')
 
-            # 3. Enriquecer con NER local
+            # 3. Enriquecer con NER local (o más tarde, en lote, con apply_entities_batch)
             target_text = ai_data.get('texto_optimizado_sbert', full_text)
-            entities = extract_entities(target_text)
+            entities = extract_entities(target_text) if with_entities else {}
 
-            temas_gemini = ai_data.get('temas_clave', [])
-            
-            return {
+            return self.apply_entities({
                 'success': True,
                 'nombre': nombre,
                 'codigo': ai_data.get('codigo'),
                 'ciclo': ai_data.get('ciclo', 1),
                 'descripcion': ai_data.get('descripcion', ''),
-                'contenidos': list(set(temas_gemini + entities.get('contenidos', []))),
-                'areas': entities.get('areas', []),
-                'herramientas': entities.get('herramientas', []),
-                'lenguajes': entities.get('lenguajes', []),
-                'metodologias': entities.get('metodologias', []),
+                'temas_clave': ai_data.get('temas_clave', []),
                 'full_text': target_text,
                 'raw_text_length': len(full_text)
-            }
+            }, entities)
         except Exception as e:
             logger.error(f"Error procesando sílabo: {e}")
             return {'success': False, 'error': str(e)}
 
-    def save_curso_to_db(self, db: Session, syllabus_info: Dict, drive_file_id: str) -> Optional[int]:
+    def apply_entities(self, syllabus_info: Dict, entities: Dict) -> Dict:
+        temas_gemini = syllabus_info.get('temas_clave', [])
+        syllabus_info['contenidos'] = list(set(temas_gemini + entities.get('contenidos', [])))
+        syllabus_info['areas'] = entities.get('areas', [])
+        syllabus_info['herramientas'] = entities.get('herramientas', [])
+        syllabus_info['lenguajes'] = entities.get('lenguajes', [])
+        syllabus_info['metodologias'] = entities.get('metodologias', [])
+        return syllabus_info
+
+    def apply_entities_batch(self, syllabus_infos: List[Dict]) -> List[Dict]:
+        """NER de todos los sílabos en una sola pasada (nlp.pipe)."""
+        entities_list = extract_entities_batch([info.get('full_text', '') for info in syllabus_infos])
+        return [self.apply_entities(info, entities) for info, entities in zip(syllabus_infos, entities_list)]
+
+    def save_curso_to_db(self, db: Session, syllabus_info: Dict, drive_file_id: str, tracking: Optional[Dict] = None) -> Optional[int]:
         try:
             from backend.database import crud
             existing = crud.get_curso_by_drive_id(db, drive_file_id)
@@ -173,6 +160,8 @@ class DOCXProcessor:
                 "contenidos": syllabus_info.get('contenidos', []),
                 "syllabus_text": syllabus_info.get('full_text', '')
             }
+            # Huella de Drive (md5/modifiedTime) de la versión procesada
+            data.update(tracking or {})
 
             if existing:
                 crud.update_curso(db, existing.id, **data)
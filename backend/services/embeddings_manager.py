@@ -1,23 +1,197 @@
 import os
+import json
 import pickle
+import threading
 import numpy as np
 import hashlib
-from typing import Dict, Optional, Callable, List
+from typing import Dict, Optional, Callable, Iterable, List, Tuple
 from pathlib import Path
 from sqlalchemy.orm import Session
 from backend.database.models import Docente, Curso
+from backend.services.vector_index import create_vector_index, exact_search
+from backend.services.model_registry import SBERT_MODEL_NAME
 
 BASE_DIR = Path("backend/data/embeddings")
 DOCENTES_DIR = BASE_DIR / "docentes"
 CURSOS_DIR = BASE_DIR / "cursos"
+DOCENTES_MATRIX_DIR = BASE_DIR / "docentes_matrix"
+# Tamaño de lote para codificar embeddings faltantes/obsoletos en una sola pasada del modelo
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
 DOCENTES_DIR.mkdir(parents=True, exist_ok=True)
 CURSOS_DIR.mkdir(parents=True, exist_ok=True)
 
 
+class EmbeddingMatrixStore:
+    """
+    Almacén consolidado de embeddings: una sola matriz float32 en disco (.npy)
+    abierta con memory-map, más dos sidecars JSON (id -> fila, id -> hash) y uno de
+    metadatos (modelo y dimensión). Si el store en disco es de otro modelo se descarta
+    entero y se reconstruye. Las filas [0, n) siempre están ocupadas; al eliminar se
+    mueve la última fila al hueco.
+    """
+    MIN_CAPACITY = 64
+
+    def __init__(self, directory: Path, model_name: str = SBERT_MODEL_NAME):
+        self.directory = directory
+        self.model_name = model_name
+        self.matrix_path = directory / "vectors.npy"
+        self.index_path = directory / "index.json"
+        self.hashes_path = directory / "hashes.json"
+        self.meta_path = directory / "meta.json"
+        self._lock = threading.RLock()
+        self._matrix: Optional[np.memmap] = None
+        self._index: Dict[int, int] = {}
+        self._hashes: Dict[int, str] = {}
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._index, self._hashes, self._matrix = {}, {}, None
+        try:
+            if self.matrix_path.exists() and self.index_path.exists():
+                self._matrix = np.load(self.matrix_path, mmap_mode='r+')
+                with open(self.index_path, 'r') as f:
+                    self._index = {int(k): v for k, v in json.load(f).items()}
+                if self.hashes_path.exists():
+                    with open(self.hashes_path, 'r') as f:
+                        self._hashes = {int(k): v for k, v in json.load(f).items()}
+                # Sin metadatos (store anterior) se asume el modelo actual
+                if self.meta_path.exists():
+                    with open(self.meta_path, 'r') as f:
+                        meta = json.load(f)
+                    if meta.get('model') != self.model_name or meta.get('dim') != self._matrix.shape[1]:
+                        print(f"⚠️ Embeddings de otro modelo ({meta.get('model')}, dim {meta.get('dim')}) en {self.directory}; se reconstruyen con {self.model_name}")
+                        self._index, self._hashes, self._matrix = {}, {}, None
+        except Exception:
+            # Store corrupto: se reconstruye desde cero en las siguientes escrituras
+            self._index, self._hashes, self._matrix = {}, {}, None
+        self._loaded = True
+
+    def _write_json(self, path: Path, data: Dict):
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({str(k): v for k, v in data.items()}, f)
+        os.replace(tmp_path, path)
+
+    def _save_sidecars(self):
+        self._write_json(self.index_path, self._index)
+        self._write_json(self.hashes_path, self._hashes)
+        tmp_path = self.meta_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'model': self.model_name, 'dim': int(self._matrix.shape[1])}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _ensure_capacity(self, rows_needed: int, dim: int):
+        """Crece la matriz (duplicando capacidad) si no caben rows_needed filas."""
+        if self._matrix is not None and self._matrix.shape[1] != dim:
+            # Mismo modelo (verificado al cargar) con otra dimensión: no se mezclan vectores
+            raise ValueError(f"Vector de dimensión {dim} en un store de dimensión {self._matrix.shape[1]} ({self.model_name})")
+        capacity = self._matrix.shape[0] if self._matrix is not None else 0
+        if rows_needed <= capacity:
+            return
+        new_capacity = max(self.MIN_CAPACITY, capacity * 2, rows_needed)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.directory / "vectors.tmp.npy"
+        new_matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(new_capacity, dim))
+        n = len(self._index)
+        if self._matrix is not None and n:
+            new_matrix[:n] = self._matrix[:n]
+        new_matrix.flush()
+        del new_matrix
+        self._matrix = None
+        os.replace(tmp_path, self.matrix_path)
+        self._matrix = np.load(self.matrix_path, mmap_mode='r+')
+
+    def get_hash(self, item_id: int) -> Optional[str]:
+        with self._lock:
+            self._load()
+            return self._hashes.get(item_id)
+
+    def upsert_many(self, items: List[Tuple[int, np.ndarray, str]]):
+        """Escribe (o sobrescribe en su sitio) las filas de los ids indicados."""
+        if not items:
+            return
+        with self._lock:
+            self._load()
+            dim = int(np.asarray(items[0][1]).size)
+            new_ids = {item_id for item_id, _, _ in items if item_id not in self._index}
+            self._ensure_capacity(len(self._index) + len(new_ids), dim)
+            for item_id, vector, item_hash in items:
+                row = self._index.get(item_id)
+                if row is None:
+                    row = len(self._index)
+                    self._index[item_id] = row
+                self._matrix[row] = np.asarray(vector, dtype=np.float32).reshape(-1)
+                self._hashes[item_id] = item_hash
+            self._matrix.flush()
+            self._save_sidecars()
+
+    def upsert(self, item_id: int, vector: np.ndarray, item_hash: str):
+        self.upsert_many([(item_id, vector, item_hash)])
+
+    def remove_many(self, item_ids: Iterable[int]) -> int:
+        """Elimina las filas de item_ids y devuelve cuántas existían."""
+        with self._lock:
+            self._load()
+            ids_by_row = {row: item_id for item_id, row in self._index.items()}
+            removed = 0
+            for item_id in item_ids:
+                row = self._index.pop(item_id, None)
+                if row is None:
+                    continue
+                self._hashes.pop(item_id, None)
+                last_row = len(self._index)
+                if row != last_row:
+                    last_id = ids_by_row[last_row]
+                    self._matrix[row] = self._matrix[last_row]
+                    self._index[last_id] = row
+                    ids_by_row[row] = last_id
+                del ids_by_row[last_row]
+                removed += 1
+            if removed:
+                self._matrix.flush()
+                self._save_sidecars()
+            return removed
+
+    def remove(self, item_id: int) -> bool:
+        return self.remove_many([item_id]) == 1
+
+    def ids(self) -> List[int]:
+        with self._lock:
+            self._load()
+            return list(self._index)
+
+    def get_matrix(self, item_ids: List[int]) -> np.ndarray:
+        """Devuelve las filas de item_ids (en ese orden) como una matriz (len(item_ids), dim)."""
+        with self._lock:
+            self._load()
+            if self._matrix is None or not item_ids:
+                return np.zeros((0, 0), dtype=np.float32)
+            rows = np.fromiter((self._index[i] for i in item_ids), dtype=np.int64, count=len(item_ids))
+            return np.asarray(self._matrix[rows])
+
+    def clear(self) -> int:
+        with self._lock:
+            self._load()
+            count = len(self._index)
+            self._matrix, self._index, self._hashes = None, {}, {}
+            for path in (self.matrix_path, self.index_path, self.hashes_path, self.meta_path):
+                if path.exists():
+                    os.remove(path)
+            return count
+
+
 class EmbeddingsManager:
     def __init__(self):
         self.docentes_dir = DOCENTES_DIR
         self.cursos_dir = CURSOS_DIR
+        self.docentes_store = EmbeddingMatrixStore(DOCENTES_MATRIX_DIR)
+        # Índice ANN de docentes construido a partir del store. Con el backend exacto no se
+        # mantiene: las búsquedas leen directamente del store (sin duplicar los vectores)
+        self.docente_index = create_vector_index()
+        self._indexed_ids: set = set()
+        self._index_lock = threading.Lock()
 
     def _generate_hash(self, text: str) -> str:
         return hashlib.sha256(text.encode('utf-8')).hexdigest()
@@ -46,37 +220,186 @@ class EmbeddingsManager:
         except Exception:
             pass
 
+    def _is_current(self, cached_data: Optional[Dict], current_hash: str) -> bool:
+        """Pickle vigente: mismo texto y mismo modelo (los pickles antiguos no guardan el modelo)."""
+        return bool(cached_data) and cached_data.get('hash') == current_hash \
+            and cached_data.get('model', SBERT_MODEL_NAME) == SBERT_MODEL_NAME
+
     def get_or_create_embedding(self, db_item: (Docente | Curso), text_generator: Callable, embedding_generator: Callable) -> np.ndarray:
         path = self._get_item_path(db_item)
         cached_data = self._load_embedding(path)
         current_text = text_generator(db_item)
         current_hash = self._generate_hash(current_text)
-        if cached_data and cached_data.get('hash') == current_hash:
+        if self._is_current(cached_data, current_hash):
             return cached_data.get('vector')
         new_vector = embedding_generator(current_text)
-        new_data = {'vector': new_vector, 'hash': current_hash, 'text_preview': current_text[:150]}
+        new_data = {'vector': new_vector, 'hash': current_hash, 'model': SBERT_MODEL_NAME, 'text_preview': current_text[:150]}
         self._save_embedding(path, new_data)
         db_item.embedding_hash = current_hash
         return new_vector
 
-    def get_all_docente_embeddings(self, db: Session, docentes: List[Docente], text_generator: Callable, embedding_generator: Callable) -> Dict[int, np.ndarray]:
-        embeddings_map = {}
+    def get_curso_embeddings(
+        self,
+        cursos: List,
+        text_generator: Callable,
+        batch_embedding_generator: Callable,
+        batch_size: int = EMBEDDING_BATCH_SIZE
+    ) -> Tuple[np.ndarray, Dict[int, str]]:
+        """
+        Matriz (len(cursos), dim) con el embedding vigente de cada curso (pickle por curso).
+        Los que faltan o quedaron obsoletos se codifican juntos en lotes. Devuelve también
+        {curso_id: hash} de los recodificados. `cursos` solo necesita .id y lo que use
+        text_generator (sirven las filas de crud.iter_curso_profiles).
+        """
+        vectors: List[Optional[np.ndarray]] = [None] * len(cursos)
+        pending = []  # (posición, curso_id, texto, hash)
+        for i, curso in enumerate(cursos):
+            current_text = text_generator(curso)
+            current_hash = self._generate_hash(current_text)
+            cached_data = self._load_embedding(self.cursos_dir / f"curso_{curso.id}.pkl")
+            if self._is_current(cached_data, current_hash):
+                vectors[i] = cached_data.get('vector')
+            else:
+                pending.append((i, curso.id, current_text, current_hash))
+
+        encoded_hashes = {}
+        if pending:
+            encoded = self._encode_in_batches([text for _, _, text, _ in pending], batch_embedding_generator, max(1, batch_size))
+            for (i, curso_id, text, item_hash), vector in zip(pending, encoded):
+                # Misma forma (1, dim) que guarda get_or_create_embedding
+                vector = np.asarray(vector).reshape(1, -1)
+                vectors[i] = vector
+                self._save_embedding(self.cursos_dir / f"curso_{curso_id}.pkl",
+                                     {'vector': vector, 'hash': item_hash, 'model': SBERT_MODEL_NAME, 'text_preview': text[:150]})
+                encoded_hashes[curso_id] = item_hash
+
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32), encoded_hashes
+        return np.vstack([np.asarray(v).reshape(1, -1) for v in vectors]), encoded_hashes
+
+    def _encode_in_batches(self, texts: List[str], batch_embedding_generator: Callable, batch_size: int) -> List[np.ndarray]:
+        """
+        Codifica los textos en lotes ordenados por longitud (menos padding por lote)
+        y devuelve los vectores en el orden original.
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            encoded = batch_embedding_generator([texts[i] for i in chunk])
+            for i, vector in zip(chunk, encoded):
+                vectors[i] = vector
+        return vectors
+
+    def sync_docente_embeddings(
+        self,
+        db: Session,
+        docentes: Iterable[Docente],
+        text_generator: Callable,
+        embedding_generator: Callable,
+        batch_embedding_generator: Optional[Callable] = None,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        prune: bool = True
+    ) -> List[int]:
+        """
+        Asegura que el store consolidado y el índice vectorial tengan el embedding vigente
+        de cada docente y devuelve sus ids. Los docentes cuyo texto cambió se reúnen primero
+        y se codifican juntos en lotes (si hay batch_embedding_generator); luego se escribe
+        cada fila en su sitio. Con prune=True `docentes` es el catálogo completo y los que
+        no aparecen salen del índice; con prune=False es solo un subconjunto (los modificados).
+        """
+        docente_ids = []
+        stale_items = []
+        pending = []  # (docente_id, text, hash) que requieren pasar por el modelo
         needs_commit = False
         for docente in docentes:
-            vector = self.get_or_create_embedding(
-                db_item=docente,
-                text_generator=text_generator,
-                embedding_generator=embedding_generator
-            )
-            embeddings_map[docente.id] = vector
-            if not docente.embedding_hash:
+            docente_ids.append(docente.id)
+            current_text = text_generator(docente)
+            current_hash = self._generate_hash(current_text)
+            if self.docentes_store.get_hash(docente.id) == current_hash:
+                continue
+            # Migración: reutilizar el pickle individual si sigue vigente
+            legacy = self._load_embedding(self._get_item_path(docente))
+            if self._is_current(legacy, current_hash):
+                stale_items.append((docente.id, legacy.get('vector'), current_hash))
+            else:
+                pending.append((docente.id, current_text, current_hash))
+            if docente.embedding_hash != current_hash:
+                docente.embedding_hash = current_hash
                 needs_commit = True
+
+        if pending:
+            texts = [text for _, text, _ in pending]
+            if batch_embedding_generator:
+                vectors = self._encode_in_batches(texts, batch_embedding_generator, max(1, batch_size))
+            else:
+                vectors = [embedding_generator(text) for text in texts]
+            stale_items.extend((item_id, vector, item_hash) for (item_id, _, item_hash), vector in zip(pending, vectors))
+
+        self.docentes_store.upsert_many(stale_items)
         if needs_commit:
             try:
                 db.commit()
             except Exception:
                 db.rollback()
-        return embeddings_map
+        self._sync_index(docente_ids, stale_items, prune)
+        return docente_ids
+
+    def _sync_index(self, docente_ids: List[int], stale_items: List[Tuple[int, np.ndarray, str]], prune: bool = True):
+        """Inserta en el índice los docentes nuevos o modificados y (con prune) elimina los que ya no existen."""
+        with self._index_lock:
+            current_ids = set(docente_ids)
+            if not prune:
+                current_ids |= self._indexed_ids
+            else:
+                # Docentes dados de baja (también los de ejecuciones anteriores, que siguen en el store)
+                removed = (set(self.docentes_store.ids()) | self._indexed_ids) - current_ids
+                if removed:
+                    self.docentes_store.remove_many(removed)
+                    if self.docente_index.approximate:
+                        self.docente_index.remove(list(removed))
+            if self.docente_index.approximate:
+                changed = {item_id for item_id, _, _ in stale_items}
+                to_add = [i for i in docente_ids if i in changed or i not in self._indexed_ids]
+                if to_add:
+                    self.docente_index.add(to_add, self.docentes_store.get_matrix(to_add))
+            self._indexed_ids = current_ids
+
+    def get_docente_vectors(self, docente_ids: List[int]) -> np.ndarray:
+        """Matriz (len(docente_ids), dim) leída del store, alineada con docente_ids."""
+        return self.docentes_store.get_matrix(docente_ids)
+
+    def search_docentes(self, query_vector: np.ndarray, k: int) -> Tuple[List[int], np.ndarray]:
+        """Top-k docentes más similares a query_vector según el índice configurado."""
+        if self.docente_index.approximate:
+            return self.docente_index.search(query_vector, k)
+        with self._index_lock:
+            docente_ids = sorted(self._indexed_ids)
+        return exact_search(docente_ids, self.docentes_store.get_matrix(docente_ids), query_vector, k)
+
+    def remove_docente(self, docente_id: int) -> bool:
+        """Elimina el embedding de un docente del store y del índice."""
+        with self._index_lock:
+            self.docente_index.remove([docente_id])
+            self._indexed_ids.discard(docente_id)
+        return self.docentes_store.remove(docente_id)
+
+    def get_docente_matrix(
+        self,
+        db: Session,
+        docentes: List[Docente],
+        text_generator: Callable,
+        embedding_generator: Callable,
+        batch_embedding_generator: Optional[Callable] = None,
+        batch_size: int = EMBEDDING_BATCH_SIZE
+    ) -> Tuple[List[int], np.ndarray]:
+        """Devuelve (ids, matriz) con los embeddings vigentes de los docentes."""
+        docente_ids = self.sync_docente_embeddings(db, docentes, text_generator, embedding_generator, batch_embedding_generator, batch_size)
+        return docente_ids, self.get_docente_vectors(docente_ids)
+
+    def get_all_docente_embeddings(self, db: Session, docentes: List[Docente], text_generator: Callable, embedding_generator: Callable) -> Dict[int, np.ndarray]:
+        docente_ids, matrix = self.get_docente_matrix(db, docentes, text_generator, embedding_generator)
+        return {docente_id: matrix[row].reshape(1, -1) for row, docente_id in enumerate(docente_ids)}
 
     def clear_cache(self, item_type: str = "all") -> int:
         count = 0
@@ -84,6 +407,10 @@ class EmbeddingsManager:
             for f in self.docentes_dir.glob("*.pkl"):
                 os.remove(f)
                 count += 1
+            count += self.docentes_store.clear()
+            with self._index_lock:
+                self.docente_index.remove(list(self._indexed_ids))
+                self._indexed_ids = set()
         if item_type in ["all", "cursos"]:
             for f in self.cursos_dir.glob("*.pkl"):
                 os.remove(f)
@@ -1,8 +1,43 @@
+import os
+import pickle
+import random
+import logging
+import threading
 import lightgbm as lgb
 import shap
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+FEATURE_NAMES = [
+    'area_match_count', 'lenguaje_match_count', 'herramienta_match_count',
+    'metodologia_match_count', 'contenido_match_count', 'history_score',
+    'semantic_score'
+]
+
+# Modo de explicación:
+#   "linear"   -> atribuciones aditivas exactas de la fórmula lineal del score (vectorizado, sin entrenamiento)
+#   "global"   -> LightGBM + SHAP entrenado en el precálculo con filas de todos los cursos y persistido
+#                 en disco por versión del algoritmo (mientras no exista se usan las atribuciones lineales)
+#   "lightgbm" -> modo original: LightGBM + SHAP reentrenado en cada petición sobre el top-k
+EXPLANATION_MODE = os.getenv("EXPLANATION_MODE", "linear")
+EXPLAINERS_DIR = Path("backend/data/explainers")
+# Filas (de todos los cursos) con las que se entrena como máximo el explicador global
+GLOBAL_EXPLAINER_SAMPLE = int(os.getenv("GLOBAL_EXPLAINER_SAMPLE", "20000"))
+
+
+def linear_attributions(features: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Valores SHAP exactos de un modelo lineal f(x) = w·x con fondo = media del lote:
+    phi_ij = w_j * (x_ij - mean_j). Cada fila suma f(x_i) - mean(f).
+    """
+    if features.size == 0:
+        return features
+    return (features - features.mean(axis=0)) * weights
+
 
 class ExplanationModel:
     """
@@ -10,8 +45,13 @@ class ExplanationModel:
     Este modelo se entrena para predecir la puntuación de similitud semántica
     basándose en características de coincidencia de entidades (NER).
     Luego, utiliza SHAP para explicar las predicciones.
+    También ofrece atribuciones lineales exactas y un explicador global persistido
+    (ver EXPLANATION_MODE).
     """
-    def __init__(self):
+    def __init__(self, mode: str = EXPLANATION_MODE, version: str = "default"):
+        self.mode = mode
+        self.version = version
+        self._lock = threading.Lock()
         self.model = lgb.LGBMRegressor(
             objective='regression_l1',
             n_estimators=100,
@@ -40,11 +80,7 @@ class ExplanationModel:
         df = pd.DataFrame(training_data)
         
         # Asegurarse de que todas las columnas de características esperadas existan
-        expected_features = [
-            'area_match_count', 'lenguaje_match_count', 'herramienta_match_count',
-            'metodologia_match_count', 'contenido_match_count', 'history_score',
-            'semantic_score' # ADDED
-        ]
+        expected_features = FEATURE_NAMES
         for col in expected_features:
             if col not in df.columns:
                 df[col] = 0
@@ -86,3 +122,80 @@ class ExplanationModel:
             explanations.append(explanation_dict)
             
         return explanations
+
+    def _global_model_path(self) -> Path:
+        return EXPLAINERS_DIR / f"explainer_{self.version}.pkl"
+
+    def _load_global(self) -> bool:
+        path = self._global_model_path()
+        if not path.exists():
+            return False
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+            self.model = data['model']
+            self.feature_names = data['feature_names']
+            self.explainer = shap.TreeExplainer(self.model)
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo cargar el explicador global {path}: {e}")
+            return False
+
+    def train_global(self, training_data: List[Dict[str, Any]]):
+        """
+        Entrena el explicador global y lo persiste para esta versión del algoritmo.
+        training_data debe cubrir todos los cursos (ver precompute_all_recommendations);
+        si supera GLOBAL_EXPLAINER_SAMPLE filas se toma una muestra reproducible.
+        """
+        if len(training_data) > GLOBAL_EXPLAINER_SAMPLE:
+            training_data = random.Random(42).sample(training_data, GLOBAL_EXPLAINER_SAMPLE)
+        with self._lock:
+            self.train(training_data)
+            if self.explainer is None:
+                return
+            try:
+                EXPLAINERS_DIR.mkdir(parents=True, exist_ok=True)
+                with open(self._global_model_path(), 'wb') as f:
+                    pickle.dump({'model': self.model, 'feature_names': self.feature_names}, f)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo guardar el explicador global: {e}")
+
+    def _explain_linear(self, rows: List[Dict[str, Any]], weights: Optional[Dict[str, float]]) -> List[Dict[str, float]]:
+        weights = weights or {}
+        features = np.array([[row.get(name, 0) for name in FEATURE_NAMES] for row in rows], dtype=np.float64)
+        weight_vector = np.array([weights.get(name, 0.0) for name in FEATURE_NAMES], dtype=np.float64)
+        values = linear_attributions(features, weight_vector)
+        return [dict(zip(FEATURE_NAMES, map(float, row_values))) for row_values in values]
+
+    def explain_recommendations(self, rows: List[Dict[str, Any]], weights: Optional[Dict[str, float]] = None) -> List[Dict[str, float]]:
+        """
+        Explica las filas de features de un ranking según el modo configurado.
+
+        Args:
+            rows: Diccionarios con las columnas de FEATURE_NAMES y 'target'.
+            weights: Peso de cada feature en el score combinado (modo "linear", o "global" aún sin entrenar).
+
+        Returns:
+            Una lista de diccionarios feature -> contribución, alineada con rows.
+        """
+        if not rows:
+            return []
+
+        if self.mode == "linear":
+            return self._explain_linear(rows, weights)
+
+        df = pd.DataFrame(rows)
+        if self.mode == "global":
+            with self._lock:
+                if self.explainer is None:
+                    self._load_global()
+                if self.explainer is not None:
+                    return self.explain(df)
+            # Aún no hay explicador global para esta versión: se entrena en el precálculo
+            # con todos los cursos, nunca con el ranking de un solo curso
+            return self._explain_linear(rows, weights)
+
+        # Modo "lightgbm": reentrenar por petición (overfitting intencional para explicar la fórmula actual)
+        with self._lock:
+            self.train(rows)
+            return self.explain(df)
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Cuotas de Vertex AI compartidas por todo el proceso (CVs, sílabos y horarios)
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_TOKENS_PER_MINUTE = float(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+# Lotes de páginas de un mismo horario enviados en paralelo
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "4"))
+# Estimación de tokens de entrada para partes no textuales (PDF adjunto)
+GEMINI_BINARY_PART_TOKENS = int(os.getenv("GEMINI_BINARY_PART_TOKENS", "2000"))
+
+# Ráfaga permitida, en segundos de cuota (0 = ritmo parejo: una petición cada 60/RPM s)
+GEMINI_BURST_SECONDS = float(os.getenv("GEMINI_BURST_SECONDS", "0"))
+
+# Backoff adaptativo ante 429/503: base * 2^n (con jitter), acotado
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 60.0
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """Errores de cuota (429) o de conexión/disponibilidad (503) que ameritan backoff."""
+    error_str = str(error)
+    return (
+        "429" in error_str or "Resource exhausted" in error_str
+        or "503" in error_str or "Handshake read failed" in error_str
+        or "FD Shutdown" in error_str or "Socket closed" in error_str
+    )
+
+
+def estimate_tokens(contents: Any) -> int:
+    """Estimación barata de tokens de entrada (~4 caracteres por token)."""
+    if isinstance(contents, str):
+        return max(1, len(contents) // 4)
+    if isinstance(contents, (list, tuple)):
+        return sum(estimate_tokens(part) for part in contents)
+    return GEMINI_BINARY_PART_TOKENS
+
+
+class TokenBucket:
+    """Cubeta de tokens: `rate_per_minute` unidades por minuto, ráfagas hasta `capacity`."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate_per_second * GEMINI_BURST_SECONDS)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def try_take(self, amount: float, now: float) -> float:
+        """Toma `amount` si hay saldo y devuelve 0; si no, devuelve los segundos a esperar."""
+        self._refill(now)
+        # Una petición mayor que la capacidad nunca cabría: pasa con la cubeta llena
+        amount = min(amount, self.capacity)
+        if self._tokens >= amount:
+            self._tokens -= amount
+            return 0.0
+        return (amount - self._tokens) / self.rate_per_second
+
+    def give_back(self, amount: float):
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class GeminiRateLimiter:
+    """
+    Limitador de proceso para Vertex AI: dos cubetas (peticiones/min y tokens/min)
+    y un periodo de enfriamiento compartido que crece con cada 429/503 y se
+    reinicia con el primer éxito. Solo se espera cuando hace falta.
+    """
+
+    def __init__(self, requests_per_minute: float = GEMINI_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = GEMINI_TOKENS_PER_MINUTE,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self._requests = TokenBucket(requests_per_minute, clock=clock)
+        # La cuota de tokens es por minuto: la cubeta guarda un minuto completo, así una
+        # petición grande (un PDF o un lote de páginas) cabe sin anular el límite
+        self._tokens = TokenBucket(tokens_per_minute, capacity=tokens_per_minute, clock=clock)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._cooldown_until = 0.0
+        self._consecutive_throttles = 0
+        self.stats = {'requests': 0, 'throttled': 0, 'waited_seconds': 0.0}
+
+    def acquire(self, tokens: int = 1):
+        """Bloquea hasta poder enviar una petición de `tokens` tokens estimados."""
+        while True:
+            with self._lock:
+                now = self._clock()
+                wait = self._cooldown_until - now
+                if wait <= 0:
+                    wait = self._requests.try_take(1, now)
+                    if wait <= 0:
+                        wait = self._tokens.try_take(tokens, now)
+                        if wait > 0:
+                            # Devolver la petición reservada: se reintenta completa
+                            self._requests.give_back(1)
+                if wait <= 0:
+                    self.stats['requests'] += 1
+                    return
+                self.stats['waited_seconds'] += wait
+            self._sleep(wait)
+
+    def report_throttled(self) -> float:
+        """Registra un 429/503 y devuelve el enfriamiento aplicado a todo el proceso."""
+        with self._lock:
+            self._consecutive_throttles += 1
+            self.stats['throttled'] += 1
+            delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** (self._consecutive_throttles - 1)))
+            delay += random.uniform(0, delay * 0.25)
+            self._cooldown_until = max(self._cooldown_until, self._clock() + delay)
+            return delay
+
+    def report_success(self):
+        with self._lock:
+            self._consecutive_throttles = 0
+
+    def status(self) -> Dict[str, Any]:
+        """Contadores y enfriamiento pendiente (para mostrar esperas por cuota)."""
+        with self._lock:
+            return {
+                **self.stats,
+                'waited_seconds': round(self.stats['waited_seconds'], 1),
+                'cooldown_seconds': round(max(0.0, self._cooldown_until - self._clock()), 1),
+            }
+
+    def generate(self, model, contents, generation_config: Optional[Dict] = None, label: str = "",
+                 max_retries: int = 5, parse: Optional[Callable[[str], Any]] = None) -> Any:
+        """
+        Llama a model.generate_content respetando las cuotas. Reintenta los 429/503
+        (con backoff compartido) y los errores de `parse` (JSON truncado) sin esperar.
+        Devuelve parse(response.text), o la respuesta si no hay parse. Si se agotan los
+        intentos o el error no es recuperable, propaga la última excepción.
+        """
+        kwargs = {'generation_config': generation_config} if generation_config else {}
+        estimated = estimate_tokens(contents)
+        last_error = None
+        for attempt in range(max_retries):
+            self.acquire(estimated)
+            try:
+                response = model.generate_content(contents, **kwargs)
+            except Exception as e:
+                if not is_throttling_error(e):
+                    raise
+                last_error = e
+                delay = self.report_throttled()
+                logger.warning(f"⚠️ Quota/Conexión (429/503) en {label}. Enfriamiento {delay:.1f}s... ({attempt+1}/{max_retries})")
+                continue
+            self.report_success()
+            if parse is None:
+                return response
+            try:
+                return parse(response.text)
+            except ValueError as e:
+                last_error = e
+                logger.warning(f"⚠️ Respuesta inválida (JSON) en {label}: {e}. Reintentando... ({attempt+1}/{max_retries})")
+        raise last_error
+
+
+def parse_json_response(text: str) -> Any:
+    """Limpia las marcas ```json de la respuesta y la decodifica."""
+    return json.loads(text.replace("```json", "").replace("```", "").strip())
+
+
+gemini_rate_limiter = GeminiRateLimiter()
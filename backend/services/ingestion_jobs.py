@@ -0,0 +1,467 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from backend.database import crud
+from backend.database.db_writer import db_writer, read_in_session, run_in_session
+from backend.database.models import ArchivoHorario, ArchivoProcesamiento, Curso, Docente, Procesamiento
+from backend.drive.drive_diff import compute_drive_diff, diff_summary, tracking_fields
+from backend.drive.client_pool import DRIVE_POOL_SIZE
+from backend.drive.drive_service import build_drive_client, drive_service
+from backend.drive.folder_lister import DriveFolderLister
+from backend.services.docx_processor import docx_processor
+from backend.services.gemini_rate_limiter import gemini_rate_limiter
+from backend.services.pdf_processor import pdf_processor
+from backend.services.progress_events import RunProgress, progress_broker
+from backend.services.recommendation_engine import recommendation_engine
+from backend.services.schedule_processor import schedule_processor
+
+# Procesamientos (carpetas) que se ejecutan a la vez
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+# Archivos descargándose/extrayéndose a la vez dentro de un procesamiento. Las tareas no
+# comparten Session (lecturas con sesión propia, escrituras por db_writer), así que el
+# límite lo ponen Drive (un cliente del pool por descarga) y la cuota de Vertex AI
+# (gemini_rate_limiter), no la BD.
+INGESTION_FILE_CONCURRENCY = int(os.getenv("INGESTION_FILE_CONCURRENCY", str(DRIVE_POOL_SIZE)))
+# Archivos por tanda: NER en lote, guardado y estado persistido cada tanda
+INGESTION_CHUNK_SIZE = int(os.getenv("INGESTION_CHUNK_SIZE", "16"))
+DOWNLOAD_MAX_RETRIES = 3
+
+PDF_MIME_TYPE = 'application/pdf'
+DOCX_MIME_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+class IngestionHandler(ABC):
+    """
+    Pasos de un tipo de carpeta: extract() por archivo (descarga + extracción, en
+    paralelo), apply_batch() por tanda (NER en lote) y save() por archivo.
+    extract() y save() lanzan una excepción si el archivo falla; extract() avisa
+    con notify('downloaded', bytes_downloaded=...) al terminar la descarga.
+    Los handlers se instancian al importar el módulo (INGESTION_HANDLERS), así que
+    uno sin extract/save/build_resultado falla ahí y no a mitad de un procesamiento.
+    """
+    folder_type: str = ""
+    file_types: List[str] = []
+    recursive = True
+    tracked_model = None
+    has_ner = False
+
+    async def download(self, file: Dict, google_token: str, notify: Callable[..., None]) -> bytes:
+        loop = asyncio.get_running_loop()
+        last_error = None
+        for attempt in range(DOWNLOAD_MAX_RETRIES):
+            if attempt > 0:
+                await asyncio.sleep(attempt)
+            try:
+                content = await loop.run_in_executor(None, drive_service.download_file_thread_safe, file['id'], google_token)
+                if content:
+                    notify('downloaded', bytes_downloaded=len(content))
+                    return content
+            except Exception as e:
+                last_error = e
+                print(f"    ⚠️ Retry {attempt+1}/{DOWNLOAD_MAX_RETRIES} descarga {file['name']}: {e}")
+        raise RuntimeError(f"Fallo descarga tras {DOWNLOAD_MAX_RETRIES} intentos: {last_error}")
+
+    @abstractmethod
+    async def extract(self, file: Dict, google_token: str, notify: Callable[..., None]) -> Any:
+        ...
+
+    def apply_batch(self, payloads: List[Any]) -> None:
+        pass
+
+    @abstractmethod
+    def save(self, db: Session, payload: Any, file: Dict, folder_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def build_resultado(self, db: Session, archivos: List[ArchivoProcesamiento]) -> Dict[str, Any]:
+        ...
+
+
+def _error_details(archivos: List[ArchivoProcesamiento]) -> List[Dict[str, str]]:
+    return [{'filename': a.nombre, 'error': a.error_message} for a in archivos if a.status == 'error']
+
+
+def _resultado_ids(archivos: List[ArchivoProcesamiento]) -> List[int]:
+    return [a.resultado_id for a in archivos if a.status in ('done', 'unchanged') and a.resultado_id]
+
+
+class CVIngestion(IngestionHandler):
+    folder_type = 'cvs'
+    file_types = [PDF_MIME_TYPE]
+    recursive = False
+    tracked_model = Docente
+    has_ner = True
+
+    async def extract(self, file, google_token, notify):
+        content = await self.download(file, google_token, notify)
+        loop = asyncio.get_running_loop()
+        # El NER se hace después, en lote
+        cv_info = await loop.run_in_executor(None, pdf_processor.extract_cv_info, content, file['name'], False)
+        if not cv_info['success']:
+            raise ValueError(cv_info.get('error'))
+        return cv_info
+
+    def apply_batch(self, payloads):
+        pdf_processor.apply_entities_batch(payloads)
+
+    def save(self, db, payload, file, folder_id):
+        docente_id = pdf_processor.save_docente_to_db(db, payload, file['id'], tracking_fields(file, folder_id))
+        if not docente_id:
+            raise ValueError('Error al guardar en BD')
+        return docente_id
+
+    def build_resultado(self, db, archivos):
+        ids = _resultado_ids(archivos)
+        docentes = db.query(Docente).filter(Docente.id.in_(ids)).all() if ids else []
+        errors = _error_details(archivos)
+        return {
+            "success": True,
+            "processed": len(docentes),
+            "errors": len(errors),
+            "docentes": [
+                {
+                    "id": d.id,
+                    "nombre": d.nombre,
+                    "email": d.email,
+                    "grado": d.grado,
+                    "areas": d.areas,
+                    "herramientas": d.herramientas,
+                    "lenguajes": d.lenguajes,
+                    "metodologias": d.metodologias
+                } for d in docentes
+            ],
+            "error_details": errors
+        }
+
+
+class SyllabusIngestion(IngestionHandler):
+    folder_type = 'syllabi'
+    file_types = [DOCX_MIME_TYPE]
+    recursive = True
+    tracked_model = Curso
+    has_ner = True
+
+    async def extract(self, file, google_token, notify):
+        content = await self.download(file, google_token, notify)
+        loop = asyncio.get_running_loop()
+        syllabus_info = await loop.run_in_executor(None, docx_processor.extract_syllabus_info, content, file['name'], False)
+        if not syllabus_info['success']:
+            raise ValueError(syllabus_info.get('error'))
+        return syllabus_info
+
+    def apply_batch(self, payloads):
+        docx_processor.apply_entities_batch(payloads)
+
+    def save(self, db, payload, file, folder_id):
+        curso_id = docx_processor.save_curso_to_db(db, payload, file['id'], tracking_fields(file, folder_id))
+        if not curso_id:
+            raise ValueError('Error al guardar en BD')
+        return curso_id
+
+    def build_resultado(self, db, archivos):
+        ids = _resultado_ids(archivos)
+        cursos = db.query(Curso).filter(Curso.id.in_(ids)).all() if ids else []
+        ciclos_cursos = {}
+        for curso in cursos:
+            ciclos_cursos.setdefault(str(curso.ciclo or 1), []).append({
+                "id": curso.id,
+                "nombre": curso.nombre,
+                "codigo": curso.codigo,
+                "ciclo": curso.ciclo
+            })
+        errors = _error_details(archivos)
+        return {
+            "success": True,
+            "processed": len(cursos),
+            "errors": len(errors),
+            "ciclos": sorted(ciclos_cursos.keys(), key=lambda x: int(x) if x.isdigit() else 99),
+            "cursos_por_ciclo": ciclos_cursos,
+            "error_details": errors
+        }
+
+
+class ScheduleIngestion(IngestionHandler):
+    folder_type = 'schedules'
+    file_types = [PDF_MIME_TYPE]
+    recursive = True
+    tracked_model = ArchivoHorario
+
+    async def extract(self, file, google_token, notify):
+        # Descarga en streaming directo al spool con el nombre real (el periodo se lee del nombre)
+        loop = asyncio.get_running_loop()
+        spool_path = drive_service.spool_path(file['id'], file['name'])
+        pdf_path = await loop.run_in_executor(None, drive_service.download_file_to_path, file['id'], google_token, spool_path)
+        if not pdf_path:
+            raise RuntimeError('Fallo descarga')
+        notify('downloaded', bytes_downloaded=os.path.getsize(pdf_path))
+        try:
+            return await loop.run_in_executor(None, schedule_processor.extract_schedule_data, pdf_path)
+        finally:
+            drive_service.release_spool(pdf_path)
+
+    def save(self, db, payload, file, folder_id):
+        # extract() y save_history_to_db lanzan si algo falló: el archivo queda en 'error'
+        # (sin md5/modifiedTime registrados) y se reintenta al reanudar o resincronizar
+        records_saved = schedule_processor.save_history_to_db(db, payload)
+        crud.save_archivo_horario(db, file['id'], file['name'], records_saved, **tracking_fields(file, folder_id))
+        return records_saved
+
+    def build_resultado(self, db, archivos):
+        errors = _error_details(archivos)
+        return {
+            "success": True,
+            "processed_files": sum(1 for a in archivos if a.status in ('done', 'error')),
+            "total_history_records": sum(a.resultado_id or 0 for a in archivos if a.status == 'done'),
+            "errors": len(errors),
+            "error_details": errors
+        }
+
+
+INGESTION_HANDLERS: Dict[str, IngestionHandler] = {
+    handler.folder_type: handler for handler in (CVIngestion(), SyllabusIngestion(), ScheduleIngestion())
+}
+
+
+class IngestionJobQueue:
+    """
+    Cola de procesamientos de carpetas de Drive. Los endpoints encolan y devuelven el id
+    del Procesamiento; un pool de workers asyncio los ejecuta en segundo plano.
+
+    El estado de cada archivo se guarda en archivos_procesamiento, así que un
+    procesamiento interrumpido (caída del servidor) se reanuda con los archivos que
+    faltaban al volver a lanzarlo. El token de Google solo se guarda en memoria.
+
+    Cada cambio de estado (encolado, listado, archivo downloaded/extracted/ner_done/
+    saved/failed, fin) se publica en progress_broker junto con las tasas de la ejecución.
+    """
+
+    def __init__(self, workers: int = INGESTION_WORKERS, file_concurrency: int = INGESTION_FILE_CONCURRENCY,
+                 chunk_size: int = INGESTION_CHUNK_SIZE):
+        self.workers = max(1, workers)
+        self.file_concurrency = max(1, file_concurrency)
+        self.chunk_size = max(1, chunk_size)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._tokens: Dict[int, str] = {}
+        self._active = set()
+        self._progress: Dict[int, RunProgress] = {}
+        self.events = progress_broker
+
+    async def start(self):
+        interrupted = run_in_session(crud.mark_interrupted_procesamientos)
+        if interrupted:
+            print(f"⚠️ {interrupted} procesamientos interrumpidos: se reanudan al volver a lanzarlos")
+        self.events.bind_loop(asyncio.get_running_loop())
+        db_writer.start()
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, db_writer.stop)
+
+    def enqueue(self, db: Session, folder_id: str, folder_type: str, google_token: str) -> Procesamiento:
+        """Encola la carpeta; si ya hay un procesamiento sin terminar de la misma carpeta, lo reanuda."""
+        if folder_type not in INGESTION_HANDLERS:
+            raise ValueError(f"Tipo de carpeta desconocido: {folder_type}")
+        procesamiento = crud.get_active_procesamiento(db, folder_id, folder_type)
+        if procesamiento is None:
+            procesamiento = crud.create_procesamiento(db, folder_id=folder_id, folder_type=folder_type, files_total=0, status='queued')
+        return self.submit(db, procesamiento, google_token)
+
+    def resume(self, db: Session, procesamiento: Procesamiento, google_token: str) -> Procesamiento:
+        """Vuelve a lanzar un procesamiento: los archivos pendientes y los que fallaron."""
+        if procesamiento.id not in self._active:
+            for archivo in crud.get_archivos_procesamiento(db, procesamiento.id, ['error']):
+                archivo.status = 'pending'
+            db.commit()
+        return self.submit(db, procesamiento, google_token)
+
+    def submit(self, db: Session, procesamiento: Procesamiento, google_token: str) -> Procesamiento:
+        # Siempre el token más reciente: los tokens de Google caducan
+        self._tokens[procesamiento.id] = google_token
+        if procesamiento.id not in self._active:
+            self._active.add(procesamiento.id)
+            crud.set_procesamiento_status(db, procesamiento.id, 'queued', completed_at=None)
+            self._queue.put_nowait(procesamiento.id)
+            self.events.publish(procesamiento.id, 'queued', folder_type=procesamiento.folder_type)
+            print(f"📥 Procesamiento {procesamiento.id} ({procesamiento.folder_type}) encolado")
+        db.refresh(procesamiento)
+        return procesamiento
+
+    def build_resultado(self, db: Session, procesamiento_id: int) -> Optional[Dict[str, Any]]:
+        """Respuesta final del procesamiento (equivalente a la de los endpoints síncronos anteriores)."""
+        procesamiento = crud.get_procesamiento(db, procesamiento_id)
+        if not procesamiento:
+            return None
+        handler = INGESTION_HANDLERS[procesamiento.folder_type]
+        resultado = handler.build_resultado(db, crud.get_archivos_procesamiento(db, procesamiento_id))
+        resultado["diff"] = (procesamiento.resultado or {}).get('diff')
+        return resultado
+
+    def is_running(self, procesamiento_id: int) -> bool:
+        return procesamiento_id in self._active
+
+    def progress_snapshot(self, procesamiento_id: int) -> Optional[Dict[str, Any]]:
+        """Tasas de la ejecución en curso (None si no se está ejecutando), con el estado de la cuota de Vertex AI."""
+        run = self._progress.get(procesamiento_id)
+        if run is None:
+            return None
+        return {**run.snapshot(), 'gemini': gemini_rate_limiter.status()}
+
+    def _file_event(self, procesamiento_id: int, file: Dict, state: str, error: Optional[str] = None, bytes_downloaded: int = 0):
+        run = self._progress.get(procesamiento_id)
+        if run is not None:
+            run.record(state, bytes_downloaded)
+        data = {'state': state, 'file': {'id': file['id'], 'name': file['name']}, 'progress': self.progress_snapshot(procesamiento_id)}
+        if error:
+            data['error'] = error
+        self.events.publish(procesamiento_id, 'file', **data)
+
+    async def _worker(self):
+        while True:
+            procesamiento_id = await self._queue.get()
+            try:
+                await self._run(procesamiento_id)
+            except Exception as e:
+                print(f"❌ Error en procesamiento {procesamiento_id}: {e}")
+            finally:
+                self._active.discard(procesamiento_id)
+                self._tokens.pop(procesamiento_id, None)
+                self._progress.pop(procesamiento_id, None)
+                self._queue.task_done()
+
+    async def _run(self, procesamiento_id: int):
+        # Sin Session compartida: cada lectura abre la suya en el executor y las
+        # escrituras van en orden, agrupadas, por db_writer
+        try:
+            procesamiento = await read_in_session(crud.get_procesamiento, procesamiento_id)
+            handler = INGESTION_HANDLERS[procesamiento.folder_type]
+            folder_id = procesamiento.folder_id
+
+            # Primera ejecución: listar y registrar los archivos; al reanudar ya están registrados
+            if not await read_in_session(crud.count_archivos_by_status, procesamiento_id):
+                await db_writer.run(crud.set_procesamiento_status, procesamiento_id, 'listing')
+                self.events.publish(procesamiento_id, 'listing')
+                await self._register_files(procesamiento_id, handler, folder_id)
+
+            await db_writer.run(crud.set_procesamiento_status, procesamiento_id, 'processing',
+                                run_started_at=datetime.utcnow(), error_message=None)
+            pending = await read_in_session(crud.get_archivos_procesamiento, procesamiento_id, ['pending', 'processing'])
+            done_before = (await read_in_session(crud.count_archivos_by_status, procesamiento_id)).get('done', 0)
+            self._progress[procesamiento_id] = RunProgress(len(pending), done_before)
+            self.events.publish(procesamiento_id, 'processing', progress=self.progress_snapshot(procesamiento_id))
+            print(f"⚙️ Procesamiento {procesamiento_id} ({handler.folder_type}): {len(pending)} archivos pendientes")
+
+            for start in range(0, len(pending), self.chunk_size):
+                await self._process_chunk(procesamiento_id, handler, folder_id, pending[start:start + self.chunk_size])
+
+            counts = await db_writer.run(crud.sync_procesamiento_counts, procesamiento_id)
+            failed = counts.get('error', 0)
+            if failed:
+                await db_writer.run(crud.mark_procesamiento_error, procesamiento_id, f"{failed} errores")
+            else:
+                await db_writer.run(crud.set_procesamiento_status, procesamiento_id, 'completed', completed_at=datetime.utcnow())
+
+            # El ranking depende de docentes, cursos e historial
+            await db_writer.run(recommendation_engine.invalidate_cache)
+            self.events.publish(
+                procesamiento_id, 'error' if failed else 'completed',
+                counts=counts, error=f"{failed} errores" if failed else None, progress=self.progress_snapshot(procesamiento_id)
+            )
+            print(f"✅ Procesamiento {procesamiento_id} terminado ({failed} errores)")
+
+        except Exception as e:
+            await db_writer.run(crud.mark_procesamiento_error, procesamiento_id, str(e))
+            self.events.publish(procesamiento_id, 'error', error=str(e), progress=self.progress_snapshot(procesamiento_id))
+            raise
+
+    async def _register_files(self, procesamiento_id: int, handler: IngestionHandler, folder_id: str):
+        google_token = self._tokens[procesamiento_id]
+        lister = DriveFolderLister(lambda: build_drive_client(google_token))
+        loop = asyncio.get_running_loop()
+        files = await loop.run_in_executor(None, lister.list_files, folder_id, handler.file_types, handler.recursive)
+
+        # Ingesta incremental: solo se procesan los archivos nuevos o modificados en Drive
+        known = await read_in_session(crud.get_drive_fingerprints, handler.tracked_model)
+        diff = compute_drive_diff(files, known, folder_id)
+        to_process = diff['new'] + diff['changed']
+        summary = diff_summary(diff)
+        await db_writer.run(_register_listing, procesamiento_id, to_process, diff['unchanged'],
+                            {f['id']: known[f['id']]['id'] for f in diff['unchanged']}, summary)
+        self.events.publish(procesamiento_id, 'listed', files_total=len(to_process), diff={k: v for k, v in summary.items() if k != 'eliminados_ids'})
+        print(f"📋 {len(to_process)} archivos a procesar ({len(diff['unchanged'])} sin cambios, {len(diff['deleted'])} eliminados en Drive)")
+
+    async def _process_chunk(self, procesamiento_id: int, handler: IngestionHandler, folder_id: str,
+                             archivos: List[ArchivoProcesamiento]):
+        google_token = self._tokens[procesamiento_id]
+        semaphore = asyncio.Semaphore(self.file_concurrency)
+        items = [(archivo.id, archivo.to_drive_file()) for archivo in archivos]
+
+        async def extract_one(archivo_id, file):
+            async with semaphore:
+                await db_writer.run(crud.mark_archivo_procesamiento, archivo_id, 'processing')
+                print(f"  ...Iniciando {file['name']}")
+                notify = lambda state, **data: self._file_event(procesamiento_id, file, state, **data)
+                try:
+                    payload = await handler.extract(file, google_token, notify)
+                    notify('extracted')
+                    return archivo_id, file, payload, None
+                except Exception as e:
+                    print(f"  ❌ Error en {file['name']}: {e}")
+                    return archivo_id, file, None, str(e)
+
+        async def fail(archivo_id, file, error):
+            await db_writer.run(crud.mark_archivo_procesamiento, archivo_id, 'error', error_message=error)
+            self._file_event(procesamiento_id, file, 'failed', error=error)
+
+        async def save_one(archivo_id, file, payload):
+            try:
+                await db_writer.run(_save_archivo, handler, payload, file, folder_id, archivo_id)
+                self._file_event(procesamiento_id, file, 'saved')
+            except Exception as e:
+                await fail(archivo_id, file, str(e))
+
+        results = await asyncio.gather(*(extract_one(archivo_id, file) for archivo_id, file in items))
+
+        extracted = [(archivo_id, file, payload) for archivo_id, file, payload, error in results if error is None]
+        await asyncio.gather(*(fail(archivo_id, file, error) for archivo_id, file, _, error in results if error is not None))
+
+        # NER de la tanda en una sola pasada (nlp.pipe)
+        if extracted:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, handler.apply_batch, [payload for _, _, payload in extracted])
+            if handler.has_ner:
+                for _, file, _ in extracted:
+                    self._file_event(procesamiento_id, file, 'ner_done')
+
+        # Los guardados de la tanda llegan juntos a db_writer: una transacción para todos
+        await asyncio.gather(*(save_one(archivo_id, file, payload) for archivo_id, file, payload in extracted))
+        await db_writer.run(crud.sync_procesamiento_counts, procesamiento_id)
+
+
+def _register_listing(db: Session, procesamiento_id: int, to_process: List[Dict], unchanged: List[Dict],
+                      unchanged_ids: Dict[str, int], summary: Dict[str, Any]):
+    crud.register_archivos_procesamiento(db, procesamiento_id, to_process)
+    crud.register_archivos_procesamiento(db, procesamiento_id, unchanged, status='unchanged', resultados=unchanged_ids)
+    crud.set_procesamiento_status(db, procesamiento_id, 'processing', files_total=len(to_process), resultado={'diff': summary})
+
+
+def _save_archivo(db: Session, handler: IngestionHandler, payload: Any, file: Dict, folder_id: str, archivo_id: int) -> int:
+    """Guarda el archivo y marca su estado en la misma transacción de db_writer."""
+    resultado_id = handler.save(db, payload, file, folder_id)
+    crud.mark_archivo_procesamiento(db, archivo_id, 'done', resultado_id=resultado_id)
+    return resultado_id
+
+
+# Instancia global
+ingestion_queue = IngestionJobQueue()
@@ -0,0 +1,82 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Respuestas de Gemini ya decodificadas, direccionadas por contenido
+LLM_CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", "backend/data/llm_cache"))
+# "0" para desactivar el cache (forzar re-extracción)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+
+
+class LLMResponseCache:
+    """
+    Cache en disco de respuestas del LLM. La clave es SHA-256 de la entrada
+    (bytes del archivo o texto de las páginas) + versión del prompt + modelo,
+    así que un archivo modificado o un prompt nuevo nunca reutiliza una respuesta vieja.
+    """
+
+    def __init__(self, cache_dir: Path = LLM_CACHE_DIR, enabled: bool = LLM_CACHE_ENABLED):
+        self.cache_dir = Path(cache_dir)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content: Union[bytes, str], prompt_version: str, model_name: str) -> str:
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        digest = hashlib.sha256()
+        digest.update(hashlib.sha256(content).digest())
+        digest.update(f"|{prompt_version}|{model_name}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Entrada corrupta en cache LLM {path.name}: {e}")
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        if not self.enabled:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Escritura atómica: archivo temporal + rename
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo guardar en cache LLM: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'enabled': self.enabled}
+
+
+llm_response_cache = LLMResponseCache()
@@ -0,0 +1,117 @@
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Momento en que arrancó el proceso (aprox.): base para medir el cold start
+PROCESS_START = time.perf_counter()
+
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+
+SBERT_MODEL_NAME = "paraphrase-multilingual-mpnet-base-v2"
+VERTEX_PROJECT_ID = "lector-pdfs-479603"
+VERTEX_LOCATION = "us-central1"
+VERTEX_MODEL_NAME = "gemini-2.0-flash-001"
+
+# Pre-carga en segundo plano al iniciar el servidor ("0" para desactivarla)
+MODEL_PREWARM = os.getenv("MODEL_PREWARM", "1") == "1"
+
+
+class ModelRegistry:
+    """
+    Registro central de modelos: cada modelo se carga la primera vez que se pide,
+    una sola vez por proceso, y se comparte entre todos los servicios.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._load_seconds: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+        self.app_ready_seconds: Optional[float] = None
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        with self._registry_lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Any:
+        """Devuelve el modelo (cargándolo si hace falta) o None si no se pudo cargar."""
+        if name in self._models:
+            return self._models[name]
+        if name not in self._loaders:
+            raise KeyError(f"Modelo no registrado: {name}")
+        with self._locks[name]:
+            if name not in self._models:
+                start = time.perf_counter()
+                try:
+                    self._models[name] = self._loaders[name]()
+                except Exception as e:
+                    logger.error(f"❌ Error cargando modelo '{name}': {e}")
+                    self._errors[name] = str(e)
+                    self._models[name] = None
+                self._load_seconds[name] = time.perf_counter() - start
+                logger.info(f"📦 Modelo '{name}' cargado en {self._load_seconds[name]:.2f}s")
+        return self._models[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return self._models.get(name) is not None
+
+    def prewarm(self, names: Optional[List[str]] = None) -> threading.Thread:
+        """Carga los modelos indicados (o todos) en un hilo en segundo plano."""
+        names = list(names or self._loaders.keys())
+
+        def _run():
+            for name in names:
+                self.get(name)
+            logger.info(f"🔥 Pre-carga de modelos completada: {names}")
+
+        thread = threading.Thread(target=_run, name="model-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def mark_app_ready(self):
+        self.app_ready_seconds = time.perf_counter() - PROCESS_START
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "app_ready_seconds": round(self.app_ready_seconds, 3) if self.app_ready_seconds is not None else None,
+            "models": {
+                name: {
+                    "loaded": self.is_loaded(name),
+                    "load_seconds": round(self._load_seconds[name], 3) if name in self._load_seconds else None,
+                    "error": self._errors.get(name)
+                }
+                for name in self._loaders
+            }
+        }
+
+
+def _load_sbert():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(SBERT_MODEL_NAME)
+
+
+def _load_gemini():
+    """Inicializa Vertex AI una sola vez para todos los procesadores."""
+    path_to_keys = ROOT_DIR / "vertex_credenciales.json"
+    if not path_to_keys.exists():
+        logger.error(f"No se encontró el archivo 'vertex_credenciales.json' en {ROOT_DIR}")
+        return None
+    import vertexai
+    from vertexai.generative_models import GenerativeModel
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(path_to_keys)
+    vertexai.init(project=VERTEX_PROJECT_ID, location=VERTEX_LOCATION)
+    logger.info(f"🤖 Vertex AI inicializado en el proyecto {VERTEX_PROJECT_ID} con modelo: {VERTEX_MODEL_NAME}")
+    return GenerativeModel(VERTEX_MODEL_NAME)
+
+
+model_registry = ModelRegistry()
+model_registry.register("sbert", _load_sbert)
+model_registry.register("gemini", _load_gemini)
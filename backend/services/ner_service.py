@@ -1,7 +1,7 @@
-import spacy
+import os
 import logging
-from spacy.pipeline import EntityRuler
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional
+from backend.services.model_registry import model_registry
 
 # Configuración de Logging
 logger = logging.getLogger(__name__)
@@ -30,6 +30,8 @@ def load_spacy_model():
     para detectar habilidades técnicas específicas.
     """
     try:
+        import spacy
+
         # Cargamos el modelo grande de español
         # disable=["parser"] opcional si no necesitas análisis sintáctico (hace la carga más rápida)
         nlp = spacy.load("es_core_news_lg")
@@ -74,8 +76,37 @@ def load_spacy_model():
         logger.critical(f"❌ Error inesperado cargando NLP: {e}")
         return None
 
-# --- INSTANCIA GLOBAL ---
-nlp = load_spacy_model()
+def load_phrase_matcher():
+    from .skill_matcher import load_skill_matcher
+    return load_skill_matcher()
+
+# --- INSTANCIA GLOBAL (perezosa, vía registro de modelos) ---
+model_registry.register("spacy_ner", load_spacy_model)
+model_registry.register("skill_matcher", load_phrase_matcher)
+
+# Motor de extracción: "spacy" (es_core_news_lg + EntityRuler) o
+# "phrase" (tokenizador en blanco + PhraseMatcher serializado; mismas salidas)
+NER_ENGINE = os.getenv("NER_ENGINE", "spacy")
+# Modelo del registro que usa el motor activo (el otro no se pre-carga)
+NER_MODEL_NAME = "skill_matcher" if NER_ENGINE == "phrase" else "spacy_ner"
+
+def get_nlp():
+    return model_registry.get("spacy_ner")
+
+def get_phrase_matcher():
+    return model_registry.get("skill_matcher")
+
+# Procesamiento por lotes con nlp.pipe (n_process > 1 usa multiprocessing de spaCy)
+NER_BATCH_SIZE = int(os.getenv("NER_BATCH_SIZE", "64"))
+NER_N_PROCESS = int(os.getenv("NER_N_PROCESS", "1"))
+
+def ruler_only_disabled(nlp) -> List[str]:
+    """
+    Componentes que el EntityRuler no necesita (tagger, parser, lemmatizer, ner...).
+    Los patrones son por LOWER, así que basta con el tokenizador. El NER estadístico
+    solo aportaba etiquetas (PER, LOC, ...) que después se descartan.
+    """
+    return [name for name in nlp.pipe_names if name != "entity_ruler"]
 
 def normalize_term(term: str, label: str) -> str:
     """Normaliza mayúsculas/minúsculas basándose en listas comunes de TI."""
@@ -102,11 +133,8 @@ def normalize_term(term: str, label: str) -> str:
     
     return term
 
-def extract_entities(text: str) -> Dict[str, List[str]]:
-    """
-    Extrae habilidades técnicas del texto, las normaliza y elimina duplicados.
-    """
-    results = {
+def _empty_results() -> Dict[str, List[str]]:
+    return {
         'areas': [],
         'lenguajes': [],
         'herramientas': [],
@@ -114,48 +142,95 @@ def extract_entities(text: str) -> Dict[str, List[str]]:
         'contenidos': []
     }
 
-    if not nlp or not text:
-        return results
+def _entities_from_doc(doc) -> Dict[str, List[str]]:
+    """Agrupa las entidades del EntityRuler por categoría, normalizadas y sin duplicados."""
+    results = _empty_results()
 
-    try:
-        doc = nlp(text)
-        
-        # Usamos Sets para eliminar duplicados automáticamente
-        areas = set()
-        lenguajes = set()
-        herramientas = set()
-        metodologias = set()
-        contenidos = set()
-        
-        for ent in doc.ents:
-            # Normalización inteligente
-            term = normalize_term(ent.text, ent.label_)
-            
-            # Filtro de ruido:
-            # Permitimos términos de 1 letra SOLO si son Lenguajes (ej: "C", "R")
-            if len(term) < 2 and ent.label_ != "LENGUAJE":
-                continue
-
-            if ent.label_ == "AREA":
-                areas.add(term)
-            elif ent.label_ == "LENGUAJE":
-                lenguajes.add(term)
-            elif ent.label_ == "HERRAMIENTA":
-                herramientas.add(term)
-            elif ent.label_ == "METODOLOGIA":
-                metodologias.add(term)
-            elif ent.label_ == "CONTENIDO":
-                contenidos.add(term)
-        
-        # Convertimos a listas ordenadas para la respuesta JSON
-        results['areas'] = sorted(list(areas))
-        results['lenguajes'] = sorted(list(lenguajes))
-        results['herramientas'] = sorted(list(herramientas))
-        results['metodologias'] = sorted(list(metodologias))
-        results['contenidos'] = sorted(list(contenidos))
+    # Usamos Sets para eliminar duplicados automáticamente
+    areas = set()
+    lenguajes = set()
+    herramientas = set()
+    metodologias = set()
+    contenidos = set()
+    
+    for ent in doc.ents:
+        # Normalización inteligente
+        term = normalize_term(ent.text, ent.label_)
         
+        # Filtro de ruido:
+        # Permitimos términos de 1 letra SOLO si son Lenguajes (ej: "C", "R")
+        if len(term) < 2 and ent.label_ != "LENGUAJE":
+            continue
+
+        if ent.label_ == "AREA":
+            areas.add(term)
+        elif ent.label_ == "LENGUAJE":
+            lenguajes.add(term)
+        elif ent.label_ == "HERRAMIENTA":
+            herramientas.add(term)
+        elif ent.label_ == "METODOLOGIA":
+            metodologias.add(term)
+        elif ent.label_ == "CONTENIDO":
+            contenidos.add(term)
+    
+    # Convertimos a listas ordenadas para la respuesta JSON
+    results['areas'] = sorted(list(areas))
+    results['lenguajes'] = sorted(list(lenguajes))
+    results['herramientas'] = sorted(list(herramientas))
+    results['metodologias'] = sorted(list(metodologias))
+    results['contenidos'] = sorted(list(contenidos))
+    
+    return results
+
+def extract_entities(text: str) -> Dict[str, List[str]]:
+    """
+    Extrae habilidades técnicas del texto, las normaliza y elimina duplicados.
+    """
+    results = _empty_results()
+
+    if not text:
+        return results
+    if NER_ENGINE == "phrase":
+        engine = get_phrase_matcher()
+        if not engine:
+            return results
+        try:
+            return _entities_from_doc(engine(text))
+        except Exception as e:
+            logger.error(f"⚠️ Error extrayendo entidades: {e}")
+            return results
+
+    nlp = get_nlp()
+    if not nlp:
         return results
 
+    try:
+        return _entities_from_doc(nlp(text, disable=ruler_only_disabled(nlp)))
     except Exception as e:
         logger.error(f"⚠️ Error extrayendo entidades: {e}")
-        return results
\ No newline at end of file
+        return results
+
+def extract_entities_batch(texts: Iterable[str], batch_size: int = NER_BATCH_SIZE, n_process: int = NER_N_PROCESS) -> List[Dict[str, List[str]]]:
+    """
+    Versión por lotes de extract_entities: una sola pasada de nlp.pipe sobre todos
+    los textos, solo con el tokenizador y el EntityRuler. Devuelve un resultado por texto.
+    """
+    texts = [text or "" for text in texts]
+    if not texts:
+        return []
+    if NER_ENGINE == "phrase":
+        engine = get_phrase_matcher()
+        if not engine:
+            return [_empty_results() for _ in texts]
+        return [_entities_from_doc(doc) if text else _empty_results() for text, doc in zip(texts, engine.pipe(texts, batch_size=batch_size))]
+
+    nlp = get_nlp()
+    if not nlp:
+        return [_empty_results() for _ in texts]
+
+    try:
+        docs = nlp.pipe(texts, batch_size=batch_size, n_process=n_process, disable=ruler_only_disabled(nlp))
+        return [_entities_from_doc(doc) if text else _empty_results() for text, doc in zip(texts, docs)]
+    except Exception as e:
+        logger.error(f"⚠️ Error extrayendo entidades en lote: {e}")
+        return [extract_entities(text) for text in texts]
@@ -1,49 +1,41 @@
 import logging
-import json
-import os
-import vertexai
-from pathlib import Path
-from vertexai.generative_models import GenerativeModel, Part
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
+from backend.services.model_registry import model_registry, VERTEX_MODEL_NAME
+from backend.services.llm_response_cache import llm_response_cache
+from backend.services.gemini_rate_limiter import gemini_rate_limiter, parse_json_response
 
 logger = logging.getLogger(__name__)
 
 try:
-    from .ner_service import extract_entities
+    from .ner_service import extract_entities, extract_entities_batch
 except ImportError:
     logger.warning("No se pudo importar 'ner_service'.")
     def extract_entities(text): return {}
+    def extract_entities_batch(texts): return [{} for _ in texts]
 
-class PDFProcessor:
-    def __init__(self):
-        current_file = Path(__file__).resolve()
-        root_dir = current_file.parent.parent.parent
-        json_filename = "vertex_credenciales.json"
-        path_to_keys = root_dir / json_filename
-
-        self.project_id = "lector-pdfs-479603"
-        self.location = "us-central1"
-
-        if not path_to_keys.exists():
-            logger.error(f"No se encontró el archivo '{json_filename}' en {root_dir}")
-            self.model = None
-            return
+# Subir al cambiar el prompt de CVs (invalida las respuestas cacheadas)
+CV_PROMPT_VERSION = "cv_v1"
 
-        try:
-            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(path_to_keys)
-            vertexai.init(project=self.project_id, location=self.location)
-            self.model = GenerativeModel("gemini-2.0-flash-001")
-            logger.info(f"Vertex AI inicializado en el proyecto {self.project_id}")
-        except Exception as e:
-            logger.error(f"Error iniciando Vertex AI: {e}")
-            self.model = None
+class PDFProcessor:
+    @property
+    def model(self):
+        # Modelo Gemini compartido (Vertex AI se inicializa una sola vez, en el primer uso)
+        return model_registry.get("gemini")
 
     def _process_with_multimodality(self, pdf_content: bytes, filename: str) -> Dict:
+        # Mismo PDF + mismo prompt + mismo modelo: respuesta ya conocida, sin llamar a Vertex AI
+        cache_key = llm_response_cache.make_key(pdf_content, CV_PROMPT_VERSION, VERTEX_MODEL_NAME)
+        cached = llm_response_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"♻️ CV en cache LLM: {filename}")
+            return cached
+
         if not self.model:
             return {}
 
         try:
+            from vertexai.generative_models import Part
             pdf_part = Part.from_data(
                 mime_type="application/pdf",
                 data=pdf_content
@@ -64,40 +56,32 @@ class PDFProcessor:
         }
         """
 
-        import time
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = self.model.generate_content(
-                    [pdf_part, prompt],
-                    generation_config={
-                        "response_mime_type": "application/json",
-                        "temperature": 0.1,
-                        "max_output_tokens": 8192  # Increased to prevent truncation
-                    }
-                )
-                
-                cleaned_text = response.text.replace("```json", "").replace("```", "").strip()
-                return json.loads(cleaned_text)
-                
-            except Exception as e:
-                error_str = str(e)
-                is_json_error = "Expecting value" in error_str or "Unterminated string" in error_str or "JSONDecodeError" in type(e).__name__
-                is_quota_error = "429" in error_str or "Resource exhausted" in error_str
-                
-                if is_quota_error or is_json_error:
-                    wait_time = (attempt + 1) * 10 # 10s, 20s, 30s
-                    error_type = "Quota (429)" if is_quota_error else "JSON Truncated"
-                    logger.warning(f"⚠️ {error_type} en {filename}. Reintentando en {wait_time}s... ({attempt+1}/{max_retries})")
-                    time.sleep(wait_time)
-                else:
-                    logger.error(f"Error procesando {filename} en Vertex AI: {e}")
-                    return {}
-        
-        logger.error(f"❌ Falló Vertex AI tras {max_retries} intentos para {filename}")
-        return {}
+        # Cuotas compartidas con sílabos y horarios; backoff adaptativo ante 429/503
+        try:
+            ai_data = gemini_rate_limiter.generate(
+                self.model,
+                [pdf_part, prompt],
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "temperature": 0.1,
+                    "max_output_tokens": 8192  # Increased to prevent truncation
+                },
+                label=filename,
+                max_retries=3,
+                parse=parse_json_response
+            )
+        except Exception as e:
+            logger.error(f"❌ Falló Vertex AI para {filename}: {e}")
+            return {}
+
+        llm_response_cache.set(cache_key, ai_data)
+        return ai_data
 
-    def extract_cv_info(self, pdf_content: bytes, filename: str = "") -> Dict:
+    def extract_cv_info(self, pdf_content: bytes, filename: str = "", with_entities: bool = True) -> Dict:
+        """
+        Extrae los datos del CV. Con with_entities=False no corre el NER; las
+        habilidades se completan luego, para todo el lote, con apply_entities_batch.
+        """
         try:
             ai_data = self._process_with_multimodality(pdf_content, filename)
 
@@ -123,28 +107,36 @@ class PDFProcessor:
                 name = filename.replace(".pdf", "").replace("_", " ").strip().title()
 
             final_text = ai_data.get("texto_optimizado", "") or ""
-            entities = extract_entities(final_text)
+            entities = extract_entities(final_text) if with_entities else {}
 
-            return {
+            return self.apply_entities({
                 "success": True,
                 "filename": filename,
                 "name": name,
                 "email": email,
                 "grado": grado,
-                "areas": entities.get("areas", []),
-                "herramientas": entities.get("herramientas", []),
-                "lenguajes": entities.get("lenguajes", []),
-                "metodologias": entities.get("metodologias", []),
-                "contenidos": entities.get("contenidos", []),
                 "text_preview": final_text[:500],
                 "full_text": final_text
-            }
+            }, entities)
 
         except Exception as e:
             logger.error(f"Error procesando {filename}: {e}")
             return {"success": False, "error": str(e), "filename": filename}
 
-    def save_docente_to_db(self, db: Session, cv_info: Dict, drive_file_id: str) -> Optional[int]:
+    def apply_entities(self, cv_info: Dict, entities: Dict) -> Dict:
+        cv_info["areas"] = entities.get("areas", [])
+        cv_info["herramientas"] = entities.get("herramientas", [])
+        cv_info["lenguajes"] = entities.get("lenguajes", [])
+        cv_info["metodologias"] = entities.get("metodologias", [])
+        cv_info["contenidos"] = entities.get("contenidos", [])
+        return cv_info
+
+    def apply_entities_batch(self, cv_infos: List[Dict]) -> List[Dict]:
+        """NER de todos los CVs en una sola pasada (nlp.pipe)."""
+        entities_list = extract_entities_batch([info.get("full_text", "") for info in cv_infos])
+        return [self.apply_entities(info, entities) for info, entities in zip(cv_infos, entities_list)]
+
+    def save_docente_to_db(self, db: Session, cv_info: Dict, drive_file_id: str, tracking: Optional[Dict] = None) -> Optional[int]:
         try:
             from backend.database import crud
             
@@ -161,6 +153,8 @@ class PDFProcessor:
                 "contenidos": cv_info.get("contenidos", []),
                 "cv_text": cv_info.get("full_text", "")
             }
+            # Huella de Drive (md5/modifiedTime) de la versión procesada
+            datos_docente.update(tracking or {})
 
             if existing:
                 crud.update_docente(db, existing.id, **datos_docente)
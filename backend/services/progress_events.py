@@ -0,0 +1,152 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+# Últimos eventos guardados por procesamiento (reconexión con Last-Event-ID)
+PROGRESS_HISTORY_SIZE = int(os.getenv("PROGRESS_HISTORY_SIZE", "500"))
+# Procesamientos con historial en memoria (los más recientes)
+PROGRESS_MAX_TRACKED = int(os.getenv("PROGRESS_MAX_TRACKED", "50"))
+
+FINAL_EVENTS = ('completed', 'error')
+FILE_STATES = ('downloaded', 'extracted', 'ner_done', 'saved', 'failed')
+
+
+class ProgressBroker:
+    """
+    Pub/sub en proceso para los eventos de los procesamientos. Cada suscriptor
+    tiene su asyncio.Queue; publish() puede llamarse desde el event loop o desde
+    hilos del executor. No consulta la BD: solo reparte lo que publican los workers.
+    """
+
+    def __init__(self, history_size: int = PROGRESS_HISTORY_SIZE, max_tracked: int = PROGRESS_MAX_TRACKED):
+        self.history_size = history_size
+        self.max_tracked = max_tracked
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._history: "OrderedDict[int, Deque[Dict[str, Any]]]" = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._seq = 0
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def publish(self, procesamiento_id: int, event: str, **data) -> Dict[str, Any]:
+        with self._lock:
+            self._seq += 1
+            message = {'id': self._seq, 'event': event, 'procesamiento_id': procesamiento_id, 'ts': round(time.time(), 3), **data}
+            history = self._history.get(procesamiento_id)
+            if history is None:
+                history = self._history[procesamiento_id] = deque(maxlen=self.history_size)
+                while len(self._history) > self.max_tracked:
+                    self._history.popitem(last=False)
+            history.append(message)
+            queues = list(self._subscribers.get(procesamiento_id, ()))
+
+        if queues:
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            for queue in queues:
+                if running is not None and running is self._loop:
+                    queue.put_nowait(message)
+                elif self._loop is not None:
+                    self._loop.call_soon_threadsafe(queue.put_nowait, message)
+        return message
+
+    def subscribe(self, procesamiento_id: int, last_event_id: Optional[int] = None) -> "Subscription":
+        """
+        Suscripción a los eventos del procesamiento a partir de ahora (queda registrada
+        al llamar). Con last_event_id (reconexión SSE) primero se reenvían los eventos
+        guardados posteriores a ese id.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.get_running_loop()
+            backlog = []
+            if last_event_id is not None:
+                backlog = [m for m in self._history.get(procesamiento_id, ()) if m['id'] > last_event_id]
+            self._subscribers.setdefault(procesamiento_id, set()).add(queue)
+        return Subscription(self, procesamiento_id, queue, backlog)
+
+    def _unsubscribe(self, procesamiento_id: int, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(procesamiento_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[procesamiento_id]
+
+
+class Subscription:
+    """Cola de eventos de un suscriptor; se usa como context manager para darse de baja."""
+
+    def __init__(self, broker: ProgressBroker, procesamiento_id: int, queue: asyncio.Queue, backlog: List[Dict[str, Any]]):
+        self._broker = broker
+        self.procesamiento_id = procesamiento_id
+        self._queue = queue
+        self._backlog = deque(backlog)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Siguiente evento, o None si no llega ninguno en `timeout` segundos."""
+        if self._backlog:
+            return self._backlog.popleft()
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self._broker._unsubscribe(self.procesamiento_id, self._queue)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RunProgress:
+    """Contadores de la ejecución actual de un procesamiento y sus tasas."""
+
+    def __init__(self, files_pending: int, files_done_before: int = 0):
+        self.started = time.monotonic()
+        self.last_event = self.started
+        self.files_pending = files_pending
+        self.files_done_before = files_done_before
+        self.counts = {state: 0 for state in FILE_STATES}
+        self.bytes_downloaded = 0
+
+    def record(self, state: str, bytes_downloaded: int = 0):
+        self.counts[state] = self.counts.get(state, 0) + 1
+        self.bytes_downloaded += bytes_downloaded
+        self.last_event = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        elapsed = max(now - self.started, 1e-6)
+        finished = self.counts['saved'] + self.counts['failed']
+        remaining = max(0, self.files_pending - finished)
+        finished_per_min = finished / elapsed * 60
+        return {
+            'elapsed_seconds': round(elapsed, 1),
+            'files_pending': self.files_pending,
+            'files_finished': finished,
+            'files_remaining': remaining,
+            'files_done_before': self.files_done_before,
+            'counts': dict(self.counts),
+            'downloads_per_min': round(self.counts['downloaded'] / elapsed * 60, 2),
+            'files_per_min': round(finished_per_min, 2),
+            'download_mb_per_s': round(self.bytes_downloaded / elapsed / 1e6, 3),
+            'eta_seconds': round(remaining / finished_per_min * 60) if finished and remaining else None,
+            # Muchos segundos sin eventos = atasco (p. ej. esperando cuota de Vertex AI)
+            'seconds_since_last_event': round(now - self.last_event, 1),
+        }
+
+
+# Instancia global
+progress_broker = ProgressBroker()
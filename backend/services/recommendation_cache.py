@@ -0,0 +1,71 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Cache L0 (en proceso) delante de RecomendacionCache
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "256"))
+RECOMMENDATION_CACHE_TTL = float(os.getenv("RECOMMENDATION_CACHE_TTL", "3600"))
+
+
+class RecommendationMemoryCache:
+    """
+    Cache LRU con TTL de respuestas de recomendación ya serializadas.
+    Clave: (curso_id, top_k, history_weight, similarity_weight, versión del algoritmo).
+    """
+
+    def __init__(self, max_size: int = RECOMMENDATION_CACHE_SIZE, ttl_seconds: float = RECOMMENDATION_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(curso_id: int, top_k: int, history_weight: float, similarity_weight: float, version: str) -> Tuple:
+        return (curso_id, top_k, round(history_weight, 6), round(similarity_weight, 6), version)
+
+    def get(self, key: Tuple) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, recommendations = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(recommendations)
+
+    def set(self, key: Tuple, recommendations: List[Dict]):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(recommendations))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, curso_id: Optional[int] = None) -> int:
+        """Elimina las entradas de un curso (o todas si curso_id es None)."""
+        with self._lock:
+            if curso_id is None:
+                count = len(self._entries)
+                self._entries.clear()
+                return count
+            keys = [key for key in self._entries if key[0] == curso_id]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entradas': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+recommendation_cache = RecommendationMemoryCache()
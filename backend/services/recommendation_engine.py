@@ -1,24 +1,38 @@
-from typing import List, Dict
-from sentence_transformers import SentenceTransformer
+import os
+import threading
+from typing import List, Dict, Optional
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
-import pandas as pd
 from sqlalchemy.orm import Session
 from backend.services.embeddings_manager import embeddings_manager
 from backend.database import crud
 from backend.database.models import Curso, Docente
 from backend.services.explanation_model import ExplanationModel
+from backend.services.recommendation_cache import recommendation_cache
+from backend.services.model_registry import model_registry
 
-# Cargar modelo SBERT
-try:
-    model = SentenceTransformer('paraphrase-multilingual-mpnet-base-v2')
-except Exception:
-    model = None
+ALGORITHM_VERSION = "sbert_v2.0_veteran"
+
+# Umbral para ser considerado "Experto/Veterano" (100% score histórico)
+# Si tienes horarios de 2016 a 2023 (aprox 14-16 semestres), 8 semestres es un buen nivel de experto.
+VETERAN_THRESHOLD = 8
+
+# Con un índice ANN, candidatos recuperados por similitud antes del re-ranking por historial
+ANN_CANDIDATES = int(os.getenv("ANN_CANDIDATES", "200"))
 
 class RecommendationEngine:
     def __init__(self):
-        self.model = model
-        self.explanation_model = ExplanationModel()
+        self.explanation_model = ExplanationModel(version=ALGORITHM_VERSION)
+        # Catálogo de docentes ya sincronizado (ids) y la marca (número, último updated_at) con que se leyó
+        self._catalogue_ids: Optional[List[int]] = None
+        self._catalogue_watermark = None
+        self._catalogue_stale = False
+        self._catalogue_lock = threading.Lock()
+
+    @property
+    def model(self):
+        # Modelo SBERT compartido, cargado en el primer uso
+        return model_registry.get("sbert")
 
     def _create_profile_text(self, *, areas, lenguajes, herramientas, metodologias, contenidos=None, descripcion="", texto_adicional="") -> str:
         parts = []
@@ -85,11 +99,164 @@ class RecommendationEngine:
             "contenidos": list(set(curso_contenidos).intersection(set(docente_contenidos))),
         }
 
+    def _top_k_indices(self, scores: np.ndarray, top_k: int) -> np.ndarray:
+        """Índices de los top_k scores en orden descendente usando argpartition (O(n))."""
+        n = len(scores)
+        if top_k <= 0 or n == 0:
+            return np.array([], dtype=np.int64)
+        if top_k < n:
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(n)
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+
     def get_embedding_for_text(self, text: str) -> np.ndarray:
         if not self.model:
             raise Exception("Modelo SBERT no cargado")
         return self.model.encode([text], convert_to_numpy=True)[0].reshape(1, -1)
 
+    def get_embeddings_for_texts(self, texts: List[str]) -> np.ndarray:
+        """Codifica varios textos en una sola llamada al modelo (una fila por texto)."""
+        if not self.model:
+            raise Exception("Modelo SBERT no cargado")
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+    def _sync_docentes(self, db: Session, docentes, prune: bool) -> List[int]:
+        return embeddings_manager.sync_docente_embeddings(
+            db=db,
+            docentes=docentes,
+            text_generator=self.create_docente_text,
+            embedding_generator=self.get_embedding_for_text,
+            batch_embedding_generator=self.get_embeddings_for_texts,
+            prune=prune
+        )
+
+    def _load_docente_catalogue(self, db: Session) -> List[int]:
+        """
+        Devuelve los ids del catálogo de docentes con sus embeddings (store + índice) al día.
+
+        Solo consulta la marca del catálogo (número de docentes y último updated_at). Si no
+        cambió, reutiliza los ids ya sincronizados; si cambió, sincroniza solo los docentes
+        modificados desde la marca anterior. La primera vez, tras invalidate_cache() o si
+        hubo bajas, recorre el catálogo completo en streaming.
+        """
+        with self._catalogue_lock:
+            if self._catalogue_stale:
+                self._catalogue_stale = False
+                self._catalogue_ids = None
+            # La marca se lee antes de sincronizar: lo que cambie durante la sincronización
+            # (incluido el embedding_hash que esta escribe) se revisa en la siguiente llamada
+            watermark = crud.get_docentes_watermark(db)
+            if self._catalogue_ids is not None and watermark == self._catalogue_watermark:
+                return self._catalogue_ids
+
+            docente_ids = None
+            previous_update = self._catalogue_watermark[1] if self._catalogue_watermark else None
+            if self._catalogue_ids is not None and previous_update is not None:
+                changed_ids = self._sync_docentes(db, crud.iter_docentes_updated_since(db, previous_update), prune=False)
+                known = set(self._catalogue_ids)
+                merged = self._catalogue_ids + [i for i in changed_ids if i not in known]
+                # Con bajas el recuento no cuadra: se recorre el catálogo completo
+                if len(merged) == watermark[0]:
+                    docente_ids = merged
+            if docente_ids is None:
+                docente_ids = self._sync_docentes(db, crud.iter_docentes(db), prune=True)
+
+            self._catalogue_ids = docente_ids
+            self._catalogue_watermark = watermark
+            return docente_ids
+
+    def _select_candidates(self, curso_embedding: np.ndarray, docente_ids: List[int], history_ids, top_k: int) -> List[int]:
+        """
+        Con un índice ANN, recupera los N docentes más similares y les suma los que tienen
+        historial en el curso (el re-ranking puede subirlos). Con el índice exacto, usa todos.
+        """
+        n_candidates = max(top_k * 3, ANN_CANDIDATES)
+        if not embeddings_manager.docente_index.approximate or len(docente_ids) <= n_candidates:
+            return docente_ids
+        ann_ids, _ = embeddings_manager.search_docentes(curso_embedding, n_candidates)
+        candidates = dict.fromkeys(ann_ids)
+        candidates.update(dict.fromkeys(history_ids))
+        catalogue = set(docente_ids)
+        return [i for i in candidates if i in catalogue]
+
+    def _get_curso_embedding(self, curso: Curso) -> np.ndarray:
+        return embeddings_manager.get_or_create_embedding(
+            db_item=curso,
+            text_generator=self.create_curso_text,
+            embedding_generator=self.get_embedding_for_text
+        )
+
+    def _rank_candidates(
+        self,
+        curso,
+        docente_ids: List[int],
+        top_indices: np.ndarray,
+        docentes_by_id: Dict[int, Docente],
+        combined_scores: np.ndarray,
+        history_scores: np.ndarray,
+        similarities: np.ndarray
+    ) -> List[Dict]:
+        """
+        Arma el top-k de un curso (top_indices, ya ordenado) con sus evidencias NER y la
+        fila de features para SHAP. docentes_by_id debe contener los docentes del top-k.
+        """
+        top_results = []
+        for idx in top_indices:
+            docente = docentes_by_id.get(docente_ids[idx])
+            if not docente: continue
+            # Evidencias NER solo para los docentes que se devuelven
+            evidencias = self._calculate_ner_evidencias(curso, docente)
+            top_results.append({
+                'docente_obj': docente,
+                'score_combinado': float(combined_scores[idx]),
+                'score_historico': float(history_scores[idx]),
+                'score_semantico': float(similarities[idx]),
+                'evidencias': evidencias,
+                # Datos para el modelo de explicación
+                'features': {
+                    'area_match_count': len(evidencias.get('areas', [])),
+                    'lenguaje_match_count': len(evidencias.get('lenguajes', [])),
+                    'herramienta_match_count': len(evidencias.get('herramientas', [])),
+                    'metodologia_match_count': len(evidencias.get('metodologias', [])),
+                    'contenido_match_count': len(evidencias.get('contenidos', [])),
+                    'history_score': float(history_scores[idx]),
+                    'semantic_score': float(similarities[idx]), # ADDED: Crucial for SHAP to explain the score
+                    'target': float(combined_scores[idx])
+                }
+            })
+        return top_results
+
+    def _format_recommendations(self, top_results: List[Dict], history_weight: float, similarity_weight: float) -> List[Dict]:
+        """Genera las explicaciones SHAP del top-k y arma la respuesta de la API."""
+        # Explicaciones según el modo configurado (lineal exacto, global persistido o LightGBM por petición)
+        shap_values_list = self.explanation_model.explain_recommendations(
+            [result['features'] for result in top_results],
+            weights={'history_score': history_weight, 'semantic_score': similarity_weight}
+        )
+
+        recommendations = []
+        for idx, result in enumerate(top_results):
+            shap_expl = shap_values_list[idx] if idx < len(shap_values_list) else {}
+            docente = result['docente_obj']
+            recommendations.append({
+                'docente_id': docente.id,
+                'nombre': docente.nombre,
+                'email': docente.email,
+                'grado': docente.grado,
+                'areas': docente.areas,
+                'herramientas': docente.herramientas,
+                'lenguajes': docente.lenguajes,
+                'metodologias': docente.metodologias,
+                'score_combinado': round(result['score_combinado'] * 100, 2),
+                'score_historico': round(result['score_historico'] * 100, 2),
+                'score_semantico': round(result['score_semantico'] * 100, 2),
+                'evidencias': result['evidencias'],
+                'shap_explanations': shap_expl,
+                'from_cache': False
+            })
+        return recommendations
+
     def recommend_docentes_for_curso(
         self,
         db: Session,
@@ -101,33 +268,38 @@ class RecommendationEngine:
         cache_max_age_days: int = 7
     ) -> List[Dict]:
         try:
-            # 1. Intentar usar Cache L1 (Base de Datos)
+            cache_key = recommendation_cache.make_key(curso_id, top_k, history_weight, similarity_weight, ALGORITHM_VERSION)
             if use_cache:
-                cached_recommendations = crud.get_recomendaciones_cache(db, curso_id, max_age_days=cache_max_age_days)
+                # 0. Cache L0 (en memoria del proceso)
+                cached_response = recommendation_cache.get(cache_key)
+                if cached_response is not None:
+                    return cached_response
+
+                # 1. Intentar usar Cache L1 (Base de Datos) con una sola consulta (cache + docentes)
+                cached_recommendations = crud.get_recomendaciones_cache_with_docentes(db, curso_id, max_age_days=cache_max_age_days, limit=top_k)
                 
                 # FIX: Si el cache tiene menos elementos que los solicitados (ej: 5 vs 100), ignorar cache y recalcular.
                 if cached_recommendations and len(cached_recommendations) >= top_k:
                     recommendations = []
-                    for cache_entry in cached_recommendations[:top_k]:
-                        docente = crud.get_docente_by_id(db, cache_entry.docente_id)
-                        if not docente: continue
-                        
+                    for row in cached_recommendations:
+                        # Los scores se guardan ya en porcentaje (ver _format_recommendations)
                         recommendations.append({
-                            'docente_id': docente.id,
-                            'nombre': docente.nombre,
-                            'email': docente.email,
-                            'grado': docente.grado,
-                            'areas': docente.areas,
-                            'herramientas': docente.herramientas,
-                            'lenguajes': docente.lenguajes,
-                            'metodologias': docente.metodologias,
-                            'score_combinado': round(cache_entry.score_combinado * 100, 2),
-                            'score_historico': round(cache_entry.score_historico * 100, 2),
-                            'score_semantico': round(cache_entry.score_semantico * 100, 2),
-                            'evidencias': cache_entry.evidencias,
-                            'shap_explanations': cache_entry.shap_explanations,
+                            'docente_id': row.docente_id,
+                            'nombre': row.nombre,
+                            'email': row.email,
+                            'grado': row.grado,
+                            'areas': row.areas,
+                            'herramientas': row.herramientas,
+                            'lenguajes': row.lenguajes,
+                            'metodologias': row.metodologias,
+                            'score_combinado': row.score_combinado,
+                            'score_historico': row.score_historico,
+                            'score_semantico': row.score_semantico,
+                            'evidencias': row.evidencias,
+                            'shap_explanations': row.shap_explanations,
                             'from_cache': True
                         })
+                    recommendation_cache.set(cache_key, recommendations)
                     return recommendations
 
             # 2. Si no hay cache, calcular desde cero
@@ -135,137 +307,47 @@ class RecommendationEngine:
             if not curso: return []
 
             # --- LÓGICA DE VETERANOS (HISTORIAL) ---
-            historial = crud.get_historial_by_curso(db, curso_id)
-            
-            # Contar cuántas veces ha dictado el curso cada docente
-            docente_semesters_count = {}
-            for h in historial:
-                docente_id = h.docente_id
-                docente_semesters_count[docente_id] = docente_semesters_count.get(docente_id, 0) + 1
-            
-            # Umbral para ser considerado "Experto/Veterano" (100% score histórico)
-            # Si tienes horarios de 2016 a 2023 (aprox 14-16 semestres), 8 semestres es un buen nivel de experto.
-            VETERAN_THRESHOLD = 8 
-            # ---------------------------------------
+            # Semestres que cada docente ha dictado el curso (agregado historial_resumen, lectura por PK)
+            docente_semesters_count = crud.get_historial_counts_by_curso(db, curso_id)
 
             # 3. Obtener Embeddings
-            curso_embedding = embeddings_manager.get_or_create_embedding(
-                db_item=curso,
-                text_generator=self.create_curso_text,
-                embedding_generator=self.get_embedding_for_text
-            )
-
-            docentes = crud.get_all_docentes(db)
-            docentes_embeddings_map = embeddings_manager.get_all_docente_embeddings(
-                db=db,
-                docentes=docentes,
-                text_generator=self.create_docente_text,
-                embedding_generator=self.get_embedding_for_text
-            )
+            curso_embedding = self._get_curso_embedding(curso)
+            docente_ids = self._load_docente_catalogue(db)
             
-            if not docentes_embeddings_map: return []
+            if not docente_ids: return []
 
-            docente_ids = list(docentes_embeddings_map.keys())
-            docentes_vectors = np.array([docentes_embeddings_map[id] for id in docente_ids])
-            
-            # Asegurar que sea 2D
-            if docentes_vectors.ndim == 3:
-                docentes_vectors = np.squeeze(docentes_vectors, axis=1)
+            # Candidatos (todos con índice exacto; top-N + veteranos con ANN)
+            docente_ids = self._select_candidates(curso_embedding, docente_ids, docente_semesters_count.keys(), top_k)
+            docentes_vectors = embeddings_manager.get_docente_vectors(docente_ids)
 
             # 4. Calcular Similitud Semántica (SBERT)
             similarities = cosine_similarity(curso_embedding, docentes_vectors)[0]
 
-            # 5. Calcular Score Final
-            final_scores = []
-            for idx, docente_id in enumerate(docente_ids):
-                docente = crud.get_docente_by_id(db, docente_id)
-                if not docente: continue
-                
-                semantic_score = float(similarities[idx])
-                
-                # Score Histórico Gradual (0.0 a 1.0 basado en experiencia)
-                semesters_taught = docente_semesters_count.get(docente_id, 0)
-                history_score = min(semesters_taught / VETERAN_THRESHOLD, 1.0)
-                
-                combined_score = (history_score * history_weight) + (semantic_score * similarity_weight)
-                
-                evidencias = self._calculate_ner_evidencias(curso, docente)
-                
-                final_scores.append({
-                    'docente_id': docente.id,
-                    'docente_obj': docente,
-                    'score_combinado': combined_score,
-                    'score_historico': history_score,
-                    'score_semantico': semantic_score,
-                    'evidencias': evidencias,
-                    'shap_explanations': {} # Se llenará abajo
-                })
-
-            # 6. Ordenar
-            final_scores.sort(key=lambda x: x['score_combinado'], reverse=True)
-            top_results = final_scores[:top_k]
-
-            # 7. Generar Explicaciones con SHAP Real
-            # Preparamos datos para el modelo de explicación
-            training_data = []
-            for result in top_results:
-                evidencias = result['evidencias']
-                training_data.append({
-                    'area_match_count': len(evidencias.get('areas', [])),
-                    'lenguaje_match_count': len(evidencias.get('lenguajes', [])),
-                    'herramienta_match_count': len(evidencias.get('herramientas', [])),
-                    'metodologia_match_count': len(evidencias.get('metodologias', [])),
-                    'contenido_match_count': len(evidencias.get('contenidos', [])),
-                    'history_score': result['score_historico'],
-                    'semantic_score': result['score_semantico'], # ADDED: Crucial for SHAP to explain the score
-                    'target': result['score_combinado']
-                })
-
-            # Entrenar modelo explicativo (overfitting intencional para explicar la fórmula actual)
-            if training_data:
-                self.explanation_model.train(training_data)
-                
-                # Generar explicaciones
-                df_predict = pd.DataFrame(training_data)
-                shap_values_list = self.explanation_model.explain(df_predict)
-            else:
-                shap_values_list = [{}] * len(top_results)
-
-            recommendations_to_save = []
-            recommendations_for_api = []
-            
-            for idx, result in enumerate(top_results):
-                shap_expl = shap_values_list[idx] if idx < len(shap_values_list) else {}
-                
-                # Mapear nombres de features a nombres amigables si es necesario
-                # (El frontend espera claves específicas, ajustamos si hace falta)
-                
-                docente = result['docente_obj']
-                rec_data = {
-                    'docente_id': docente.id,
-                    'nombre': docente.nombre,
-                    'email': docente.email,
-                    'grado': docente.grado,
-                    'areas': docente.areas,
-                    'herramientas': docente.herramientas,
-                    'lenguajes': docente.lenguajes,
-                    'metodologias': docente.metodologias,
-                    'score_combinado': round(result['score_combinado'] * 100, 2),
-                    'score_historico': round(result['score_historico'] * 100, 2),
-                    'score_semantico': round(result['score_semantico'] * 100, 2),
-                    'evidencias': result['evidencias'],
-                    'shap_explanations': shap_expl,
-                    'from_cache': False
-                }
-                
-                recommendations_for_api.append(rec_data)
-                recommendations_to_save.append(rec_data)
+            # 5. Calcular Score Final (vectorizado, alineado con la matriz de embeddings)
+            semesters_taught = np.fromiter(
+                (docente_semesters_count.get(id, 0) for id in docente_ids),
+                dtype=np.float64,
+                count=len(docente_ids)
+            )
+            # Score Histórico Gradual (0.0 a 1.0 basado en experiencia)
+            history_scores = np.minimum(semesters_taught / VETERAN_THRESHOLD, 1.0)
+            combined_scores = (history_scores * history_weight) + (similarities * similarity_weight)
+
+            # 6-7. Top-k (selección parcial en lugar de ordenar todo) + evidencias + explicaciones
+            top_indices = self._top_k_indices(combined_scores, top_k)
+            # Solo se cargan de la BD los docentes del top-k (una consulta IN)
+            docentes_by_id = crud.get_docentes_by_ids(db, [docente_ids[idx] for idx in top_indices])
+            top_results = self._rank_candidates(
+                curso, docente_ids, top_indices, docentes_by_id, combined_scores, history_scores, similarities
+            )
+            recommendations_for_api = self._format_recommendations(top_results, history_weight, similarity_weight)
 
-            # 8. Guardar en Cache
+            # 8. Guardar en Cache (L1 en BD y L0 en memoria)
             if use_cache:
                 crud.save_recomendaciones_cache(
-                    db, curso_id, recommendations_to_save, version_algoritmo="sbert_v2.0_veteran"
+                    db, curso_id, recommendations_for_api, version_algoritmo=ALGORITHM_VERSION
                 )
+                recommendation_cache.set(cache_key, [{**rec, 'from_cache': True} for rec in recommendations_for_api])
 
             return recommendations_for_api
 
@@ -275,4 +357,86 @@ class RecommendationEngine:
             traceback.print_exc()
             return []
 
-recommendation_engine = RecommendationEngine()
\ No newline at end of file
+    def invalidate_cache(self, db: Session, curso_id: Optional[int] = None) -> int:
+        """
+        Invalida el cache de recomendaciones en BD (L1) y en memoria (L0) y fuerza a
+        sincronizar el catálogo de docentes completo en la siguiente recomendación.
+        """
+        # Sin tomar el lock: una sincronización en curso no retrasa a quien invalida
+        self._catalogue_stale = True
+        recommendation_cache.invalidate(curso_id)
+        return crud.clear_recomendaciones_cache(db, curso_id)
+
+    def precompute_all_recommendations(
+        self,
+        db: Session,
+        top_k: int = 100,
+        history_weight: float = 0.4,
+        similarity_weight: float = 0.6
+    ) -> Dict:
+        """
+        Modo batch: calcula una matriz de similitud cursos x docentes en una sola
+        multiplicación y guarda el top-k de todos los cursos en RecomendacionCache
+        dentro de una única transacción.
+
+        Los cursos se leen como filas con solo las columnas del perfil, sus embeddings
+        faltantes se codifican juntos en lotes, y los docentes de todos los top-k se
+        cargan de la BD una sola vez.
+        """
+        cursos = list(crud.iter_curso_profiles(db))
+        docente_ids = self._load_docente_catalogue(db)
+        if not cursos or not docente_ids:
+            return {'cursos': 0, 'docentes': len(docente_ids), 'entradas': 0}
+        docentes_vectors = embeddings_manager.get_docente_vectors(docente_ids)
+
+        cursos_vectors, encoded_hashes = embeddings_manager.get_curso_embeddings(
+            cursos, self.create_curso_text, self.get_embeddings_for_texts
+        )
+        crud.set_cursos_embedding_hash(db, encoded_hashes)
+
+        # Similitud semántica de todos los cursos contra todos los docentes
+        similarities = cosine_similarity(cursos_vectors, docentes_vectors)
+
+        # Matriz de historial alineada (filas = cursos, columnas = docentes)
+        curso_rows = {c.id: i for i, c in enumerate(cursos)}
+        docente_cols = {docente_id: j for j, docente_id in enumerate(docente_ids)}
+        semesters_taught = np.zeros(similarities.shape, dtype=np.float64)
+        for curso_id, docente_id, count in crud.get_historial_counts(db):
+            i, j = curso_rows.get(curso_id), docente_cols.get(docente_id)
+            if i is not None and j is not None:
+                semesters_taught[i, j] = count
+        history_scores = np.minimum(semesters_taught / VETERAN_THRESHOLD, 1.0)
+        combined_scores = (history_scores * history_weight) + (similarities * similarity_weight)
+
+        top_indices_by_row = [self._top_k_indices(combined_scores[i], top_k) for i in range(len(cursos))]
+        # Unión de los top-k de todos los cursos: una sola carga de docentes
+        top_docente_ids = {docente_ids[idx] for top_indices in top_indices_by_row for idx in top_indices}
+        docentes_by_id = crud.get_docentes_by_ids(db, top_docente_ids)
+
+        ranked_by_curso = {}
+        for i, curso in enumerate(cursos):
+            ranked_by_curso[curso.id] = self._rank_candidates(
+                curso, docente_ids, top_indices_by_row[i], docentes_by_id,
+                combined_scores[i], history_scores[i], similarities[i]
+            )
+
+        if self.explanation_model.mode == "global":
+            # El explicador global se entrena con filas de todos los cursos (no con el primero que se pida)
+            self.explanation_model.train_global(
+                [result['features'] for results in ranked_by_curso.values() for result in results]
+            )
+
+        recommendations_by_curso = {
+            curso_id: self._format_recommendations(results, history_weight, similarity_weight)
+            for curso_id, results in ranked_by_curso.items()
+        }
+
+        crud.save_recomendaciones_cache_bulk(db, recommendations_by_curso, version_algoritmo=ALGORITHM_VERSION)
+        recommendation_cache.invalidate()
+        return {
+            'cursos': len(cursos),
+            'docentes': len(docente_ids),
+            'entradas': sum(len(recs) for recs in recommendations_by_curso.values())
+        }
+
+recommendation_engine = RecommendationEngine()
@@ -3,14 +3,17 @@ import logging
 import pdfplumber
 from io import BytesIO
 import os
-import json
+import hashlib
+import threading
+import numpy as np
 from typing import List, Dict, Tuple, Optional
 from sqlalchemy.orm import Session
 
-# Vertex AI Imports
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part
-from google.oauth2 import service_account
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.services.model_registry import model_registry, VERTEX_MODEL_NAME
+from backend.services.gemini_rate_limiter import gemini_rate_limiter, parse_json_response, GEMINI_CONCURRENCY
+from backend.services.llm_response_cache import llm_response_cache
 
 # Configuración de Logging 
 logger = logging.getLogger(__name__)
@@ -19,11 +22,66 @@ logger = logging.getLogger(__name__)
 # Usamos un bloque try para que el procesador no rompa la app si falla la importación al inicio.
 try:
     from backend.database.models import Historial, Docente, Curso
-    from sentence_transformers import SentenceTransformer, util
+    from backend.database import crud
 except ImportError:
-    logger.critical("❌ Error crítico: No se pudieron importar los modelos de BD (Historial, Docente, Curso) o SentenceTransformer.")
+    logger.critical("❌ Error crítico: No se pudieron importar los modelos de BD (Historial, Docente, Curso).")
     Historial, Docente, Curso = None, None, None
-    SentenceTransformer, util = None, None
+
+def _normalize_codigo(codigo: str) -> str:
+    """Normaliza un código de curso: sin espacios ni guiones, en mayúsculas."""
+    return codigo.replace(" ", "").replace("-", "").upper() if codigo else ""
+
+
+# Subir al cambiar el prompt de horarios (invalida las respuestas cacheadas)
+SCHEDULE_PROMPT_VERSION = "schedule_v1"
+
+
+class CatalogueMatcher:
+    """
+    Índices del catálogo construidos una vez por carga de historial:
+    - código normalizado -> curso (búsqueda exacta O(1))
+    - índice invertido token -> posiciones, para docentes y cursos, de modo que solo
+      se puntúan los candidatos que comparten tokens con el nombre buscado.
+    Las posiciones conservan el orden del catálogo para que los empates se resuelvan igual.
+    """
+
+    def __init__(self, docentes_cache: List[Tuple["Docente", str]], cursos_cache: List[Tuple["Curso", str]]):
+        self.docentes_cache = docentes_cache
+        self.cursos_cache = cursos_cache
+
+        self.cursos_by_codigo: Dict[str, "Curso"] = {}
+        for curso_obj, _ in cursos_cache:
+            codigo = _normalize_codigo(curso_obj.codigo)
+            if codigo:
+                # Si hay códigos repetidos gana el primero, como en la búsqueda lineal
+                self.cursos_by_codigo.setdefault(codigo, curso_obj)
+
+        self.docente_tokens = self._build_token_index(docentes_cache)
+        self.curso_tokens = self._build_token_index(cursos_cache)
+
+    @staticmethod
+    def _build_token_index(cache: List[Tuple[object, str]]) -> Dict[str, List[int]]:
+        index: Dict[str, List[int]] = {}
+        for pos, (_, nombre_norm) in enumerate(cache):
+            for token in set(nombre_norm.split()):
+                index.setdefault(token, []).append(pos)
+        return index
+
+    def docente_candidates(self, nombre_norm: str, min_shared: int = 2) -> List[Tuple["Docente", str]]:
+        """Docentes que comparten al menos `min_shared` tokens con el nombre buscado."""
+        shared: Dict[int, int] = {}
+        for token in set(nombre_norm.split()):
+            for pos in self.docente_tokens.get(token, ()):
+                shared[pos] = shared.get(pos, 0) + 1
+        return [self.docentes_cache[pos] for pos in sorted(p for p, n in shared.items() if n >= min_shared)]
+
+    def curso_candidates(self, nombre_norm: str) -> List[Tuple["Curso", str]]:
+        """Cursos que comparten al menos un token (el resto tiene Jaccard 0)."""
+        positions = set()
+        for token in set(nombre_norm.split()):
+            positions.update(self.curso_tokens.get(token, ()))
+        return [self.cursos_cache[pos] for pos in sorted(positions)]
+
 
 class ScheduleProcessor:
     """
@@ -31,21 +89,23 @@ class ScheduleProcessor:
     Optimizado para evitar consultas N+1 a la base de datos.
     """
 
+    # Umbral del match semántico de cursos (era 0.65, subido a 0.82 para evitar falsos positivos)
+    SEMANTIC_CURSO_THRESHOLD = 0.82
+
     def __init__(self):
-        # Configuración de Vertex AI
-        self.project_id = "lector-pdfs-479603"
-        self.location = "us-central1"
-        self.model_name = "gemini-2.0-flash-001"
-        
-        # Cargar credenciales
-        try:
-            creds = service_account.Credentials.from_service_account_file("vertex_credenciales.json")
-            vertexai.init(project=self.project_id, location=self.location, credentials=creds)
-            self.model = GenerativeModel(self.model_name)
-            logger.info(f"🤖 Vertex AI inicializado correctamente con modelo: {self.model_name}")
-        except Exception as e:
-            logger.error(f"❌ Error inicializando Vertex AI: {e}")
-            self.model = None
+        self.model_name = VERTEX_MODEL_NAME
+        # Limitador de cuotas de Vertex AI compartido por todo el proceso
+        self.rate_limiter = gemini_rate_limiter
+        # Respuestas por lote direccionadas por el texto de las páginas
+        self.response_cache = llm_response_cache
+        # Embeddings normalizados de los nombres de curso: (versión del catálogo, cursos, matriz)
+        self._curso_name_index = None
+        self._curso_name_index_lock = threading.Lock()
+
+    @property
+    def model(self):
+        # Modelo Gemini compartido (Vertex AI se inicializa una sola vez, en el primer uso)
+        return model_registry.get("gemini")
 
     def _extract_periodo_from_filename(self, filename: str) -> str:
         """Intenta extraer el periodo del nombre del archivo (ej: 2024-10)."""
@@ -79,19 +139,21 @@ class ScheduleProcessor:
     def extract_schedule_data(self, pdf_path: str) -> List[Dict]:
         """
         Extrae la información del horario usando Vertex AI (Gemini) por lotes de páginas.
-        Optimización: Procesa 3 páginas por request para reducir tiempo y llamadas API.
+        Optimización: Procesa 5 páginas por request y envía los lotes en paralelo
+        bajo el limitador de cuotas compartido.
+
+        Lanza una excepción si el PDF no se pudo leer o si falló algún lote: un horario
+        extraído a medias no debe registrarse como ingerido.
         """
         if not self.model:
             logger.error("❌ Modelo Vertex AI no disponible.")
-            return []
+            raise RuntimeError("Modelo Vertex AI no disponible")
 
         filename = os.path.basename(pdf_path)
         logger.info(f"🚀 Procesando horario con Vertex AI (Batching): {filename}")
         all_results = []
         
         try:
-            import time
-            
             # 1. Determinar Periodo Global
             # Estrategia A: Nombre del archivo
             global_period = self._extract_periodo_from_filename(filename)
@@ -113,17 +175,27 @@ class ScheduleProcessor:
                 
                 print(f"📄 Total páginas: {total_pages} | Batch Size: {batch_size}")
                 
+                # Extraer el texto de todos los lotes (pdfplumber no es thread-safe)
+                batch_texts = []
                 for i in range(0, total_pages, batch_size):
-                    # Construir lote
                     batch_pages = pdf.pages[i : i + batch_size]
                     batch_text = ""
                     for idx, page in enumerate(batch_pages):
                         text = page.extract_text(layout=True) or ""
                         batch_text += f"\n--- PÁGINA {i + idx + 1} ---\n{text}\n"
-                    
-                    print(f"   ⏳ Procesando Batch {i//batch_size + 1}/{(total_pages + batch_size - 1)//batch_size} (Págs {i+1}-{min(i+batch_size, total_pages)})...")
-                    
-                    prompt = f"""
+                    batch_texts.append(batch_text)
+
+            all_results = self._extract_batches(batch_texts, global_period)
+
+            logger.info(f"✅ Vertex AI extrajo {len(all_results)} registros totales.")
+            return all_results
+
+        except Exception as e:
+            logger.error(f"❌ Error procesando PDF con Vertex AI: {e}")
+            raise
+
+    def _build_batch_prompt(self, batch_text: str) -> str:
+        return f"""
                     Analiza este TEXTO extraído de varias páginas de un horario universitario.
                     Extrae TODAS las asignaciones de cursos a docentes.
                     
@@ -141,75 +213,74 @@ class ScheduleProcessor:
                         {{"curso_codigo": "ICSI424", "curso_nombre": "GESTION...", "docente_nombre": "JUAN PEREZ"}}
                     ]
                     """
-                    
-                    # RETRY LOGIC PARA VERTEX AI (429, 503 & JSON Errors)
-                    import random
-                    max_retries = 5 # Aumentado a 5 intentos
-                    for attempt in range(max_retries):
-                        try:
-                            # Rate limiting preventivo con Jitter
-                            base_wait = (attempt + 1) * 5
-                            jitter = random.uniform(0, 3)
-                            if attempt > 0: time.sleep(base_wait + jitter)
-                            else: time.sleep(2)
-
-                            response = self.model.generate_content(
-                                prompt,
-                                generation_config={
-                                    "response_mime_type": "application/json",
-                                    "temperature": 0.1,
-                                    "max_output_tokens": 8192
-                                }
-                            )
-                            
-                            json_text = response.text.replace("```json", "").replace("```", "").strip()
-                            data = json.loads(json_text)
-                            
-                            if isinstance(data, dict):
-                                if "asignaciones" in data: data = data["asignaciones"]
-                                else: data = [data]
-                                
-                            # Procesar y limpiar datos del lote
-                            for d in data:
-                                if not d.get('docente_nombre') or not d.get('curso_nombre'):
-                                    continue
-                                
-                                # FORZAR PERIODO GLOBAL
-                                d['periodo'] = global_period
-                                all_results.append(d)
-                            
-                            break # Éxito, salir del retry loop
-                            
-                        except Exception as e:
-                            error_str = str(e)
-                            is_503 = "503" in error_str or "Handshake read failed" in error_str or "FD Shutdown" in error_str or "Socket closed" in error_str
-                            is_429 = "429" in error_str or "Resource exhausted" in error_str
-                            
-                            if is_429 or is_503:
-                                # Backoff más agresivo para errores de conexión/quota
-                                wait_time = (attempt + 1) * 15 + random.uniform(0, 5) # 15s, 30s, 45s...
-                                err_type = "Quota (429)" if is_429 else "Connection (503)"
-                                logger.warning(f"⚠️ {err_type} en Batch {i//batch_size + 1}. Reintentando en {wait_time:.1f}s... ({attempt+1}/{max_retries})")
-                                time.sleep(wait_time)
-                            elif "Unterminated string" in error_str or "Expecting value" in error_str:
-                                logger.warning(f"⚠️ Error JSON en Batch {i//batch_size + 1}: {e}. Reintentando... ({attempt+1}/{max_retries})")
-                            else:
-                                logger.error(f"⚠️ Error en Batch {i//batch_size + 1}: {e}")
-                                # Si no es recuperable, seguimos (o reintentamos si queda chance)
-                                if attempt == max_retries - 1: pass
 
-            logger.info(f"✅ Vertex AI extrajo {len(all_results)} registros totales.")
-            return all_results
+    def _extract_batch(self, batch_no: int, total_batches: int, batch_text: str) -> List[Dict]:
+        """
+        Envía un lote a Gemini (bajo el limitador compartido) y devuelve sus asignaciones.
+        Si se agotan los reintentos, lanza RuntimeError (no devuelve un lote vacío).
+        """
+        cache_key = self.response_cache.make_key(batch_text, SCHEDULE_PROMPT_VERSION, self.model_name)
+        data = self.response_cache.get(cache_key)
+        if data is not None:
+            print(f"   ♻️ Batch {batch_no}/{total_batches} en cache LLM")
+            return data
 
+        print(f"   ⏳ Procesando Batch {batch_no}/{total_batches}...")
+        try:
+            data = self.rate_limiter.generate(
+                self.model,
+                self._build_batch_prompt(batch_text),
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "temperature": 0.1,
+                    "max_output_tokens": 8192
+                },
+                label=f"Batch {batch_no}",
+                max_retries=5,
+                parse=parse_json_response
+            )
         except Exception as e:
-            logger.error(f"❌ Error procesando PDF con Vertex AI: {e}")
+            logger.error(f"⚠️ Error en Batch {batch_no}: {e}")
+            raise RuntimeError(f"Batch {batch_no}/{total_batches} falló: {e}") from e
+
+        if isinstance(data, dict):
+            if "asignaciones" in data: data = data["asignaciones"]
+            else: data = [data]
+        self.response_cache.set(cache_key, data)
+        return data
+
+    def _extract_batches(self, batch_texts: List[str], global_period: str, concurrency: int = GEMINI_CONCURRENCY) -> List[Dict]:
+        """
+        Envía los lotes en paralelo (GEMINI_CONCURRENCY hilos); el ritmo real lo marca
+        el limitador de proceso. Los resultados se devuelven en el orden de las páginas.
+        """
+        total_batches = len(batch_texts)
+        if not total_batches:
             return []
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, total_batches))) as executor:
+            batches = list(executor.map(
+                lambda args: self._extract_batch(args[0] + 1, total_batches, args[1]),
+                enumerate(batch_texts)
+            ))
+
+        all_results = []
+        for data in batches:
+            # Procesar y limpiar datos del lote
+            for d in data:
+                if not isinstance(d, dict) or not d.get('docente_nombre') or not d.get('curso_nombre'):
+                    continue
+                
+                # FORZAR PERIODO GLOBAL
+                d['periodo'] = global_period
+                all_results.append(d)
+        return all_results
 
     def save_history_to_db(self, db: Session, data: List[Dict]) -> int:
         """
         Guarda los datos y actualiza el historial.
         OPTIMIZACIÓN: Carga todos los docentes y cursos en memoria una sola vez
         para evitar consultas repetitivas dentro del bucle.
+        Si la transacción falla, hace rollback y propaga la excepción.
         """
         if not data:
             return 0
@@ -227,24 +298,40 @@ class ScheduleProcessor:
             docentes_cache = [(d, self._normalize_docente_name(d.nombre)) for d in all_docentes]
             cursos_cache = [(c, self._normalize_curso_name(c.nombre)) for c in all_cursos]
             
+            matcher = CatalogueMatcher(docentes_cache, cursos_cache)
+            
             logger.info(f"📚 Catálogo cargado: {len(docentes_cache)} docentes, {len(cursos_cache)} cursos.")
 
-            historial_entries = [] # Inicializar lista
-
             # --- 2. PROCESAMIENTO Y AGREGACIÓN ---
             # Usamos un diccionario para agregar conteos en memoria antes de tocar la BD
             # Clave: (docente_id, curso_id, periodo) -> Valor: veces
             aggregated_entries = {}
 
+            # Pasada 1: docente + curso por código/nombre. Las filas sin candidato léxico
+            # se guardan para resolverlas todas juntas con SBERT.
+            matched = []   # (item, docente, curso)
+            unmatched = [] # (item, docente, nombre normalizado)
             for item in data:
                 # Buscar Docente en memoria
-                docente = self._find_docente_in_memory(docentes_cache, item['docente_nombre'])
+                docente = self._find_docente_in_memory(matcher, item['docente_nombre'])
                 if not docente: continue
                 
                 # Buscar Curso en memoria (pasamos código y nombre)
-                curso = self._find_curso_in_memory(cursos_cache, item.get('curso_codigo'), item['curso_nombre'])
-                if not curso: continue
-                
+                curso, best_score = self._match_curso_lexical(matcher, item.get('curso_codigo'), item['curso_nombre'])
+                if curso:
+                    matched.append((item, docente, curso))
+                elif best_score < 0.5:
+                    unmatched.append((item, docente, self._normalize_curso_name(item['curso_nombre'])))
+
+            # Pasada 2: fallback semántico en lote (un encode + un producto de matrices)
+            if unmatched:
+                semantic_matches = self._resolve_cursos_semantic(cursos_cache, [nombre for _, _, nombre in unmatched])
+                for item, docente, nombre in unmatched:
+                    curso = semantic_matches.get(nombre)
+                    if curso:
+                        matched.append((item, docente, curso))
+
+            for item, docente, curso in matched:
                 # Clave única para agregación
                 key = (docente.id, curso.id, item['periodo'])
                 
@@ -261,30 +348,8 @@ class ScheduleProcessor:
                     db.add(docente)
 
             # --- 3. GUARDADO EN BD ---
-            for (doc_id, cur_id, per), veces_count in aggregated_entries.items():
-                # Verificar si ya existe en BD para sumar
-                existing = db.query(Historial).filter(
-                    Historial.docente_id == doc_id,
-                    Historial.curso_id == cur_id,
-                    Historial.periodo == per
-                ).first()
-                
-                if existing:
-                    existing.veces += veces_count
-                    # Actualizar ultima_vez
-                    from datetime import datetime
-                    existing.ultima_vez = datetime.utcnow()
-                    db.add(existing)
-                else:
-                    new_entry = Historial(
-                        docente_id=doc_id,
-                        curso_id=cur_id,
-                        periodo=per,
-                        resultado="Asignado en Horario",
-                        veces=veces_count
-                    )
-                    db.add(new_entry)
-                    count += 1
+            # Upsert en lote: una consulta de claves existentes + INSERT ... ON CONFLICT por lote
+            count = crud.upsert_historial_counts(db, aggregated_entries)
             
             db.commit()
             logger.info(f"💾 Commit exitoso: {count} nuevos registros de historial insertados (con agregación).")
@@ -293,28 +358,23 @@ class ScheduleProcessor:
         except Exception as e:
             db.rollback()
             logger.error(f"❌ Error en transaccion de historial: {e}")
-            return 0
+            raise
 
-    def _find_curso_in_memory(self, cursos_cache: List[Tuple[Curso, str]], codigo_buscado: str, nombre_buscado: str) -> Optional[Curso]:
-        """Busca curso por código (prioridad) o nombre."""
+    def _match_curso_lexical(self, matcher: CatalogueMatcher, codigo_buscado: str, nombre_buscado: str) -> Tuple[Optional[Curso], float]:
+        """Busca curso por código (prioridad) o nombre. Devuelve (curso, mejor score Jaccard)."""
         
-        # 1. Búsqueda exacta por código (si existe)
+        # 1. Búsqueda exacta por código (si existe), normalizado sin espacios ni guiones
         if codigo_buscado:
-            # Normalizar código buscado: quitar espacios y guiones
-            codigo_clean = codigo_buscado.replace(" ", "").replace("-", "").upper() 
-            for curso_obj, _ in cursos_cache:
-                if curso_obj.codigo:
-                    # Normalizar código DB: quitar espacios y guiones
-                    db_code_clean = curso_obj.codigo.replace(" ", "").replace("-", "").upper()
-                    if db_code_clean == codigo_clean:
-                        return curso_obj
+            curso_obj = matcher.cursos_by_codigo.get(_normalize_codigo(codigo_buscado))
+            if curso_obj:
+                return curso_obj, 1.0
         
-        # 2. Búsqueda difusa por nombre
+        # 2. Búsqueda difusa por nombre (solo cursos que comparten algún token)
         nombre_clean = self._normalize_curso_name(nombre_buscado)
         best_match = None
         best_score = 0
         
-        for curso_obj, curso_nombre_norm in cursos_cache:
+        for curso_obj, curso_nombre_norm in matcher.curso_candidates(nombre_clean):
             score = self._calculate_similarity(nombre_clean, curso_nombre_norm)
             if score > best_score:
                 best_score = score
@@ -325,40 +385,58 @@ class ScheduleProcessor:
              print(f"   ? Candidato Curso: '{best_match.nombre}' | Score: {best_score:.2f} | Buscado: '{nombre_clean}'")
 
         if best_score > 0.80: # Cursos requieren más precisión
-            return best_match
-            
-        # 3. Fallback: Búsqueda Semántica (SBERT) para cursos que cambiaron de nombre
-        # Solo si el score anterior fue muy bajo (evitar costo computacional si ya tenemos un candidato decente)
-        if best_score < 0.5:
-            # print(f"   🧠 Intentando Match Semántico para: '{nombre_clean}'")
-            best_semantic_score = 0
-            best_semantic_match = None
-            
-            # Optimización: Solo comparar con cursos que tengan al menos 1 palabra en común o longitud similar
-            # (Para no comparar con todo el catálogo a fuerza bruta si es muy grande)
-            
-            model = self._get_sbert_model()
-            if model:
-                # Codificar el nombre buscado una sola vez
-                query_embedding = model.encode(nombre_clean, convert_to_tensor=True)
-                
-                for curso_obj, curso_nombre_norm in cursos_cache:
-                    # Calcular similitud coseno
-                    target_embedding = model.encode(curso_nombre_norm, convert_to_tensor=True)
-                    sem_score = float(util.cos_sim(query_embedding, target_embedding)[0][0])
-                    
-                    if sem_score > best_semantic_score:
-                        best_semantic_score = sem_score
-                        best_semantic_match = curso_obj
-                
-                if best_semantic_score > 0.82: # Umbral semántico AJUSTADO (era 0.65, subido a 0.82 para evitar falsos positivos)
-                    print(f"   🧠 Match Semántico: '{best_semantic_match.nombre}' | Score: {best_semantic_score:.2f} | Buscado: '{nombre_clean}'")
-                    return best_semantic_match
-
-        return None
+            return best_match, best_score
+        return None, best_score
 
-    def _find_docente_in_memory(self, docentes_cache: List[Tuple[Docente, str]], nombre_buscado: str) -> Optional[Docente]:
-        """Busca docente en la lista precargada."""
+    def _get_curso_name_index(self, cursos_cache: List[Tuple[Curso, str]]):
+        """
+        Matriz de embeddings normalizados de los nombres de curso, calculada una vez
+        por versión del catálogo (hash de ids + nombres normalizados).
+        """
+        version = hashlib.sha256(
+            "\n".join(f"{c.id}:{nombre}" for c, nombre in cursos_cache).encode('utf-8')
+        ).hexdigest()
+        with self._curso_name_index_lock:
+            if self._curso_name_index and self._curso_name_index[0] == version:
+                return self._curso_name_index
+            model = self._get_sbert_model()
+            if not model or not cursos_cache:
+                return None
+            matrix = model.encode(
+                [nombre for _, nombre in cursos_cache],
+                batch_size=64,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+            self._curso_name_index = (version, [c for c, _ in cursos_cache], matrix)
+            return self._curso_name_index
+
+    def _resolve_cursos_semantic(self, cursos_cache: List[Tuple[Curso, str]], nombres: List[str]) -> Dict[str, Curso]:
+        """
+        Resuelve por similitud semántica todos los nombres (ya normalizados) en lote:
+        un solo encode de los nombres únicos y un producto contra la matriz del catálogo.
+        """
+        index = self._get_curso_name_index(cursos_cache)
+        unique_nombres = [n for n in dict.fromkeys(nombres) if n]
+        if not index or not unique_nombres:
+            return {}
+        _, cursos, matrix = index
+        model = self._get_sbert_model()
+        query = model.encode(unique_nombres, batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+        scores = query @ matrix.T
+        best_rows = np.argmax(scores, axis=1)
+
+        resolved = {}
+        for i, nombre in enumerate(unique_nombres):
+            best_semantic_score = float(scores[i, best_rows[i]])
+            if best_semantic_score > self.SEMANTIC_CURSO_THRESHOLD:
+                best_semantic_match = cursos[best_rows[i]]
+                print(f"   🧠 Match Semántico: '{best_semantic_match.nombre}' | Score: {best_semantic_score:.2f} | Buscado: '{nombre}'")
+                resolved[nombre] = best_semantic_match
+        return resolved
+
+    def _find_docente_in_memory(self, matcher: CatalogueMatcher, nombre_buscado: str) -> Optional[Docente]:
+        """Busca docente en el catálogo precargado (solo entre los que comparten 2+ tokens)."""
         nombre_clean = self._normalize_docente_name(nombre_buscado)
         best_match = None
         best_score = 0
@@ -366,7 +444,9 @@ class ScheduleProcessor:
         # DEBUG: Imprimir qué estamos buscando
         # print(f"🔍 Buscando docente: '{nombre_buscado}' (Norm: '{nombre_clean}')")
 
-        for docente_obj, docente_nombre_norm in docentes_cache:
+        # _calculate_name_similarity devuelve 0 con menos de 2 palabras en común,
+        # así que el índice invertido no descarta ningún candidato válido
+        for docente_obj, docente_nombre_norm in matcher.docente_candidates(nombre_clean):
             score = self._calculate_name_similarity(nombre_clean, docente_nombre_norm)
             
             if score > best_score:
@@ -452,18 +532,7 @@ class ScheduleProcessor:
 
     # --- SBERT MATCHING ---
     def _get_sbert_model(self):
-        if not hasattr(self, 'sbert_model'):
-            try:
-                self.sbert_model = SentenceTransformer('paraphrase-multilingual-mpnet-base-v2')
-            except:
-                self.sbert_model = None
-        return self.sbert_model
-
-    def _calculate_semantic_similarity(self, text1: str, text2: str) -> float:
-        model = self._get_sbert_model()
-        if not model: return 0.0
-        emb1 = model.encode(text1, convert_to_tensor=True)
-        emb2 = model.encode(text2, convert_to_tensor=True)
-        return float(util.cos_sim(emb1, emb2)[0][0])
+        # Misma instancia SBERT que usa el motor de recomendación
+        return model_registry.get("sbert")
 
 schedule_processor = ScheduleProcessor()
\ No newline at end of file
@@ -0,0 +1,129 @@
+import os
+import pickle
+import hashlib
+import logging
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Motor compilado (tokenizador + PhraseMatcher) serializado en disco
+SKILL_MATCHER_PATH = Path(os.getenv("SKILL_MATCHER_PATH", "backend/data/skill_matcher/matcher.pkl"))
+
+try:
+    from .ner_keywords import (
+        PATTERNS_AREAS,
+        PATTERNS_LENGUAJES,
+        PATTERNS_HERRAMIENTAS,
+        PATTERNS_METODOLOGIAS,
+        PATTERNS_CONTENIDOS
+    )
+except ImportError:
+    logger.warning("⚠️ No se encontró 'ner_keywords.py'. El PhraseMatcher no tendrá patrones.")
+    PATTERNS_AREAS = []
+    PATTERNS_LENGUAJES = []
+    PATTERNS_HERRAMIENTAS = []
+    PATTERNS_METODOLOGIAS = []
+    PATTERNS_CONTENIDOS = []
+
+
+def _labelled_terms() -> List[Tuple[str, str]]:
+    """Mismas listas y mismas etiquetas que el EntityRuler de ner_service."""
+    terms = []
+    for term in PATTERNS_AREAS: terms.append((term, "AREA"))
+    for term in PATTERNS_LENGUAJES: terms.append((term, "LENGUAJE"))
+    for term in PATTERNS_HERRAMIENTAS: terms.append((term, "HERRAMIENTA"))
+    for term in PATTERNS_METODOLOGIAS: terms.append((term, "METODOLOGIA"))
+    for term in PATTERNS_CONTENIDOS: terms.append((term, "CONTENIDO"))
+    return terms
+
+
+def _fingerprint(terms: List[Tuple[str, str]]) -> str:
+    """Cambia si cambian las listas de keywords o la versión de spaCy."""
+    import spacy
+    digest = hashlib.sha256(spacy.__version__.encode('utf-8'))
+    for term, label in terms:
+        digest.update(f"{label}\t{term}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class SkillPhraseMatcher:
+    """
+    Motor de habilidades sin modelo estadístico: tokenizador español en blanco +
+    PhraseMatcher(attr="LOWER"). Devuelve Docs con doc.ents igual que el EntityRuler,
+    así que la agregación y normalize_term de ner_service se reutilizan tal cual.
+    """
+
+    def __init__(self, nlp, matcher, fingerprint: str):
+        self.nlp = nlp
+        self.matcher = matcher
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, terms: List[Tuple[str, str]]) -> "SkillPhraseMatcher":
+        import spacy
+        from spacy.matcher import PhraseMatcher
+        from spacy.tokens import Doc
+
+        nlp = spacy.blank("es")
+        nlp.max_length = 2000000
+        matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+        by_label = {}
+        for term, label in terms:
+            # Igual que create_case_insensitive_pattern: un token por palabra separada por espacio
+            words = [word.lower() for word in term.split(' ')]
+            if not all(words):
+                continue
+            by_label.setdefault(label, []).append(Doc(nlp.vocab, words=words))
+        for label, docs in by_label.items():
+            matcher.add(label, docs)
+        return cls(nlp, matcher, _fingerprint(terms))
+
+    def _set_entities(self, doc):
+        """Misma resolución de solapamientos que EntityRuler: primero el más largo, luego el más a la izquierda."""
+        from spacy.tokens import Span
+
+        matches = set((match_id, start, end) for match_id, start, end in self.matcher(doc) if start != end)
+        matches = sorted(matches, key=lambda m: (m[2] - m[1], -m[1]), reverse=True)
+        entities = []
+        seen_tokens = set()
+        for match_id, start, end in matches:
+            if start not in seen_tokens and end - 1 not in seen_tokens:
+                entities.append(Span(doc, start, end, label=match_id))
+                seen_tokens.update(range(start, end))
+        doc.ents = entities
+        return doc
+
+    def __call__(self, text: str):
+        return self._set_entities(self.nlp.make_doc(text))
+
+    def pipe(self, texts: Iterable[str], batch_size: int = 1000) -> Iterator:
+        for doc in self.nlp.tokenizer.pipe(texts, batch_size=batch_size):
+            yield self._set_entities(doc)
+
+
+def load_skill_matcher(path: Path = SKILL_MATCHER_PATH) -> SkillPhraseMatcher:
+    """Carga el motor compilado desde disco; lo (re)compila si no existe o quedó desactualizado."""
+    terms = _labelled_terms()
+    fingerprint = _fingerprint(terms)
+    if path.exists():
+        try:
+            with open(path, 'rb') as f:
+                engine = pickle.load(f)
+            if engine.fingerprint == fingerprint:
+                return engine
+            logger.info("🔄 Keywords modificadas: recompilando PhraseMatcher...")
+        except Exception as e:
+            logger.warning(f"⚠️ PhraseMatcher serializado ilegible ({e}); se recompila.")
+
+    engine = SkillPhraseMatcher.build(terms)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(engine, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"⚠️ No se pudo serializar el PhraseMatcher: {e}")
+    logger.info(f"✅ PhraseMatcher compilado con {len(terms)} patrones.")
+    return engine
@@ -0,0 +1,180 @@
+import os
+import logging
+import threading
+import numpy as np
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# hnswlib es opcional (ver requirements.txt): si no está instalado se usa el índice exacto
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+# Backend del índice de docentes: "exact" (NumPy, fuerza bruta) o "hnsw" (aproximado)
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "exact")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(item_ids: List[int], scores: np.ndarray, k: int) -> Tuple[List[int], np.ndarray]:
+    k = min(k, len(item_ids))
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(item_ids) else np.arange(len(item_ids))
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return [item_ids[row] for row in top], scores[top]
+
+
+def exact_search(item_ids: List[int], vectors: np.ndarray, query: np.ndarray, k: int) -> Tuple[List[int], np.ndarray]:
+    """Búsqueda exacta (coseno) sobre una matriz cuyas filas están alineadas con item_ids."""
+    if not item_ids or k <= 0:
+        return [], np.zeros(0, dtype=np.float32)
+    return _top_k(item_ids, _normalize(vectors) @ _normalize(query)[0], k)
+
+
+class ExactVectorIndex:
+    """
+    Índice exacto por similitud coseno: una matriz normalizada en memoria y un
+    producto matriz-vector por consulta. Es la línea base contra la que se compara el ANN.
+    """
+    approximate = False
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._ids: List[int] = []
+        self._rows: Dict[int, int] = {}
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._rows
+
+    def add(self, item_ids: List[int], vectors: np.ndarray):
+        """Inserta o reemplaza los vectores de item_ids."""
+        if not item_ids:
+            return
+        vectors = _normalize(vectors)
+        with self._lock:
+            if self._matrix.size == 0 or self._matrix.shape[1] != vectors.shape[1]:
+                self._ids, self._rows = [], {}
+                self._matrix = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            base = len(self._ids)
+            new_ids, new_rows = [], []
+            for item_id, vector in zip(item_ids, vectors):
+                row = self._rows.get(item_id)
+                if row is None:
+                    self._rows[item_id] = base + len(new_ids)
+                    new_ids.append(item_id)
+                    new_rows.append(vector)
+                elif row < base:
+                    self._matrix[row] = vector
+                else:
+                    new_rows[row - base] = vector
+            if new_ids:
+                self._ids.extend(new_ids)
+                self._matrix = np.vstack([self._matrix, np.asarray(new_rows, dtype=np.float32)])
+
+    def remove(self, item_ids: List[int]):
+        with self._lock:
+            to_remove = {i for i in item_ids if i in self._rows}
+            if not to_remove:
+                return
+            keep = [row for row, item_id in enumerate(self._ids) if item_id not in to_remove]
+            self._ids = [self._ids[row] for row in keep]
+            self._matrix = self._matrix[keep]
+            self._rows = {item_id: row for row, item_id in enumerate(self._ids)}
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[List[int], np.ndarray]:
+        """Devuelve (ids, similitudes) de los k vectores más similares, en orden descendente."""
+        with self._lock:
+            if not self._ids or k <= 0:
+                return [], np.zeros(0, dtype=np.float32)
+            return _top_k(self._ids, self._matrix @ _normalize(query)[0], k)
+
+
+class HNSWVectorIndex:
+    """
+    Índice aproximado HNSW (hnswlib) en proceso, con inserción y borrado incremental.
+    Los borrados se marcan y sus huecos se reutilizan en inserciones posteriores.
+    """
+    approximate = True
+
+    def __init__(self, m: int = 16, ef_construction: int = 200, ef_search: int = 128):
+        if hnswlib is None:
+            raise ImportError("hnswlib no está instalado")
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._lock = threading.RLock()
+        self._index = None
+        self._dim = None
+        self._live: set = set()
+        self._deleted: set = set()
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._live
+
+    def _init_index(self, dim: int, capacity: int):
+        self._index = hnswlib.Index(space='cosine', dim=dim)
+        self._index.init_index(max_elements=max(capacity, 64), ef_construction=self.ef_construction, M=self.m, allow_replace_deleted=True)
+        self._index.set_ef(self.ef_search)
+        self._dim = dim
+        self._live, self._deleted = set(), set()
+
+    def add(self, item_ids: List[int], vectors: np.ndarray):
+        if not item_ids:
+            return
+        vectors = _normalize(vectors)
+        with self._lock:
+            if self._index is None or self._dim != vectors.shape[1]:
+                self._init_index(vectors.shape[1], len(item_ids) * 2)
+            # Los ids borrados deben desmarcarse antes de actualizarlos
+            for item_id in item_ids:
+                if item_id in self._deleted:
+                    self._index.unmark_deleted(item_id)
+                    self._deleted.discard(item_id)
+            new_count = sum(1 for i in item_ids if i not in self._live)
+            needed = self._index.get_current_count() + new_count
+            if needed > self._index.get_max_elements():
+                self._index.resize_index(max(needed, self._index.get_max_elements() * 2))
+            self._index.add_items(vectors, np.asarray(item_ids, dtype=np.int64), replace_deleted=True)
+            self._live.update(item_ids)
+
+    def remove(self, item_ids: List[int]):
+        with self._lock:
+            for item_id in item_ids:
+                if item_id in self._live:
+                    self._index.mark_deleted(item_id)
+                    self._live.discard(item_id)
+                    self._deleted.add(item_id)
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[List[int], np.ndarray]:
+        with self._lock:
+            if not self._live or k <= 0:
+                return [], np.zeros(0, dtype=np.float32)
+            k = min(k, len(self._live))
+            self._index.set_ef(max(self.ef_search, k))
+            labels, distances = self._index.knn_query(_normalize(query), k=k)
+            # hnswlib devuelve distancia coseno (1 - similitud)
+            return [int(label) for label in labels[0]], 1.0 - distances[0]
+
+
+def create_vector_index(backend: str = VECTOR_INDEX_BACKEND):
+    """Crea el índice configurado; si el backend ANN no está disponible, usa el exacto."""
+    if backend == "hnsw":
+        if hnswlib is not None:
+            return HNSWVectorIndex()
+        logger.warning("⚠️ hnswlib no está instalado; se usa el índice exacto (NumPy).")
+    return ExactVectorIndex()
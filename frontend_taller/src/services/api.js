@@ -30,21 +30,30 @@ function getAuthHeaders(googleToken = null) {
 // ==================== API METHODS ====================
 
 /**
- * Obtener todos los cursos desde el backend
+ * Obtener todos los cursos desde el backend (recorre todas las páginas)
  */
 export async function fetchCursos() {
   try {
-    const response = await fetch(apiURL('/api/cursos'), {
-      method: 'GET',
-      headers: getAuthHeaders() 
-    });
-
-    if (!response.ok) {
-      throw new Error(`Error ${response.status}: ${response.statusText}`);
-    }
-
-    const data = await response.json();
-    return data;
+    const cursos = [];
+    let afterId = null;
+
+    do {
+      const query = afterId !== null ? `?after_id=${afterId}` : '';
+      const response = await fetch(apiURL(`/api/cursos${query}`), {
+        method: 'GET',
+        headers: getAuthHeaders() 
+      });
+
+      if (!response.ok) {
+        throw new Error(`Error ${response.status}: ${response.statusText}`);
+      }
+
+      const page = await response.json();
+      cursos.push(...page.cursos);
+      afterId = page.next_after_id;
+    } while (afterId !== null && afterId !== undefined);
+
+    return { success: true, total: cursos.length, cursos };
   } catch (error) {
     console.error('Error fetching cursos:', error);
     throw error;
@@ -79,6 +88,84 @@ export async function fetchRecommendations(cursoId, topK = 100) {
   }
 }
 
+/**
+ * Estado de un procesamiento en segundo plano (progreso, throughput, ETA, errores)
+ */
+export async function fetchProcesamiento(procesamientoId) {
+  const response = await fetch(apiURL(`/api/procesamientos/${procesamientoId}`), {
+    headers: getAuthHeaders()
+  });
+
+  if (!response.ok) {
+    throw new Error(`Error ${response.status}: ${response.statusText}`);
+  }
+
+  return response.json();
+}
+
+/**
+ * Seguir los eventos SSE de un procesamiento hasta que termine (o se cierre el stream)
+ */
+export async function streamProcesamientoEvents(procesamientoId, onEvent) {
+  // fetch en vez de EventSource: el stream necesita la cabecera Authorization
+  const response = await fetch(apiURL(`/api/procesamientos/${procesamientoId}/events`), {
+    headers: getAuthHeaders()
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error(`Error ${response.status}: ${response.statusText}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let separator;
+    while ((separator = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, separator);
+      buffer = buffer.slice(separator + 2);
+      const data = block.split('\n').find(line => line.startsWith('data: '));
+      if (data) onEvent(JSON.parse(data.slice(6)));
+    }
+  }
+}
+
+/**
+ * Esperar a que termine un procesamiento y devolver su resultado final.
+ * Sigue el progreso por SSE y, si el stream falla, consulta el estado periódicamente.
+ */
+export async function waitForProcesamiento(procesamientoId, { intervalMs = 2000, onProgress } = {}) {
+  try {
+    await streamProcesamientoEvents(procesamientoId, event => {
+      if (onProgress) onProgress(event);
+    });
+  } catch (error) {
+    console.warn('Stream de progreso no disponible, consultando estado:', error);
+  }
+
+  while (true) {
+    const status = await fetchProcesamiento(procesamientoId);
+    if (onProgress) onProgress(status);
+
+    if (status.status === 'completed' || status.status === 'error') {
+      if (!status.resultado) {
+        throw new Error(status.error_message || 'El procesamiento terminó sin resultado');
+      }
+      return status.resultado;
+    }
+    if (status.status === 'interrupted') {
+      throw new Error('El procesamiento fue interrumpido; vuelva a lanzarlo para reanudarlo');
+    }
+
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+  }
+}
+
 /**
  * Procesar CVs desde una carpeta de Drive
  */
@@ -93,8 +180,8 @@ export async function processCVs(folderId, googleToken) {
       throw new Error(`Error ${response.status}: ${response.statusText}`);
     }
 
-    const data = await response.json();
-    return data;
+    const job = await response.json();
+    return await waitForProcesamiento(job.procesamiento_id);
   } catch (error) {
     console.error('Error processing CVs:', error);
     throw error;
@@ -115,8 +202,8 @@ export async function processSyllabi(folderId, googleToken) {
       throw new Error(`Error ${response.status}: ${response.statusText}`);
     }
 
-    const data = await response.json();
-    return data;
+    const job = await response.json();
+    return await waitForProcesamiento(job.procesamiento_id);
   } catch (error) {
     console.error('Error processing syllabi:', error);
     throw error;
@@ -137,8 +224,8 @@ export async function processSchedules(folderId, googleToken) {
       throw new Error(`Error ${response.status}: ${response.statusText}`);
     }
 
-    const data = await response.json();
-    return data;
+    const job = await response.json();
+    return await waitForProcesamiento(job.procesamiento_id);
   } catch (error) {
     console.error('Error processing schedules:', error);
     throw error;